@@ -1,6 +1,7 @@
 from mongoengine import Document, StringField, EmailField, DateTimeField, BooleanField
-import bcrypt
+from django.conf import settings
 import datetime
+from . import passwords, user_cache
 
 class User(Document):
     """MongoDB User model with password hashing"""
@@ -20,17 +21,33 @@ class User(Document):
     
     def set_password(self, raw_password):
         """Hash and set the password"""
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(raw_password.encode('utf-8'), salt).decode('utf-8')
+        self.password_hash = passwords.hash_password(raw_password)
     
     def check_password(self, raw_password):
         """Check if the provided password matches the hash"""
-        return bcrypt.checkpw(raw_password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return passwords.check_password(raw_password, self.password_hash)
     
+    def save(self, *args, **kwargs):
+        result = super(User, self).save(*args, **kwargs)
+        user_cache.invalidate(self.id)
+        return result
+
     def update_last_login(self):
         """Update last login timestamp"""
-        self.last_login = datetime.datetime.utcnow()
-        self.save()
+        User.touch_last_login(self.id)
+
+    @staticmethod
+    def touch_last_login(user_id):
+        """
+        Atomically $set last_login, skipping the write when it was already
+        updated within the last LAST_LOGIN_UPDATE_INTERVAL minutes
+        """
+        now = datetime.datetime.utcnow()
+        threshold = now - datetime.timedelta(minutes=getattr(settings, 'LAST_LOGIN_UPDATE_INTERVAL', 5))
+        User._get_collection().update_one(
+            {'_id': user_id, '$or': [{'last_login': None}, {'last_login': {'$lt': threshold}}]},
+            {'$set': {'last_login': now}},
+        )
     
     def __str__(self):
         return self.username
@@ -42,3 +59,17 @@ class User(Document):
     @property
     def is_anonymous(self):
         return False
+
+
+class MongoSession(Document):
+    """Django session stored in MongoDB; expired rows are removed by the TTL index"""
+    session_key = StringField(primary_key=True, max_length=40)
+    session_data = StringField(required=True)
+    expire_date = DateTimeField(required=True)
+
+    meta = {
+        'collection': 'sessions',
+        'indexes': [
+            {'fields': ['expire_date'], 'expireAfterSeconds': 0}
+        ]
+    }
@@ -0,0 +1,78 @@
+"""
+bcrypt hashing and verification on a bounded worker pool.
+
+bcrypt is deliberately slow, so a login storm could otherwise occupy every
+request thread. Work is handed to BCRYPT_MAX_WORKERS threads with at most
+BCRYPT_MAX_PENDING jobs waiting; beyond that callers get PasswordHasherBusy
+and the view answers 503 instead of queueing without limit.
+
+The cost factor comes from BCRYPT_ROUNDS. Hashes made with a different cost
+are upgraded on the next successful login (see needs_rehash).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from django.conf import settings
+
+from gleam_backend import timing
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool is saturated"""
+
+
+_executor = None
+_slots = None
+_init_lock = threading.Lock()
+
+
+def _pool():
+    global _executor, _slots
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                workers = getattr(settings, 'BCRYPT_MAX_WORKERS', 4)
+                pending = getattr(settings, 'BCRYPT_MAX_PENDING', 64)
+                _slots = threading.BoundedSemaphore(workers + pending)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+    return _executor, _slots
+
+
+def _run(fn, *args):
+    executor, slots = _pool()
+    if not slots.acquire(timeout=getattr(settings, 'BCRYPT_QUEUE_TIMEOUT', 2)):
+        raise PasswordHasherBusy('Too many concurrent password checks')
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    with timing.timed('bcrypt'):
+        return future.result()
+
+
+def _rounds():
+    return getattr(settings, 'BCRYPT_ROUNDS', 12)
+
+
+def hash_password(raw_password):
+    """bcrypt hash of raw_password at the configured cost"""
+    salt = bcrypt.gensalt(rounds=_rounds())
+    return _run(bcrypt.hashpw, raw_password.encode('utf-8'), salt).decode('utf-8')
+
+
+def check_password(raw_password, password_hash):
+    if not password_hash:
+        return False
+    return _run(bcrypt.checkpw, raw_password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def needs_rehash(password_hash):
+    """True when the stored hash was made with a different cost factor"""
+    try:
+        # Format: $2b$<cost>$<salt+hash>
+        return int(password_hash.split('$')[2]) != _rounds()
+    except (AttributeError, IndexError, ValueError):
+        return True
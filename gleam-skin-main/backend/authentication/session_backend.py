@@ -0,0 +1,134 @@
+"""
+Session engine backed by the MongoDB `sessions` collection.
+
+Enable with SESSION_ENGINE = 'authentication.session_backend'. Expiry is
+enforced by a TTL index on expire_date (Mongo deletes expired rows on its
+own), and reads go through a small per-process cache so the session lookup
+made by every authenticated request rarely leaves the process.
+
+The cache holds a session for at most SESSION_MONGO_CACHE_TTL seconds, so a
+logout on one app node can take that long to be seen by the others.
+"""
+import datetime
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, SessionBase
+from django.utils import timezone
+from pymongo.errors import DuplicateKeyError
+
+from gleam_backend import metrics
+
+from .models import MongoSession
+
+
+class SessionReadCache:
+    """session_key -> (session_data, expire_timestamp, cached_at), bounded and short-lived"""
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        now = time.time()
+        if now - entry[2] > self.ttl or now >= entry[1]:
+            self.discard(key)
+            return None
+        return entry[0]
+
+    def set(self, key, session_data, expire_date):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._data) >= self.maxsize:
+                # Cheap bound: drop everything rather than track recency
+                self._data.clear()
+            self._data[key] = (session_data, expire_date.timestamp(), time.time())
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+_cache = SessionReadCache(
+    getattr(settings, 'SESSION_MONGO_CACHE_TTL', 5),
+    getattr(settings, 'SESSION_MONGO_CACHE_SIZE', 10000),
+)
+
+
+class SessionStore(SessionBase):
+
+    @classmethod
+    def _collection(cls):
+        return MongoSession._get_collection()
+
+    def load(self):
+        key = self.session_key
+        if key:
+            session_data = _cache.get(key)
+            if session_data is not None:
+                metrics.cache_hit('session')
+            else:
+                metrics.cache_miss('session')
+                row = self._collection().find_one(
+                    {'_id': key, 'expire_date': {'$gt': timezone.now()}},
+                    {'session_data': 1, 'expire_date': 1},
+                )
+                if row is not None:
+                    session_data = row['session_data']
+                    _cache.set(key, session_data, row['expire_date'].replace(tzinfo=datetime.timezone.utc))
+            if session_data is not None:
+                return self.decode(session_data)
+        self._session_key = None
+        return {}
+
+    def exists(self, session_key):
+        if _cache.get(session_key) is not None:
+            return True
+        return self._collection().find_one({'_id': session_key}, {'_id': 1}) is not None
+
+    def create(self):
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                # Key collision; try another one
+                continue
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        session_data = self.encode(self._get_session(no_load=must_create))
+        expire_date = self.get_expiry_date()
+        document = {'_id': self._get_or_create_session_key(), 'session_data': session_data, 'expire_date': expire_date}
+        collection = self._collection()
+        if must_create:
+            try:
+                collection.insert_one(document)
+            except DuplicateKeyError:
+                raise CreateError
+        else:
+            collection.replace_one({'_id': document['_id']}, document, upsert=True)
+        _cache.set(document['_id'], session_data, expire_date)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        _cache.discard(session_key)
+        self._collection().delete_one({'_id': session_key})
+
+    @classmethod
+    def clear_expired(cls):
+        # The TTL index does this in the background; this covers `manage.py clearsessions`
+        cls._collection().delete_many({'expire_date': {'$lt': timezone.now()}})
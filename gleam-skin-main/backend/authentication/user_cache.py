@@ -0,0 +1,81 @@
+"""
+Current-user resolution without a database round trip in the steady state.
+
+The minimal profile ({id, username, email, is_admin}) of the session's user is cached
+twice: on the request, so several lookups in one request cost one, and in a
+short-TTL per-process table (USER_CACHE_TTL seconds). User.save and logout
+drop the process entry; other app nodes pick up changes when it expires.
+"""
+import threading
+import time
+
+from bson import ObjectId
+from django.conf import settings
+
+from gleam_backend import metrics
+
+_profiles = {}
+_lock = threading.Lock()
+
+
+def _ttl():
+    return getattr(settings, 'USER_CACHE_TTL', 60)
+
+
+def _load(user_id):
+    from .models import User
+
+    if not ObjectId.is_valid(user_id):
+        return None
+    row = User._get_collection().find_one(
+        {'_id': ObjectId(user_id)}, {'username': 1, 'email': 1, 'is_staff': 1, 'is_superuser': 1}
+    )
+    if row is None:
+        return None
+    return {
+        'id': str(row['_id']), 'username': row['username'], 'email': row['email'],
+        'is_admin': bool(row.get('is_staff') or row.get('is_superuser')),
+    }
+
+
+def get_profile(user_id):
+    """Cached profile for a user id, or None if the user does not exist"""
+    entry = _profiles.get(user_id)
+    now = time.monotonic()
+    if entry is not None and entry[1] > now:
+        metrics.cache_hit('user_profile')
+        return entry[0]
+    metrics.cache_miss('user_profile')
+    profile = _load(user_id)
+    if profile is not None:
+        with _lock:
+            if len(_profiles) >= getattr(settings, 'USER_CACHE_SIZE', 10000):
+                _profiles.clear()
+            _profiles[user_id] = (profile, now + _ttl())
+    return profile
+
+
+def invalidate(user_id):
+    if user_id:
+        with _lock:
+            _profiles.pop(str(user_id), None)
+
+
+def current_user_id(request):
+    """User id stored in the session by login/register, or None"""
+    return request.session.get('user_id')
+
+
+def current_user(request):
+    """Profile of the session's user, resolved at most once per request"""
+    http_request = getattr(request, '_request', request)  # DRF wraps the Django request
+    if not hasattr(http_request, '_cached_user_profile'):
+        user_id = current_user_id(request)
+        http_request._cached_user_profile = get_profile(user_id) if user_id else None
+    return http_request._cached_user_profile
+
+
+def is_admin(request):
+    """Whether the session's user is staff or superuser"""
+    profile = current_user(request)
+    return bool(profile and profile.get('is_admin'))
@@ -3,7 +3,8 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt
 from .models import User
-from mongoengine.errors import NotUniqueError, DoesNotExist
+from . import passwords, user_cache
+from mongoengine.errors import NotUniqueError
 import re
 
 def validate_email(email):
@@ -28,38 +29,56 @@ def login_view(request):
                 'error': True
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Try to find user by username or email
+        # One indexed $or lookup for username or email, reading only what login needs
+        candidates = list(User._get_collection().find(
+            {'$or': [{'username': username}, {'email': username}]},
+            {'username': 1, 'email': 1, 'password_hash': 1},
+        ).limit(2))
+        # A username match wins over another account's email, as before
+        user = next((c for c in candidates if c.get('username') == username), None) or (candidates[0] if candidates else None)
+        if user is None:
+            return Response({
+                'detail': 'Invalid credentials',
+                'error': True
+            }, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # Check password (on the bounded bcrypt pool)
         try:
-            user = User.objects.get(username=username)
-        except DoesNotExist:
-            try:
-                user = User.objects.get(email=username)
-            except DoesNotExist:
-                return Response({
-                    'detail': 'Invalid credentials',
-                    'error': True
-                }, status=status.HTTP_401_UNAUTHORIZED)
-        
-        # Check password
-        if not user.check_password(password):
+            valid = passwords.check_password(password, user.get('password_hash'))
+        except passwords.PasswordHasherBusy:
+            return Response({
+                'detail': 'Server busy, please try again',
+                'error': True
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if not valid:
             return Response({
                 'detail': 'Invalid credentials',
                 'error': True
             }, status=status.HTTP_401_UNAUTHORIZED)
         
-        # Update last login
-        user.update_last_login()
+        # Upgrade hashes made with an old cost factor while we have the password
+        if passwords.needs_rehash(user['password_hash']):
+            try:
+                User._get_collection().update_one(
+                    {'_id': user['_id']},
+                    {'$set': {'password_hash': passwords.hash_password(password)}},
+                )
+            except passwords.PasswordHasherBusy:
+                pass  # Try again on a later login
+        
+        # Update last login (throttled)
+        User.touch_last_login(user['_id'])
         
         # Store user ID in session
-        request.session['user_id'] = str(user.id)
-        request.session['username'] = user.username
+        request.session['user_id'] = str(user['_id'])
+        request.session['username'] = user['username']
         
         return Response({
             'detail': 'Logged in successfully',
             'user': {
-                'id': str(user.id),
-                'username': user.username,
-                'email': user.email
+                'id': str(user['_id']),
+                'username': user['username'],
+                'email': user['email']
             }
         })
     except Exception as e:
@@ -129,7 +148,13 @@ def register_view(request):
         
         # Create user
         user = User(username=username, email=email)
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except passwords.PasswordHasherBusy:
+            return Response({
+                'detail': 'Server busy, please try again',
+                'error': True
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         user.save()
         
         # Store user ID in session
@@ -161,6 +186,7 @@ def register_view(request):
 def logout_view(request):
     """User logout endpoint"""
     try:
+        user_cache.invalidate(user_cache.current_user_id(request))
         request.session.flush()
         return Response({'detail': 'Logged out successfully'})
     except Exception as e:
@@ -174,20 +200,13 @@ def logout_view(request):
 def user_view(request):
     """Get current user info"""
     try:
-        user_id = request.session.get('user_id')
+        user_id = user_cache.current_user_id(request)
         if user_id:
-            try:
-                user = User.objects.get(id=user_id)
-                return Response({
-                    'user': {
-                        'id': str(user.id),
-                        'username': user.username,
-                        'email': user.email
-                    }
-                })
-            except DoesNotExist:
+            profile = user_cache.current_user(request)
+            if profile is None:
                 request.session.flush()
                 return Response({'user': None})
+            return Response({'user': profile})
         return Response({'user': None})
     except Exception as e:
         return Response({
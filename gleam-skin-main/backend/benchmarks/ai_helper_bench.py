@@ -0,0 +1,128 @@
+"""
+Micro-benchmarks for the pure-Python paths in surveys/ai_helper.py:
+
+    parse_generated_survey     JSON extraction from generate_survey_from_conversation
+                               (```json fence, brace fallback, // comments,
+                               trailing-comma retry)
+    parse_analysis_json        JSON extraction in analyze_survey_results
+    aggregate_survey_results   the per-question counting loops, with answers
+                               keyed by question id, by text and by the legacy
+                               q-<index>-<ts> prefix (which scans every key)
+
+Inputs are synthetic (surveys.synthetic) and grow from small to very large
+(up to 200 questions x 100k responses). No model is called.
+
+Save a baseline before changing the code and compare after (see
+harness.py for the options):
+
+    python benchmarks/ai_helper_bench.py --save-baseline            # writes baselines/ai_helper.json
+    python benchmarks/ai_helper_bench.py --compare --threshold 0.15  # exit 1 if any case got >15% slower
+    python benchmarks/ai_helper_bench.py --quick -k aggregate        # skip the very large inputs; filter by name
+"""
+import json
+
+import harness  # also puts the backend directory on sys.path
+
+from surveys import synthetic
+from surveys.ai_helper import aggregate_survey_results, parse_analysis_json, parse_generated_survey
+
+BASELINE_NAME = 'ai_helper'
+
+# (label, questions, responses, large)
+AGGREGATE_SIZES = (
+    ('10q x 100r', 10, 100, False),
+    ('20q x 5k r', 20, 5000, False),
+    ('50q x 20k r', 50, 20000, False),
+    ('200q x 100k r', 200, 100000, True),
+)
+PARSE_SIZES = (('5q', 5, False), ('50q', 50, False), ('200q', 200, True))
+
+
+def make_responses(rng, questions, count, keying):
+    """Responses keyed by question id, by text, or by the legacy q-<index>-<ts> form"""
+    sampler = synthetic.AnswerSampler(questions)
+    by_id = {q['id']: (index, q['text']) for index, q in enumerate(questions)}
+    responses = []
+    for _ in range(count):
+        answers = sampler.sample(rng)
+        if keying == 'text':
+            answers = {by_id[key][1]: value for key, value in answers.items()}
+        elif keying == 'legacy':
+            answers = {f'q-{by_id[key][0]}-1700000000000': value for key, value in answers.items()}
+        responses.append({'responses': answers})
+    return responses
+
+
+def strip_ids(questions):
+    return [{key: value for key, value in q.items() if key != 'id'} for q in questions]
+
+
+def generated_reply(rng, question_count, style):
+    """A model reply carrying a generated survey, in one of the shapes the parser handles"""
+    survey = synthetic.make_survey(rng, question_count)
+    body = json.dumps({'title': survey['title'], 'questions': strip_ids(survey['questions'])}, indent=4)
+    if style == 'fenced':
+        return f'Here is your survey:\n```json\n{body}\n```\nLet me know if you want changes.'
+    if style == 'braces':
+        return f'Sure! Based on the conversation, here is the survey.\n{body}\nHope this helps.'
+    # Comments and trailing commas: the slowest path (regex cleanup + second parse)
+    lines = body.splitlines()
+    noisy = []
+    for line in lines:
+        noisy.append(line)
+        if line.strip().startswith('"type"'):
+            noisy[-1] = line + '  // question type'
+    return 'JSON:\n' + '\n'.join(noisy).replace('\n    ]', ',\n    ]')
+
+
+def analysis_reply(style):
+    body = json.dumps({
+        'sentiment': {'positive': 62, 'neutral': 25, 'negative': 13},
+        'keyInsights': [f'Insight number {i} about the respondents.' for i in range(5)],
+        'improvementSuggestions': [f'Suggestion {i}.' for i in range(5)],
+        'keywords': ['Pricing', 'Support', 'Speed', 'Quality', 'UX'],
+        'executiveSummary': 'The survey results indicate broad satisfaction. ' * 20,
+    }, indent=2)
+    if style == 'fenced':
+        return f'```json\n{body}\n```'
+    return f'Here is the analysis you asked for:\n{body}\nThanks.'
+
+
+def build_cases(quick):
+    """[(name, callable, rounds)]; inputs are built here, outside the timed calls"""
+    rng = synthetic.default_rng(43)
+    cases = []
+    for label, question_count, response_count, large in AGGREGATE_SIZES:
+        if large and quick:
+            continue
+        questions = synthetic.make_questions(rng, question_count)
+        rounds = 3 if large else 7
+        for keying in ('id', 'text', 'legacy'):
+            responses = make_responses(rng, questions, response_count, keying)
+            cases.append((
+                f'aggregate_survey_results[{label}, keyed by {keying}]',
+                lambda q=questions, r=responses: aggregate_survey_results('Benchmark', q, r),
+                rounds,
+            ))
+    for label, question_count, large in PARSE_SIZES:
+        if large and quick:
+            continue
+        for style in ('fenced', 'braces', 'noisy'):
+            reply = generated_reply(rng, question_count, style)
+            cases.append((
+                f'parse_generated_survey[{label}, {style}]',
+                lambda text=reply: parse_generated_survey(text),
+                200 if not large else 50,
+            ))
+    for style in ('fenced', 'braces'):
+        reply = analysis_reply(style)
+        cases.append((f'parse_analysis_json[{style}]', lambda text=reply: parse_analysis_json(text), 500))
+    return cases
+
+
+def main():
+    harness.main(__doc__, build_cases, BASELINE_NAME)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Shared runner for the benchmark scripts in this directory.
+
+A benchmark script provides build_cases(quick) -> [(name, callable, rounds)]
+and calls main(). Each case is timed as the best of `rounds` calls (like
+pytest-benchmark's min), with the garbage collector paused. Baselines are
+per machine, stored in baselines/<name>.json:
+
+    --save-baseline        store this run as the baseline
+    --compare              compare with the baseline; exit 1 if a case's best
+                           time is more than --threshold (default 15%) slower
+    --quick                skip the very large inputs
+    -k TEXT                only run cases whose name contains TEXT
+    --json PATH            also write this run to PATH
+
+A baseline recorded on another Python version or machine is reported but
+not trusted for the gate unless --force is given.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def measure(fn, rounds):
+    """Best and median wall time of `rounds` calls, with the collector paused"""
+    fn()  # warm up caches (compiled regexes, interned strings)
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {'min_s': min(timings), 'median_s': statistics.median(timings), 'rounds': rounds}
+
+
+def environment():
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'machine': platform.machine(), 'node': platform.node()}
+
+
+def compare(results, baseline, threshold, force):
+    """Print the change per case; return the names of cases over the threshold"""
+    current_env = environment()
+    same_env = {k: v for k, v in baseline['environment'].items() if k != 'node'} == \
+               {k: v for k, v in current_env.items() if k != 'node'}
+    if not same_env:
+        print(f"\nBaseline environment differs: {baseline['environment']}")
+    print(f'\nAgainst baseline (best time, fail above +{threshold:.0%}):')
+    failed = []
+    for name, current in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f'  {"new":>8}  {name}')
+            continue
+        change = current['min_s'] / before['min_s'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  SLOWER'
+            failed.append(name)
+        print(f'  {change:>+8.1%}  {name}{flag}')
+    if failed and not same_env and not force:
+        print('\nNot failing: baseline is from another environment (use --force to gate anyway)')
+        return []
+    return failed
+
+
+def main(description, build_cases, baseline_name):
+    baseline_path = os.path.join(BENCHMARKS_DIR, 'baselines', f'{baseline_name}.json')
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='keyword', help='only run cases whose name contains this')
+    parser.add_argument('--quick', action='store_true', help='skip the very large inputs')
+    parser.add_argument('--save-baseline', action='store_true', help=f'store results in {os.path.relpath(baseline_path)}')
+    parser.add_argument('--compare', action='store_true', help='compare with the stored baseline and gate on --threshold')
+    parser.add_argument('--threshold', type=float, default=0.15, help='allowed slowdown of the best time (0.15 = 15%%)')
+    parser.add_argument('--baseline', default=baseline_path, help='baseline file to save to / compare with')
+    parser.add_argument('--force', action='store_true', help='gate even if the baseline came from another environment')
+    parser.add_argument('--json', dest='json_path', help='also write this run to a file')
+    options = parser.parse_args()
+
+    cases = [c for c in build_cases(options.quick) if not options.keyword or options.keyword in c[0]]
+    results = {}
+    for name, fn, rounds in cases:
+        results[name] = measure(fn, rounds)
+        print(f"  {results[name]['min_s'] * 1000:>10.3f} ms  (median {results[name]['median_s'] * 1000:.3f})  {name}")
+
+    report = {'environment': environment(), 'results': results}
+    if options.json_path:
+        with open(options.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failed = []
+    if options.compare:
+        if not os.path.exists(options.baseline):
+            sys.exit(f'No baseline at {options.baseline}; run with --save-baseline first')
+        with open(options.baseline) as f:
+            failed = compare(results, json.load(f), options.threshold, options.force)
+
+    if options.save_baseline:
+        os.makedirs(os.path.dirname(options.baseline), exist_ok=True)
+        merged = report
+        if os.path.exists(options.baseline) and options.keyword:
+            # A filtered run only replaces the cases it ran
+            with open(options.baseline) as f:
+                merged = json.load(f)
+            merged['environment'] = report['environment']
+            merged['results'].update(results)
+        with open(options.baseline, 'w') as f:
+            json.dump(merged, f, indent=2, sort_keys=True)
+        print(f'\nBaseline written to {options.baseline}')
+
+    if failed:
+        print(f'\nFAIL: {len(failed)} case(s) slower than the baseline by more than {options.threshold:.0%}')
+        sys.exit(1)
@@ -0,0 +1,127 @@
+"""
+Benchmarks of the API read path: DRF serializers + DRF's JSONRenderer
+against the raw-row path (MongoEngineSerializer.represent_rows) + the
+orjson renderer, plus JSONParser against FastJSONParser for bulk uploads.
+
+    documents path   SurveyResponse._from_son(row) for every row (what a
+                     QuerySet does), SurveyResponseSerializer(many=True).data,
+                     JSONRenderer().render
+    raw path         represent_rows(rows), FastJSONRenderer().render
+
+The documents path here does not pay for the `survey` reference
+dereference that a real listing does per response, so it understates the
+gap. Without orjson installed the fast renderer and parser fall back to
+DRF's, and the raw cases are skipped.
+
+    python benchmarks/serialization_bench.py --save-baseline
+    python benchmarks/serialization_bench.py --compare
+"""
+import datetime
+import json
+import os
+
+import harness  # also puts the backend directory on sys.path
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gleam_backend.settings')
+django.setup()
+
+from bson import ObjectId  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from gleam_backend.renderers import FastJSONParser, FastJSONRenderer, fast_json_enabled  # noqa: E402
+from surveys import synthetic  # noqa: E402
+from surveys.models import Survey, SurveyResponse  # noqa: E402
+from surveys.serializers import SurveyResponseSerializer  # noqa: E402
+
+BASELINE_NAME = 'serialization'
+
+# (label, questions, responses, large)
+LISTING_SIZES = (
+    ('15q x 1k', 15, 1000, False),
+    ('15q x 10k', 15, 10000, False),
+    ('50q x 50k', 50, 50000, True),
+)
+
+
+def make_rows(rng, question_count, count):
+    """Response rows as as_pymongo() returns them"""
+    questions = synthetic.make_questions(rng, question_count)
+    sampler = synthetic.AnswerSampler(questions)
+    survey_id = ObjectId()
+    launched = datetime.datetime(2026, 1, 1)
+    now = datetime.datetime(2026, 3, 1)
+    return survey_id, [{
+        '_id': ObjectId(),
+        'survey': survey_id,
+        'respondent_email': synthetic.make_email(rng),
+        'responses': sampler.sample(rng),
+        'completed_at': synthetic.make_completed_at(rng, launched, now).replace(microsecond=rng.randrange(1000) * 1000),
+    } for _ in range(count)]
+
+
+def documents_path(rows, survey_stub):
+    documents = []
+    for row in rows:
+        document = SurveyResponse._from_son(row)
+        # Stand in for the dereference so no database is needed
+        document._data['survey'] = survey_stub
+        documents.append(document)
+    return JSONRenderer().render(SurveyResponseSerializer(documents, many=True).data)
+
+
+def raw_path(rows):
+    return FastJSONRenderer().render(SurveyResponseSerializer.represent_rows(rows))
+
+
+def build_cases(quick):
+    rng = synthetic.default_rng(44)
+    cases = []
+    for label, question_count, count, large in LISTING_SIZES:
+        if large and quick:
+            continue
+        survey_id, rows = make_rows(rng, question_count, count)
+        survey_stub = Survey(id=survey_id)
+        rounds = 3 if large else 5
+        cases.append((f'list responses[{label}] documents + DRF', lambda r=rows, s=survey_stub: documents_path(r, s), rounds))
+        if fast_json_enabled():
+            cases.append((f'list responses[{label}] raw rows + orjson', lambda r=rows: raw_path(r), rounds))
+
+        # Same payload rendered both ways, to separate rendering from serializing
+        payload = SurveyResponseSerializer.represent_rows(rows)
+        for item in payload:
+            item['completed_at'] = item['completed_at'].isoformat() + 'Z'
+        cases.append((f'render[{label}] JSONRenderer', lambda p=payload: JSONRenderer().render(p), rounds))
+        if fast_json_enabled():
+            cases.append((f'render[{label}] FastJSONRenderer', lambda p=payload: FastJSONRenderer().render(p), rounds))
+
+    for count in (1000, 10000):
+        _, rows = make_rows(rng, 15, count)
+        body = json.dumps({'responses': [
+            {'survey_id': str(r['survey']), 'respondent_email': r['respondent_email'], 'responses': r['responses']}
+            for r in rows
+        ]}).encode('utf-8')
+        cases.append((f'parse bulk upload[{count}] JSONParser', lambda b=body: JSONParser().parse(_Stream(b)), 5))
+        if fast_json_enabled():
+            cases.append((f'parse bulk upload[{count}] FastJSONParser', lambda b=body: FastJSONParser().parse(_Stream(b)), 5))
+    return cases
+
+
+class _Stream:
+    """Minimal request stream: both parsers only call read()"""
+
+    def __init__(self, body):
+        self.body = body
+
+    def read(self, *args):
+        return self.body
+
+
+def main():
+    harness.main(__doc__, build_cases, BASELINE_NAME)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+In-process metrics in the Prometheus text exposition format, served at /metrics.
+
+Everything is aggregated per process in plain dicts under one lock per
+metric, so recording a value costs a dict lookup and a few additions; no
+client library or external service is involved. Under a multi-process
+server (gunicorn workers) each process keeps its own numbers and a scrape
+sees the worker that answered it; give each worker its own port or scrape
+through a sidecar if per-worker totals need to be combined.
+
+Metrics:
+
+    http_request_duration_seconds{method,route,status}         histogram
+    mongo_command_duration_seconds{command,collection}         histogram
+    mongo_command_failures_total{command,collection}           counter
+    llm_request_duration_seconds{model,function}               histogram
+    llm_tokens_total{model,function,kind}                      counter
+    llm_errors_total{model,function}                           counter
+    cache_lookups_total{cache,result}                          counter
+    cache_hit_ratio{cache}                                     gauge (at scrape)
+    mongo_pool_connections{server,state}                       gauge (at scrape)
+    mongo_pool_checkout_failures_total{server}                 counter (at scrape)
+    mongo_target_info{alias,hosts,database}                    gauge (at scrape)
+    response_spool_*                                           write-behind spool (at scrape)
+
+Other modules contribute scrape-time values with register_collector().
+
+Like timing.py this module is imported at settings time and must not import
+Django at module level.
+"""
+import bisect
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+MONGO_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+_INF = 'le="+Inf"'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        for labelvalues, value in sorted(self.values().items()):
+            yield f'{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}'
+
+
+class Histogram:
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labelvalues -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for labelvalues, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                yield f'{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}'
+            yield f'{self.name}_bucket{_labels(self.labelnames, labelvalues, _INF)} {values[-1]}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(values[-2])}'
+            yield f'{self.name}_count{_labels(self.labelnames, labelvalues)} {values[-1]}'
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """
+        collector() returns [(name, kind, documentation, [(labels_dict, value)])];
+        it runs on every scrape, so it must be cheap and must not query MongoDB.
+        """
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+register_collector = REGISTRY.register_collector
+
+request_duration = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Time to handle an HTTP request.', ('method', 'route', 'status'),
+))
+mongo_command_duration = REGISTRY.register(Histogram(
+    'mongo_command_duration_seconds', 'MongoDB command round trip.', ('command', 'collection'), MONGO_BUCKETS,
+))
+mongo_command_failures = REGISTRY.register(Counter(
+    'mongo_command_failures_total', 'MongoDB commands that returned an error.', ('command', 'collection'),
+))
+llm_duration = REGISTRY.register(Histogram(
+    'llm_request_duration_seconds', 'Hugging Face inference call duration.', ('model', 'function'), LLM_BUCKETS,
+))
+llm_tokens = REGISTRY.register(Counter(
+    'llm_tokens_total', 'Tokens reported by the inference API.', ('model', 'function', 'kind'),
+))
+llm_errors = REGISTRY.register(Counter(
+    'llm_errors_total', 'Inference calls that raised.', ('model', 'function'),
+))
+cache_lookups = REGISTRY.register(Counter(
+    'cache_lookups_total', 'Lookups in in-process and shared caches.', ('cache', 'result'),
+))
+
+
+def cache_hit(cache):
+    cache_lookups.inc(cache, 'hit')
+
+
+def cache_miss(cache):
+    cache_lookups.inc(cache, 'miss')
+
+
+@register_collector
+def _cache_ratios():
+    totals = {}
+    for (cache, result), value in cache_lookups.values().items():
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result == 'hit' else 0), lookups + value)
+    return [(
+        'cache_hit_ratio', 'gauge', 'Share of cache lookups that hit, since process start.',
+        [({'cache': cache}, round(hits / lookups, 4)) for cache, (hits, lookups) in sorted(totals.items()) if lookups],
+    )]
+
+
+@register_collector
+def _process():
+    return [('process_uptime_seconds', 'gauge', 'Seconds since this process loaded the metrics module.',
+             [({}, round(time.time() - _started, 3))])]
+
+
+_started = time.time()
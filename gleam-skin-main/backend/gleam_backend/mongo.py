@@ -0,0 +1,229 @@
+"""
+MongoDB connection setup.
+
+Every client option comes from the environment:
+
+    MONGO_URI                           connection string (required)
+    MONGO_DB_NAME                       database name (default gleam_surveys)
+    MONGO_MAX_POOL_SIZE                 connections per server (default 100)
+    MONGO_MIN_POOL_SIZE                 connections kept open (default 0)
+    MONGO_MAX_IDLE_TIME_MS              close idle connections after this long
+    MONGO_WAIT_QUEUE_TIMEOUT_MS         max wait for a free pooled connection
+    MONGO_SERVER_SELECTION_TIMEOUT_MS   (default 10000)
+    MONGO_CONNECT_TIMEOUT_MS            (default 10000)
+    MONGO_SOCKET_TIMEOUT_MS             per-operation socket timeout
+    MONGO_COMPRESSORS                   e.g. "zstd,snappy,zlib"; zstd and snappy
+                                        need the zstandard / python-snappy packages
+    MONGO_ANALYTICS_URI                 defaults to MONGO_URI
+    MONGO_ANALYTICS_READ_PREFERENCE     default secondaryPreferred
+
+Two aliases are registered: 'default' for normal traffic and 'analytics'
+(ANALYTICS_ALIAS) for analytics and export reads, which prefers secondaries
+so heavy scans stay off the primary. Pool activity of both clients is
+recorded by pool_listener; see pool_stats(). Command durations go to the
+current request's Server-Timing (timing.command_listener) and to the N+1
+and slow-command checks (query_audit.audit_listener).
+
+Registration is lazy: no MongoClient exists until the first query in a
+process, so management commands that never touch Mongo skip the TLS
+handshake, and pre-fork servers (gunicorn --preload) do not hand a client
+to their workers. If a client was created before a fork, the child drops it
+and connects again on first use. With MONGO_WARMUP=True each process (and
+each forked worker) connects in the background right away and pymongo fills
+the pool up to MONGO_MIN_POOL_SIZE.
+"""
+import logging
+import os
+import threading
+
+import certifi
+import mongoengine
+from pymongo import monitoring
+
+from . import metrics
+from .query_audit import audit_listener
+from .timing import command_listener
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALIAS = mongoengine.DEFAULT_CONNECTION_NAME
+ANALYTICS_ALIAS = 'analytics'
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Keeps live counters per connection pool (one pool per client and server)"""
+
+    FIELDS = ('created', 'closed', 'checked_out', 'checked_in', 'checkout_started', 'checkout_failed', 'cleared')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _bump(self, event, field):
+        key = f'{event.address[0]}:{event.address[1]}'
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = dict.fromkeys(self.FIELDS, 0)
+            pool[field] += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event, 'cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event, 'created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event, 'closed')
+
+    def connection_check_out_started(self, event):
+        self._bump(event, 'checkout_started')
+
+    def connection_check_out_failed(self, event):
+        self._bump(event, 'checkout_failed')
+
+    def connection_checked_out(self, event):
+        self._bump(event, 'checked_out')
+
+    def connection_checked_in(self, event):
+        self._bump(event, 'checked_in')
+
+    def snapshot(self):
+        """Counters plus derived gauges (open, in_use, waiting) per server"""
+        with self._lock:
+            pools = {key: dict(values) for key, values in self._pools.items()}
+        for values in pools.values():
+            values['open'] = values['created'] - values['closed']
+            values['in_use'] = values['checked_out'] - values['checked_in']
+            values['waiting'] = max(0, values['checkout_started'] - values['checked_out'] - values['checkout_failed'])
+        return pools
+
+
+pool_listener = PoolStatsListener()
+
+
+def _int_env(name, default=None):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def client_options():
+    """MongoClient keyword arguments shared by every alias"""
+    options = {
+        'maxPoolSize': _int_env('MONGO_MAX_POOL_SIZE', 100),
+        'minPoolSize': _int_env('MONGO_MIN_POOL_SIZE', 0),
+        'serverSelectionTimeoutMS': _int_env('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000),
+        'connectTimeoutMS': _int_env('MONGO_CONNECT_TIMEOUT_MS', 10000),
+        'event_listeners': [pool_listener, command_listener, audit_listener],
+    }
+    optional = {
+        'maxIdleTimeMS': _int_env('MONGO_MAX_IDLE_TIME_MS'),
+        'waitQueueTimeoutMS': _int_env('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+        'socketTimeoutMS': _int_env('MONGO_SOCKET_TIMEOUT_MS'),
+    }
+    options.update({key: value for key, value in optional.items() if value is not None})
+
+    compressors = os.getenv('MONGO_COMPRESSORS', '').strip()
+    if compressors:
+        options['compressors'] = compressors
+
+    # Atlas (SRV or explicit TLS) needs a CA bundle; a local mongod usually runs without TLS
+    uri = (os.getenv('MONGO_URI') or '').lower()
+    if uri.startswith('mongodb+srv://') or 'tls=true' in uri or 'ssl=true' in uri:
+        options['tlsCAFile'] = certifi.where()
+    return options
+
+
+def uri_hosts(uri):
+    """host[:port] list of a connection string, without credentials or options"""
+    hosts = (uri or '').split('://', 1)[-1].split('/', 1)[0].split('?', 1)[0]
+    return hosts.rsplit('@', 1)[-1]
+
+
+def register_all():
+    """Register the default and analytics aliases; nothing connects until first use"""
+    db_name = os.getenv('MONGO_DB_NAME', 'gleam_surveys')
+    options = client_options()
+    options['connect'] = False
+    mongoengine.register_connection(DEFAULT_ALIAS, db=db_name, host=os.getenv('MONGO_URI'), **options)
+
+    analytics_options = dict(options)
+    analytics_options['readPreference'] = os.getenv('MONGO_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+    analytics_options['minPoolSize'] = 0
+    mongoengine.register_connection(
+        ANALYTICS_ALIAS,
+        db=db_name,
+        host=os.getenv('MONGO_ANALYTICS_URI') or os.getenv('MONGO_URI'),
+        **analytics_options
+    )
+
+
+def reset_after_fork():
+    """
+    Replace clients inherited from the parent process. disconnect_all() also
+    detaches the documents' cached collections; closing an inherited client
+    does not touch the parent's sockets, pymongo resets pools whose pid
+    changed. The aliases are then registered again, still lazily.
+    """
+    mongoengine.disconnect_all()
+    register_all()
+
+
+def warmup():
+    """Connect the default alias now so the first request does not pay for it"""
+    try:
+        mongoengine.get_connection(DEFAULT_ALIAS).admin.command('ping')
+    except Exception as e:
+        logger.warning('MongoDB warmup failed: %s', e)
+
+
+def warmup_enabled():
+    return os.getenv('MONGO_WARMUP', 'False') == 'True'
+
+
+def start_warmup():
+    if warmup_enabled():
+        threading.Thread(target=warmup, name='mongo-warmup', daemon=True).start()
+
+
+def _after_fork_in_child():
+    reset_after_fork()
+    start_warmup()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def pool_stats():
+    return pool_listener.snapshot()
+
+
+@metrics.register_collector
+def _pool_metrics():
+    pools = pool_stats()
+    return [
+        ('mongo_pool_connections', 'gauge', 'Pooled MongoDB connections by state.', [
+            ({'server': server, 'state': state}, values[state])
+            for server, values in sorted(pools.items()) for state in ('open', 'in_use', 'waiting')
+        ]),
+        ('mongo_pool_checkout_failures_total', 'counter', 'Connection checkouts that failed or timed out.', [
+            ({'server': server}, values['checkout_failed']) for server, values in sorted(pools.items())
+        ]),
+        ('mongo_target_info', 'gauge', 'MongoDB hosts and database each alias is registered with.', [
+            ({'alias': alias, 'hosts': uri_hosts(host), 'database': os.getenv('MONGO_DB_NAME', 'gleam_surveys')}, 1)
+            for alias, host in ((DEFAULT_ALIAS, os.getenv('MONGO_URI')),
+                                (ANALYTICS_ALIAS, os.getenv('MONGO_ANALYTICS_URI') or os.getenv('MONGO_URI')))
+        ]),
+    ]
@@ -0,0 +1,289 @@
+"""
+MongoDB query auditing for development and tests.
+
+QueryAuditListener sees every command sent by any client. It does three things:
+
+  * Appends each command to the QueryLogs that are active in the current
+    context: one per request (QueryAuditMiddleware) and/or one per
+    query_budget() block.
+  * At the end of a request, warns about N+1 patterns, meaning the same
+    command shape repeated at least MONGO_N_PLUS_ONE_THRESHOLD times. The
+    shape is the command, the collection and the filter with its values
+    removed, so `find survey_response {survey: ?}` issued once per survey
+    in a serializer shows up as a single shape with a high count.
+  * Logs commands slower than MONGO_SLOW_COMMAND_MS with their filter shape
+    (the literal filter when MONGO_SLOW_LOG_VALUES is on) and, with
+    MONGO_SLOW_EXPLAIN, a summary of the winning plan such as
+    `FETCH > IXSCAN survey_1_completed_at_1` or `COLLSCAN`. Explains run on
+    a background thread, once per shape, so the request is never delayed.
+
+In tests, fail when a view goes over its query budget:
+
+    with query_budget(3, max_repeats=2):
+        client.get('/api/surveys/')
+
+query_budget raises QueryBudgetExceeded (an AssertionError) and lists the
+commands that were issued.
+
+Settings are read lazily: this module is imported from settings.py through
+mongo.client_options().
+"""
+import contextvars
+import json
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Cursor traffic and session housekeeping, not queries of their own
+IGNORED_COMMANDS = frozenset(('getMore', 'killCursors', 'endSessions', 'hello', 'isMaster', 'ismaster', 'ping'))
+EXPLAINABLE = frozenset(('find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify'))
+
+_active = contextvars.ContextVar('query_logs', default=())
+_explaining = contextvars.ContextVar('query_audit_explaining', default=False)
+
+
+def _setting(name, default):
+    from django.conf import settings
+    return getattr(settings, name, default)
+
+
+def _collection_name(command_name, command):
+    value = command.get(command_name)
+    return value if isinstance(value, str) else ''
+
+
+def command_filter(command_name, command):
+    """The part of a command that decides which documents it touches"""
+    if command_name in ('find', 'findAndModify'):
+        return command.get('filter', command.get('query'))
+    if command_name in ('count', 'distinct'):
+        return command.get('query')
+    if command_name == 'aggregate':
+        return command.get('pipeline')
+    if command_name == 'update':
+        return [update.get('q') for update in command.get('updates', ())]
+    if command_name == 'delete':
+        return [delete.get('q') for delete in command.get('deletes', ())]
+    return None
+
+
+def shape_of(value):
+    """Structure of a filter with literal values replaced by '?'"""
+    if isinstance(value, dict):
+        return {key: shape_of(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = shape_of(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return '?'
+
+
+class QueryRecord:
+    __slots__ = ('command', 'collection', 'shape', 'seconds', 'failed')
+
+    def __init__(self, command, collection, shape, seconds, failed):
+        self.command = command
+        self.collection = collection
+        self.shape = shape
+        self.seconds = seconds
+        self.failed = failed
+
+    def __str__(self):
+        return f'{self.command} {self.collection} {self.shape} ({self.seconds * 1000:.1f} ms)'
+
+
+class QueryLog:
+    """Commands issued while this log was active, in order"""
+
+    def __init__(self):
+        self.records = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def repeats(self, threshold):
+        """[(count, shape_key)] for command shapes issued at least threshold times"""
+        counts = Counter(f'{r.command} {r.collection} {r.shape}' for r in self.records)
+        return [(count, key) for key, count in counts.most_common() if count >= threshold]
+
+    def report(self):
+        return '\n'.join(f'  {index}. {record}' for index, record in enumerate(self.records, 1))
+
+
+@contextmanager
+def capture():
+    """Record the commands issued inside the block into a new QueryLog"""
+    log = QueryLog()
+    token = _active.set(_active.get() + (log,))
+    try:
+        yield log
+    finally:
+        _active.reset(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_commands, max_repeats=None):
+    """
+    Fail with QueryBudgetExceeded if the block issues more than max_commands
+    MongoDB commands, or repeats one command shape more than max_repeats times.
+    """
+    with capture() as log:
+        yield log
+    problems = []
+    if len(log) > max_commands:
+        problems.append(f'{len(log)} MongoDB commands issued, budget is {max_commands}')
+    if max_repeats is not None:
+        for count, key in log.repeats(max_repeats + 1):
+            problems.append(f'{count}x {key} (max {max_repeats} repeats)')
+    if problems:
+        raise QueryBudgetExceeded('\n'.join(problems) + '\nCommands:\n' + log.report())
+
+
+class QueryAuditListener(monitoring.CommandListener):
+
+    def __init__(self):
+        self._started = {}
+        self._explained = set()
+        self._explain_lock = threading.Lock()
+        self._executor = None
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS or _explaining.get():
+            return
+        if not _active.get() and not _setting('MONGO_SLOW_COMMAND_MS', 0):
+            return
+        self._started[(event.connection_id, event.request_id)] = (event.command, event.database_name)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        command, database = started
+        seconds = event.duration_micros / 1e6
+        collection = _collection_name(event.command_name, command)
+        filter_ = command_filter(event.command_name, command)
+        shape = json.dumps(shape_of(filter_), sort_keys=True, default=str) if filter_ is not None else ''
+
+        logs = _active.get()
+        if logs:
+            record = QueryRecord(event.command_name, collection, shape, seconds, failed)
+            for log in logs:
+                log.records.append(record)
+
+        slow_ms = _setting('MONGO_SLOW_COMMAND_MS', 0)
+        if slow_ms and seconds * 1000 >= slow_ms:
+            self._log_slow(event.command_name, collection, database, command, filter_, shape, seconds)
+
+    def _log_slow(self, command_name, collection, database, command, filter_, shape, seconds):
+        entry = {
+            'event': 'slow_mongo_command',
+            'command': command_name,
+            'collection': collection,
+            'ms': round(seconds * 1000, 1),
+            'filter': filter_ if _setting('MONGO_SLOW_LOG_VALUES', False) else shape,
+        }
+        key = f'{command_name} {collection} {shape}'
+        if not (_setting('MONGO_SLOW_EXPLAIN', False) and command_name in EXPLAINABLE):
+            logger.warning(json.dumps(entry, default=str))
+            return
+        with self._explain_lock:
+            if key in self._explained:
+                logger.warning(json.dumps(entry, default=str))
+                return
+            if len(self._explained) >= 1000:
+                self._explained.clear()
+            self._explained.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mongo-explain')
+        self._executor.submit(self._explain_and_log, database, command, entry)
+
+    def _explain_and_log(self, database, command, entry):
+        _explaining.set(True)
+        try:
+            entry['plan'] = explain_summary(database, command)
+        except Exception as e:
+            entry['plan'] = f'explain failed: {e}'
+        logger.warning(json.dumps(entry, default=str))
+
+
+def _plan_stages(stage):
+    name = stage.get('stage', '?')
+    if stage.get('indexName'):
+        name = f"{name} {stage['indexName']}"
+    children = [stage['inputStage']] if 'inputStage' in stage else stage.get('inputStages', [])
+    stages = [name]
+    for child in children:
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def explain_summary(database, command):
+    """Winning plan of a command as 'STAGE > STAGE index', from queryPlanner explain"""
+    import mongoengine
+
+    to_explain = {key: value for key, value in command.items() if not key.startswith('$') and key not in ('lsid', 'txnNumber')}
+    db = mongoengine.get_connection()[database]
+    result = db.command('explain', to_explain, verbosity='queryPlanner')
+    planner = result.get('queryPlanner')
+    if planner is None:
+        # aggregate: the first $cursor stage holds the planner output
+        for stage in result.get('stages', ()):
+            if '$cursor' in stage:
+                planner = stage['$cursor'].get('queryPlanner')
+                break
+    if not planner:
+        return 'no plan'
+    plan = planner.get('winningPlan', {})
+    plan = plan.get('queryPlan', plan)  # SBE plans nest the classic tree
+    return ' > '.join(_plan_stages(plan))
+
+
+audit_listener = QueryAuditListener()
+
+
+class QueryAuditMiddleware:
+    """
+    Records each request's MongoDB commands and warns about N+1 patterns.
+    Enabled with MONGO_QUERY_AUDIT (on by default when DEBUG is).
+    """
+
+    def __init__(self, get_response):
+        from django.core.exceptions import MiddlewareNotUsed
+
+        if not _setting('MONGO_QUERY_AUDIT', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with capture() as log:
+            response = self.get_response(request)
+        threshold = _setting('MONGO_N_PLUS_ONE_THRESHOLD', 5)
+        for count, key in log.repeats(threshold):
+            logger.warning(json.dumps({
+                'event': 'n_plus_one',
+                'method': request.method,
+                'path': request.path,
+                'count': count,
+                'query': key,
+                'total_commands': len(log),
+            }))
+        return response
@@ -0,0 +1,64 @@
+"""
+orjson-based JSON renderer and parser for the API.
+
+orjson is in requirements.txt but the import stays optional: without it, or
+with API_FAST_JSON off, both classes behave exactly like DRF's JSONRenderer /
+JSONParser. With
+it, rendering encodes ObjectId and naive UTC datetimes natively, so
+MongoEngineViewSet can hand as_pymongo() rows straight to the renderer (see
+MongoEngineSerializer.represent_rows). Datetimes come out as
+'2026-01-01T10:00:00.123000Z', the same as DRF's DateTimeField.
+"""
+from bson import ObjectId
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils.encoders import JSONEncoder
+
+from .timing import timed
+from .timing_backends import TimedJSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+if orjson is not None:
+    DUMPS_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+_fallback_encoder = JSONEncoder()
+
+
+def fast_json_enabled():
+    return orjson is not None and getattr(settings, 'API_FAST_JSON', True)
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    # Everything else DRF knows how to encode (Decimal, UUID, timedelta, lazy strings, ...)
+    return _fallback_encoder.default(obj)
+
+
+class FastJSONRenderer(TimedJSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not fast_json_enabled():
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        with timed('render'):
+            indent = self.get_indent(accepted_media_type, renderer_context or {})
+            options = DUMPS_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+            return orjson.dumps(data, default=_default, option=options)
+
+
+class FastJSONParser(JSONParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if not fast_json_enabled():
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -17,8 +17,10 @@ from dotenv import load_dotenv
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Load environment variables from .env file
-load_dotenv(os.path.join(BASE_DIR, '.env'), override=True)
+# Load environment variables from .env file. With GLEAM_SKIP_DOTENV=1 the
+# process environment is used as given (load tests, test databases)
+if os.getenv('GLEAM_SKIP_DOTENV') != '1':
+    load_dotenv(os.path.join(BASE_DIR, '.env'), override=True)
 
 SECRET_KEY = 'django-insecure-9-d2#00(mn2b+k4kno#96bd6kpvc-7pg22bh5pp_0qsh-2bzjy'
 
@@ -44,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'gleam_backend.timing.ServerTimingMiddleware',  # first, so it times everything below
+    'gleam_backend.query_audit.QueryAuditMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -77,6 +81,22 @@ CORS_ALLOW_HEADERS = [
 CORS_ALLOW_METHODS = ['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS']
 CORS_PREFLIGHT_MAX_AGE = 86400  # 24 hours
 
+# Password hashing (see authentication/passwords.py)
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))  # existing hashes are upgraded on next login
+BCRYPT_MAX_WORKERS = int(os.getenv('BCRYPT_MAX_WORKERS', 4))
+BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', 64))
+BCRYPT_QUEUE_TIMEOUT = float(os.getenv('BCRYPT_QUEUE_TIMEOUT', 2))
+LAST_LOGIN_UPDATE_INTERVAL = int(os.getenv('LAST_LOGIN_UPDATE_INTERVAL', 5))  # minutes
+
+# Current-user profile cache (see authentication/user_cache.py)
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))  # seconds
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+
+# Sessions live in MongoDB (TTL-indexed), shared by every app node
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'authentication.session_backend')
+SESSION_MONGO_CACHE_TTL = int(os.getenv('SESSION_MONGO_CACHE_TTL', 5))  # seconds; 0 disables the read cache
+SESSION_MONGO_CACHE_SIZE = int(os.getenv('SESSION_MONGO_CACHE_SIZE', 10000))
+
 # Session settings for cross-origin
 SESSION_COOKIE_SAMESITE = 'Lax'
 SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
@@ -114,19 +134,86 @@ DATABASES = {
     }
 }
 
-# MongoDB Configuration
-import mongoengine
-import certifi
+# MongoDB Configuration (pool size, timeouts, compression and the analytics
+# alias are read from the environment; see gleam_backend/mongo.py)
+# Connections are opened lazily on first use in each process.
+from .mongo import register_all
+
+register_all()
 
-mongoengine.connect(
-    host=os.getenv('MONGO_URI'),
-    db='gleam_surveys',
-    tlsCAFile=certifi.where()
-)
-try:
-    print(f" !!! ACTIVE DATABASE: {mongoengine.connection.get_db().name} !!!")
-except:
-    print("Could not determine active database yet.")
+# Query auditing (gleam_backend/query_audit.py): N+1 warnings per request and
+# a slow-command log, optionally with the winning plan from explain
+MONGO_QUERY_AUDIT = os.getenv('MONGO_QUERY_AUDIT', str(DEBUG)) == 'True'
+MONGO_N_PLUS_ONE_THRESHOLD = int(os.getenv('MONGO_N_PLUS_ONE_THRESHOLD', 5))
+MONGO_SLOW_COMMAND_MS = int(os.getenv('MONGO_SLOW_COMMAND_MS', 200))  # 0 disables the slow-command log
+MONGO_SLOW_EXPLAIN = os.getenv('MONGO_SLOW_EXPLAIN', str(DEBUG)) == 'True'
+MONGO_SLOW_LOG_VALUES = os.getenv('MONGO_SLOW_LOG_VALUES', 'False') == 'True'  # filters may contain emails
+
+
+# Caching
+# SURVEY_CACHE_LOCATION should point at a shared backend (e.g. redis://...) when
+# running more than one app node; the in-memory default is per process. With a
+# per-process backend, survey snapshot/validator/answer-key versions are read
+# from MongoDB on each lookup instead of from the cache (see surveys/snapshots.py).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('SURVEY_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('SURVEY_CACHE_LOCATION', 'survonica-default'),
+    }
+}
+
+# Respondent survey snapshots (see surveys/snapshots.py)
+SURVEY_SNAPSHOT_CACHE = 'default'
+SURVEY_SNAPSHOT_LRU_SIZE = int(os.getenv('SURVEY_SNAPSHOT_LRU_SIZE', 1024))
+SURVEY_SNAPSHOT_TIMEOUT = int(os.getenv('SURVEY_SNAPSHOT_TIMEOUT', 3600))
+
+# Compiled per-survey response validators (see surveys/response_rules.py)
+SURVEY_VALIDATOR_CACHE_SIZE = int(os.getenv('SURVEY_VALIDATOR_CACHE_SIZE', 1024))
+SURVEY_MAX_ANSWER_LENGTH = int(os.getenv('SURVEY_MAX_ANSWER_LENGTH', 10000))
+
+# Eligibility pre-check Bloom filters (see surveys/eligibility.py)
+SURVEY_ELIGIBILITY_HOT_SURVEYS = int(os.getenv('SURVEY_ELIGIBILITY_HOT_SURVEYS', 256))
+SURVEY_ELIGIBILITY_BLOOM_MIN_HITS = int(os.getenv('SURVEY_ELIGIBILITY_BLOOM_MIN_HITS', 20))
+SURVEY_ELIGIBILITY_BLOOM_REFRESH = int(os.getenv('SURVEY_ELIGIBILITY_BLOOM_REFRESH', 5))
+SURVEY_ELIGIBILITY_BLOOM_MARGIN = int(os.getenv('SURVEY_ELIGIBILITY_BLOOM_MARGIN', 30))
+
+# Survey results page (GET /api/surveys/<id>/results/, see surveys/results.py)
+SURVEY_RESULTS_PAGE_SIZE = int(os.getenv('SURVEY_RESULTS_PAGE_SIZE', 50))
+SURVEY_RESULTS_MAX_PAGE_SIZE = int(os.getenv('SURVEY_RESULTS_MAX_PAGE_SIZE', 500))
+SURVEY_DELTA_MAX_ROWS = int(os.getenv('SURVEY_DELTA_MAX_ROWS', 1000))  # per ?since= call of /api/survey-responses/
+# Responses may commit this long after their _id was generated (spool flushes, clock skew); see surveys/watermark.py
+SURVEY_WATERMARK_SETTLE_SECONDS = int(os.getenv('SURVEY_WATERMARK_SETTLE_SECONDS', 5))
+
+# Live results over SSE (GET /api/surveys/<id>/live/, see surveys/live.py). Each
+# open stream holds a worker thread for up to SURVEY_LIVE_MAX_SECONDS: run gunicorn
+# with --worker-class gthread and set SURVEY_LIVE_MAX_STREAMS below --threads, so
+# other requests still get a thread (0: no cap; refused streams fall back to polling).
+SURVEY_LIVE_MAX_STREAMS = int(os.getenv('SURVEY_LIVE_MAX_STREAMS', 0))  # per process
+SURVEY_LIVE_CHANGE_STREAMS = os.getenv('SURVEY_LIVE_CHANGE_STREAMS', 'True') == 'True'  # needs a replica set
+SURVEY_LIVE_POLL_SECONDS = float(os.getenv('SURVEY_LIVE_POLL_SECONDS', 2))  # fallback without change streams
+SURVEY_LIVE_IDLE_SECONDS = int(os.getenv('SURVEY_LIVE_IDLE_SECONDS', 30))
+SURVEY_LIVE_START_TIMEOUT = float(os.getenv('SURVEY_LIVE_START_TIMEOUT', 5))  # wait for a new watcher to start watching
+SURVEY_LIVE_QUEUE_SIZE = int(os.getenv('SURVEY_LIVE_QUEUE_SIZE', 1000))
+SURVEY_LIVE_CATCH_UP_ROWS = int(os.getenv('SURVEY_LIVE_CATCH_UP_ROWS', 1000))
+SURVEY_LIVE_KEEPALIVE_SECONDS = int(os.getenv('SURVEY_LIVE_KEEPALIVE_SECONDS', 15))
+SURVEY_LIVE_MAX_SECONDS = int(os.getenv('SURVEY_LIVE_MAX_SECONDS', 300))
+
+# Dashboard summary (GET /api/dashboard/summary/, see surveys/dashboard.py)
+DASHBOARD_CACHE = 'default'
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 30))  # seconds; 0 disables the cache
+DASHBOARD_TOP_SURVEYS = int(os.getenv('DASHBOARD_TOP_SURVEYS', 5))
+DASHBOARD_RECENT_RESPONSES = int(os.getenv('DASHBOARD_RECENT_RESPONSES', 10))
+
+# Bulk response ingestion (POST /api/survey-responses/bulk/)
+SURVEY_BULK_MAX_ITEMS = int(os.getenv('SURVEY_BULK_MAX_ITEMS', 10000))
+SURVEY_BULK_CHUNK_SIZE = int(os.getenv('SURVEY_BULK_CHUNK_SIZE', 1000))
+
+# Write-behind response ingestion (see surveys/write_behind.py)
+SURVEY_RESPONSE_WRITE_BEHIND = os.getenv('SURVEY_RESPONSE_WRITE_BEHIND', 'False') == 'True'
+SURVEY_SPOOL_DIR = os.getenv('SURVEY_SPOOL_DIR', str(BASE_DIR / 'spool'))
+SURVEY_SPOOL_BATCH_SIZE = int(os.getenv('SURVEY_SPOOL_BATCH_SIZE', 500))
+SURVEY_SPOOL_FLUSH_INTERVAL = float(os.getenv('SURVEY_SPOOL_FLUSH_INTERVAL', 1.0))
+SURVEY_SPOOL_FSYNC = os.getenv('SURVEY_SPOOL_FSYNC', 'True') == 'True'
 
 
 # Password validation
@@ -172,7 +259,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Forced reload for env update
 
 # Email Configuration
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = 'gleam_backend.timing_backends.TimedSMTPBackend'  # SMTP, timed for Server-Timing
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
@@ -180,3 +267,36 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@survonica.com')
 
+# Django REST framework: JSON goes through orjson when it is installed and
+# API_FAST_JSON is on (see gleam_backend/renderers.py), DRF's json otherwise.
+# Rendering is timed for Server-Timing either way.
+API_FAST_JSON = os.getenv('API_FAST_JSON', 'True') == 'True'
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'gleam_backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'gleam_backend.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# /metrics (Prometheus text format); set a token to require `Authorization: Bearer <token>`
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Logging: per-request timing lines (gleam_backend.timing) and background
+# jobs (write-behind spool, warmup) go to the console
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'gleam_backend': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+        'surveys': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
@@ -0,0 +1,160 @@
+"""
+Per-request time accounting, reported as a Server-Timing header.
+
+ServerTimingMiddleware opens a RequestTimings for every request; code paths
+add to it by category:
+
+    mongo      every MongoDB command (MongoCommandListener)
+    llm        Hugging Face inference calls (surveys.ai_helper)
+    smtp       outgoing email (timing_backends.TimedSMTPBackend)
+    bcrypt     password hashing (authentication.passwords)
+    serialize  DRF serializer .data in MongoEngineViewSet
+    render     JSON rendering of DRF responses (renderers.FastJSONRenderer)
+
+The header lists each category's total duration and call count plus the
+whole request ("total"), so browser devtools show where the time went. The
+same numbers are logged as one JSON line on the `gleam_backend.timing`
+logger, and the request duration feeds the /metrics histograms
+(gleam_backend.metrics). Categories can overlap (a serializer that queries
+Mongo counts in both serialize and mongo).
+
+This module is imported from settings.py (for the Mongo listener), so it
+must not import Django or DRF machinery at module level.
+"""
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('started', 'categories')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.categories = {}
+
+    def add(self, category, seconds):
+        entry = self.categories.get(category)
+        if entry is None:
+            self.categories[category] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def header(self, total):
+        parts = [
+            f'{name};dur={seconds * 1000:.1f};desc="{count} call{"s" if count != 1 else ""}"'
+            for name, (seconds, count) in sorted(self.categories.items())
+        ]
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def current():
+    """RequestTimings of the request being handled on this thread, or None"""
+    return _current.get()
+
+
+def record(category, seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(category, seconds)
+
+
+@contextmanager
+def timed(category):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(category, time.perf_counter() - started)
+
+
+def _collection_name(event):
+    if event.command_name == 'getMore':
+        return event.command.get('collection', '')
+    value = event.command.get(event.command_name)
+    return value if isinstance(value, str) else ''
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Adds each command's server round trip to the current request's 'mongo'
+    time and to the per-collection command metrics
+    """
+
+    def __init__(self):
+        # Only started events carry the command document, so remember the collection until it finishes
+        self._collections = {}
+
+    def started(self, event):
+        self._collections[(event.connection_id, event.request_id)] = _collection_name(event)
+
+    def _finish(self, event):
+        seconds = event.duration_micros / 1e6
+        collection = self._collections.pop((event.connection_id, event.request_id), '')
+        record('mongo', seconds)
+        metrics.mongo_command_duration.observe(seconds, event.command_name, collection)
+        return collection
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        metrics.mongo_command_failures.inc(event.command_name, collection)
+
+
+command_listener = MongoCommandListener()
+
+
+def _route(request):
+    """URL name of the matched view (bounded label), e.g. 'survey-send-invite' or 'analyze-survey'"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class ServerTimingMiddleware:
+    """Collects per-category timings for the request, emits Server-Timing and records request metrics"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - timings.started
+        metrics.request_duration.observe(total, request.method, _route(request), str(response.status_code))
+
+        response['Server-Timing'] = timings.header(total)
+        # Cross-origin pages (the Vite dev server) may only read it with this header
+        response['Timing-Allow-Origin'] = '*'
+
+        logger.info(json.dumps({
+            'event': 'request_timing',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'categories': {
+                name: {'ms': round(seconds * 1000, 1), 'calls': count}
+                for name, (seconds, count) in timings.categories.items()
+            },
+        }))
+        return response
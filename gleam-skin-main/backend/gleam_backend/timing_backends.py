@@ -0,0 +1,19 @@
+"""Email and DRF renderer backends that report their time to gleam_backend.timing"""
+from django.core.mail.backends import smtp
+from rest_framework.renderers import JSONRenderer
+
+from .timing import timed
+
+
+class TimedSMTPBackend(smtp.EmailBackend):
+    """SMTP email backend that reports its time (connect + send) as 'smtp'"""
+
+    def send_messages(self, email_messages):
+        with timed('smtp'):
+            return super().send_messages(email_messages)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gleam_backend.settings')
 
 application = get_wsgi_application()
+
+# Optional: connect to MongoDB in the background now (MONGO_WARMUP=True)
+from gleam_backend.mongo import start_warmup  # noqa: E402
+
+start_warmup()
@@ -0,0 +1,542 @@
+"""
+End-to-end load test for the survey API.
+
+Starts the backend (and, with --start-mongod, a throwaway local mongod),
+creates users and surveys through the API, then runs a weighted mix of
+scenarios from concurrent workers for a fixed time:
+
+    create_survey     editor saves a new survey, then reloads the dashboard
+    open_survey       respondent opens the public page and checks eligibility
+    submit_response   respondent submits one response
+    submit_burst      many respondents submit to one survey back to back
+    view_results      owner opens the results page, then polls it for new responses
+    dashboard         owner lists their surveys
+    analyze           AI analysis of a survey (calls Hugging Face; opt-in)
+
+Throughput and latency percentiles are reported per endpoint and per
+scenario and can be saved as JSON; --compare prints the change against an
+earlier run, so releases can be compared on the same machine.
+
+Usage:
+    python loadtest.py --start-mongod --start-server --duration 60 --concurrency 32
+    python loadtest.py --base-url http://127.0.0.1:8000 --mix event --json run.json
+    python loadtest.py --start-server --json new.json --compare old.json --max-error-rate 0.01
+
+Point --mongo-uri at a disposable database: the run writes users, surveys
+and responses into --db-name (default gleam_loadtest) and never cleans up.
+A server started with --start-server ignores .env (GLEAM_SKIP_DOTENV=1), and
+the run aborts unless its /metrics reports that MongoDB and database.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlencode, urlsplit
+
+from surveys import synthetic
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MIXES = {
+    # Steady state of a busy tenant
+    'default': {'create_survey': 5, 'open_survey': 35, 'submit_response': 30, 'submit_burst': 5,
+                'view_results': 15, 'dashboard': 10},
+    # A survey running live at an event: respondents dominate
+    'event': {'open_survey': 40, 'submit_response': 20, 'submit_burst': 30, 'view_results': 10},
+    # Authoring sessions
+    'editor': {'create_survey': 40, 'dashboard': 40, 'view_results': 20},
+    # Results pages under load, including AI analysis
+    'analysis': {'view_results': 60, 'dashboard': 20, 'analyze': 20},
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, seconds):
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'error_rate': round(errors / len(values), 4) if values else 0,
+        'throughput_rps': round(len(values) / seconds, 2) if seconds else 0,
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'p50_ms': ms(percentile(values, 0.50)),
+        'p90_ms': ms(percentile(values, 0.90)),
+        'p95_ms': ms(percentile(values, 0.95)),
+        'p99_ms': ms(percentile(values, 0.99)),
+        'max_ms': ms(values[-1]) if values else None,
+    }
+
+
+class Recorder:
+    """Latencies per label; each worker writes to its own dicts, merged at the end"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+        self.enabled = False
+
+    def add(self, label, seconds, ok, status_code):
+        if not self.enabled:
+            return
+        self.latencies.setdefault(label, []).append(seconds)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+        key = f'{label} {status_code}'
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def merge(self, other):
+        for label, values in other.latencies.items():
+            self.latencies.setdefault(label, []).extend(values)
+        for label, count in other.errors.items():
+            self.errors[label] = self.errors.get(label, 0) + count
+        for key, count in other.statuses.items():
+            self.statuses[key] = self.statuses.get(key, 0) + count
+
+
+class Client:
+    """Keep-alive HTTP client with a session cookie; one per worker thread"""
+
+    def __init__(self, base_url, recorder, timeout=60):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = {}
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def request(self, method, path, label, body=None, auth=True, ok_statuses=(200, 201, 202, 207, 304)):
+        headers = {'Accept': 'application/json'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if auth and self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+
+        started = time.perf_counter()
+        status_code, payload = 0, None
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            raw = response.read()
+            status_code = response.status
+            if auth:
+                for header in response.headers.get_all('Set-Cookie') or ():
+                    name, _, rest = header.partition('=')
+                    self.cookies[name.strip()] = rest.split(';', 1)[0]
+            if raw and 'json' in (response.getheader('Content-Type') or ''):
+                payload = json.loads(raw)
+        except (OSError, http.client.HTTPException, ValueError):
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+        elapsed = time.perf_counter() - started
+        self.recorder.add(label, elapsed, status_code in ok_statuses, status_code)
+        return status_code, payload
+
+
+class World:
+    """Users, their sessions and surveys; workers add the surveys they create under the lock"""
+
+    def __init__(self):
+        self.users = []  # [(cookies, [survey, ...])]
+        self.surveys = []  # [{'id', 'questions', 'owner'}]
+        self.lock = threading.Lock()
+
+    def add_survey(self, owner, survey_id, questions):
+        survey = {'id': survey_id, 'questions': questions, 'owner': owner}
+        with self.lock:
+            self.surveys.append(survey)
+            self.users[owner][1].append(survey)
+        return survey
+
+
+def create_survey(client, world, rng, owner):
+    body = synthetic.make_survey(rng)
+    status, payload = client.request('POST', '/api/surveys/', 'POST /api/surveys/', body)
+    if status == 201 and payload and payload.get('id'):
+        return world.add_survey(owner, payload['id'], body['questions'])
+    return None
+
+
+def submission(rng, survey):
+    return {
+        'survey_id': survey['id'],
+        'respondent_email': synthetic.make_email(rng),
+        'responses': synthetic.make_answers(rng, survey['questions']),
+    }
+
+
+# Scenarios: each gets the worker's client (logged in as `owner`) and picks its own targets
+
+def scenario_create_survey(client, world, rng, owner):
+    create_survey(client, world, rng, owner)
+    client.request('GET', '/api/surveys/', 'GET /api/surveys/')
+
+
+def scenario_open_survey(client, world, rng, owner):
+    survey = rng.choice(world.surveys)
+    client.request('GET', f"/api/surveys/{survey['id']}/public/", 'GET /api/surveys/<id>/public/', auth=False)
+    query = urlencode({'email': synthetic.make_email(rng)})
+    client.request('GET', f"/api/surveys/{survey['id']}/eligibility/?{query}", 'GET /api/surveys/<id>/eligibility/', auth=False)
+
+
+def scenario_submit_response(client, world, rng, owner):
+    survey = rng.choice(world.surveys)
+    client.request('POST', '/api/survey-responses/', 'POST /api/survey-responses/', submission(rng, survey), auth=False)
+
+
+def scenario_submit_burst(client, world, rng, owner, size=20):
+    survey = rng.choice(world.surveys)
+    for _ in range(size):
+        client.request('POST', '/api/survey-responses/', 'POST /api/survey-responses/ (burst)', submission(rng, survey), auth=False)
+
+
+def scenario_view_results(client, world, rng, owner, polls=3):
+    # What SurveyResults.tsx does: one composite load, then ?since= deltas
+    surveys = world.users[owner][1] or world.surveys
+    survey = rng.choice(surveys)
+    path = f"/api/surveys/{survey['id']}/results/"
+    status, payload = client.request('GET', path, 'GET /api/surveys/<id>/results/')
+    watermark = payload.get('watermark') if status == 200 and payload else None
+    for _ in range(polls if watermark else 0):
+        status, payload = client.request('GET', f"{path}?{urlencode({'since': watermark})}",
+                                         'GET /api/surveys/<id>/results/?since=')
+        if status == 200 and payload:
+            watermark = payload.get('watermark') or watermark
+
+
+def scenario_dashboard(client, world, rng, owner):
+    client.request('GET', '/api/surveys/', 'GET /api/surveys/')
+
+
+def scenario_analyze(client, world, rng, owner):
+    surveys = world.users[owner][1] or world.surveys
+    survey = rng.choice(surveys)
+    client.request('POST', '/api/ai/analyze/', 'POST /api/ai/analyze/', {'surveyId': survey['id']})
+
+
+SCENARIOS = {
+    'create_survey': scenario_create_survey,
+    'open_survey': scenario_open_survey,
+    'submit_response': scenario_submit_response,
+    'submit_burst': scenario_submit_burst,
+    'view_results': scenario_view_results,
+    'dashboard': scenario_dashboard,
+    'analyze': scenario_analyze,
+}
+
+
+def setup(base_url, options, rng):
+    """Register users, create their surveys and give each survey some responses"""
+    world = World()
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    for index in range(options.users):
+        client = Client(base_url, recorder)
+        username = f'loadtest_{run_id}_{index}'
+        status, payload = client.request('POST', '/api/auth/register/', 'setup', {
+            'username': username, 'email': f'{username}@example.com', 'password': 'loadtest-password',
+        })
+        if status not in (200, 201):
+            sys.exit(f'Could not register {username}: HTTP {status} {payload}')
+        world.users.append((dict(client.cookies), []))
+        for _ in range(options.surveys_per_user):
+            survey = create_survey(client, world, rng, index)
+            if survey is None:
+                sys.exit('Could not create a survey during setup')
+            items = [submission(rng, survey) for _ in range(options.initial_responses)]
+            if items:
+                client.request('POST', '/api/survey-responses/bulk/', 'setup', {'responses': items})
+    return world
+
+
+def worker(base_url, world, mix, deadline, recorder, seed, index, scenario_times):
+    rng = synthetic.default_rng(seed * 1000 + index)
+    owner = index % len(world.users)
+    client = Client(base_url, recorder)
+    client.cookies = dict(world.users[owner][0])
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights=weights)[0]
+        started = time.perf_counter()
+        SCENARIOS[name](client, world, rng, owner)
+        if recorder.enabled:
+            scenario_times.setdefault(name, []).append(time.perf_counter() - started)
+
+
+def run(base_url, world, options, mix):
+    recorders = [Recorder() for _ in range(options.concurrency)]
+    scenario_times = [{} for _ in range(options.concurrency)]
+    deadline = time.monotonic() + options.warmup + options.duration
+    threads = [
+        threading.Thread(target=worker, args=(base_url, world, mix, deadline, recorders[i], options.seed, i, scenario_times[i]), daemon=True)
+        for i in range(options.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(options.warmup)
+    measured_from = time.monotonic()
+    for recorder in recorders:
+        recorder.enabled = True
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - measured_from
+
+    merged = Recorder()
+    for recorder in recorders:
+        merged.merge(recorder)
+    scenarios = {}
+    for times in scenario_times:
+        for name, values in times.items():
+            scenarios.setdefault(name, []).extend(values)
+    return merged, scenarios, elapsed
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            sys.exit(f'{process.args[0]} exited with code {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    sys.exit(f'Nothing listening on port {port} after {timeout}s')
+
+
+def start_mongod():
+    binary = shutil.which('mongod')
+    if binary is None:
+        sys.exit('--start-mongod needs a mongod binary on PATH')
+    port = free_port()
+    dbpath = tempfile.mkdtemp(prefix='gleam-loadtest-mongod-')
+    process = subprocess.Popen(
+        [binary, '--dbpath', dbpath, '--port', str(port), '--bind_ip', '127.0.0.1', '--quiet'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    wait_for_port(port, 30, process)
+    return process, f'mongodb://127.0.0.1:{port}', dbpath
+
+
+def start_server(options, mongo_uri):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        'GLEAM_SKIP_DOTENV': '1',  # .env must not override the database below
+        'MONGO_URI': mongo_uri,
+        'MONGO_DB_NAME': options.db_name,
+        'MONGO_QUERY_AUDIT': 'False',
+        'MONGO_SLOW_EXPLAIN': 'False',
+        'LOG_LEVEL': 'WARNING',
+    })
+    if shutil.which('gunicorn') and not options.runserver:
+        args = ['gunicorn', 'gleam_backend.wsgi', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(options.workers), '--threads', str(options.threads)]
+    else:
+        args = [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+    process = subprocess.Popen(args, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port, 60, process)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        check_mongo_target(base_url, mongo_uri, options.db_name)
+    except BaseException:
+        process.terminate()
+        raise
+    return process, base_url, ' '.join(args[:2])
+
+
+def uri_hosts(uri):
+    """host[:port] list of a connection string (gleam_backend.mongo.uri_hosts, which needs pymongo)"""
+    hosts = (uri or '').split('://', 1)[-1].split('/', 1)[0].split('?', 1)[0]
+    return hosts.rsplit('@', 1)[-1]
+
+
+def check_mongo_target(base_url, mongo_uri, db_name):
+    """Exit unless the server reports the MongoDB hosts and database it was started with"""
+    parts = urlsplit(base_url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    headers = {}
+    if os.getenv('METRICS_TOKEN'):
+        headers['Authorization'] = f"Bearer {os.environ['METRICS_TOKEN']}"
+    try:
+        connection.request('GET', '/metrics', headers=headers)
+        response = connection.getresponse()
+        body = response.read().decode('utf-8')
+    finally:
+        connection.close()
+    if response.status != 200:
+        sys.exit(f"Could not check the server's MongoDB: /metrics returned {response.status}")
+    for line in body.splitlines():
+        if line.startswith('mongo_target_info{'):
+            labels = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', line))
+            if labels.get('alias') == 'default':
+                expected = (uri_hosts(mongo_uri), db_name)
+                actual = (labels.get('hosts'), labels.get('database'))
+                if actual != expected:
+                    sys.exit(f'Server uses MongoDB {actual[0]}/{actual[1]}, expected {expected[0]}/{expected[1]}; aborting')
+                return
+    sys.exit("Could not check the server's MongoDB: /metrics has no mongo_target_info")
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_table(title, rows):
+    print(f'\n{title}')
+    print(f"  {'':46} {'reqs':>7} {'rps':>8} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for label, stats in rows.items():
+        print(f"  {label:46} {stats['requests']:>7} {stats['throughput_rps']:>8} {stats['error_rate'] * 100:>6.2f}"
+              f" {stats['p50_ms'] or 0:>8} {stats['p95_ms'] or 0:>8} {stats['p99_ms'] or 0:>8} {stats['max_ms'] or 0:>8}")
+
+
+def print_comparison(report, baseline):
+    print(f"\nChange against {baseline['meta'].get('revision') or 'baseline'} (p95 ms, rps)")
+    for label, stats in report['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(label)
+        if not before or not before.get('p95_ms') or not stats.get('p95_ms'):
+            continue
+        p95_change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        rps_change = (stats['throughput_rps'] - before['throughput_rps']) / before['throughput_rps'] * 100 if before['throughput_rps'] else 0
+        print(f"  {label:46} p95 {before['p95_ms']:>8} -> {stats['p95_ms']:>8} ({p95_change:+.1f}%)"
+              f"   rps {before['throughput_rps']:>8} -> {stats['throughput_rps']:>8} ({rps_change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', help='test a running server instead of starting one')
+    parser.add_argument('--start-server', action='store_true', help='start the backend (gunicorn if installed, else runserver)')
+    parser.add_argument('--runserver', action='store_true', help='use manage.py runserver even if gunicorn is installed')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--start-mongod', action='store_true', help='run a throwaway mongod for the test')
+    parser.add_argument('--mongo-uri', default='mongodb://127.0.0.1:27017')
+    parser.add_argument('--db-name', default='gleam_loadtest')
+    parser.add_argument('--mix', choices=sorted(MIXES), default='default')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds run before measuring')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent virtual users')
+    parser.add_argument('--users', type=int, default=4, help='survey owners created during setup')
+    parser.add_argument('--surveys-per-user', type=int, default=3)
+    parser.add_argument('--initial-responses', type=int, default=200, help='responses per survey created during setup')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path', help='write the report to this file')
+    parser.add_argument('--compare', help='earlier JSON report to compare against')
+    parser.add_argument('--max-error-rate', type=float, help='exit 1 if the overall error rate is higher')
+    options = parser.parse_args()
+
+    if not options.base_url and not options.start_server:
+        parser.error('pass --base-url or --start-server')
+
+    processes = []
+    mongod_dbpath = None
+    server = options.base_url
+    try:
+        mongo_uri = options.mongo_uri
+        if options.start_mongod:
+            mongod, mongo_uri, mongod_dbpath = start_mongod()
+            processes.append(mongod)
+        base_url = options.base_url
+        if options.start_server:
+            process, base_url, server = start_server(options, mongo_uri)
+            processes.append(process)
+
+        rng = synthetic.default_rng(options.seed)
+        print(f'Setting up {options.users} users x {options.surveys_per_user} surveys on {base_url} ...')
+        world = setup(base_url, options, rng)
+        print(f"Running mix '{options.mix}' with {options.concurrency} workers for {options.duration}s "
+              f'(+{options.warmup}s warmup) ...')
+        recorder, scenario_times, elapsed = run(base_url, world, options, MIXES[options.mix])
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if mongod_dbpath:
+            shutil.rmtree(mongod_dbpath, ignore_errors=True)
+
+    endpoints = {label: summarize(values, recorder.errors.get(label, 0), elapsed)
+                 for label, values in sorted(recorder.latencies.items())}
+    scenarios = {name: summarize(values, 0, elapsed) for name, values in sorted(scenario_times.items())}
+    all_latencies = [v for values in recorder.latencies.values() for v in values]
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'server': server,
+            'mix': options.mix,
+            'weights': MIXES[options.mix],
+            'concurrency': options.concurrency,
+            'duration_seconds': round(elapsed, 2),
+            'seed': options.seed,
+        },
+        'totals': summarize(all_latencies, sum(recorder.errors.values()), elapsed),
+        'endpoints': endpoints,
+        'scenarios': scenarios,
+        'status_codes': dict(sorted(recorder.statuses.items())),
+    }
+
+    print_table('Endpoints', endpoints)
+    print_table('Scenarios (whole scenario, ms)', scenarios)
+    totals = report['totals']
+    print(f"\nTotal: {totals['requests']} requests, {totals['throughput_rps']} req/s, "
+          f"p95 {totals['p95_ms']} ms, errors {totals['error_rate'] * 100:.2f}%")
+
+    if options.compare:
+        with open(options.compare) as f:
+            print_comparison(report, json.load(f))
+    if options.json_path:
+        with open(options.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nReport written to {options.json_path}')
+
+    if options.max_error_rate is not None and totals['error_rate'] > options.max_error_rate:
+        print(f"\nFAIL: error rate {totals['error_rate']:.4f} above {options.max_error_rate}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
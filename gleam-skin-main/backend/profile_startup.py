@@ -0,0 +1,98 @@
+"""
+Cold-start profiler for the backend.
+
+Runs manage.py commands in fresh interpreters with `python -X importtime`
+and reports wall time plus the slowest imports (cumulative), so regressions
+in process startup are easy to spot.
+
+Usage:
+    python profile_startup.py                      # default command set
+    python profile_startup.py check "help send_test_email"
+    python profile_startup.py --top 25 --json startup.json
+    python profile_startup.py --max-seconds 3      # exit 1 if any command is slower
+"""
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_COMMANDS = [
+    'check',
+    'help send_test_email',
+    'shell -c "import gleam_backend.wsgi"',
+]
+
+
+def parse_importtime(stderr):
+    """Return [(cumulative_us, self_us, module)] from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, module = line[len('import time:'):].split('|', 2)
+            rows.append((int(cumulative_us), int(self_us), module.rstrip()))
+        except ValueError:
+            continue
+    return rows
+
+
+def profile(command, top):
+    args = [sys.executable, '-X', 'importtime', 'manage.py'] + shlex.split(command)
+    started = time.perf_counter()
+    proc = subprocess.run(args, cwd=BACKEND_DIR, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+
+    rows = parse_importtime(proc.stderr)
+    slowest = sorted(rows, reverse=True)[:top]
+    return {
+        'command': command,
+        'exit_code': proc.returncode,
+        'wall_seconds': round(elapsed, 3),
+        'modules_imported': len(rows),
+        'import_seconds': round(sum(r[1] for r in rows) / 1e6, 3),
+        'slowest_imports': [
+            {'module': module.strip(), 'cumulative_ms': round(cum / 1000, 1), 'self_ms': round(own / 1000, 1),
+             'depth': (len(module) - len(module.lstrip())) // 2}
+            for cum, own, module in slowest
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('commands', nargs='*', default=DEFAULT_COMMANDS)
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list per command')
+    parser.add_argument('--json', dest='json_path', help='also write the report to this file')
+    parser.add_argument('--max-seconds', type=float, help='fail if any command takes longer')
+    options = parser.parse_args()
+
+    reports = []
+    for command in options.commands:
+        report = profile(command, options.top)
+        reports.append(report)
+        print("=" * 60)
+        print(f"manage.py {command}")
+        print(f"  exit code: {report['exit_code']}   wall: {report['wall_seconds']}s   "
+              f"imports: {report['modules_imported']} modules, {report['import_seconds']}s self time")
+        for row in report['slowest_imports']:
+            print(f"  {row['cumulative_ms']:>9.1f} ms  {'  ' * row['depth']}{row['module']}")
+
+    if options.json_path:
+        with open(options.json_path, 'w') as f:
+            json.dump({'python': sys.version, 'reports': reports}, f, indent=2)
+        print(f"\nReport written to {options.json_path}")
+
+    if options.max_seconds is not None:
+        slow = [r for r in reports if r['wall_seconds'] > options.max_seconds]
+        if slow:
+            print(f"\nFAIL: {', '.join(r['command'] for r in slow)} slower than {options.max_seconds}s")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
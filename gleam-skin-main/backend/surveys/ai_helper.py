@@ -1,7 +1,39 @@
 import os
 import json
 import re
+import time
 from huggingface_hub import InferenceClient
+from gleam_backend import metrics, timing
+
+# Question types whose answers are counted per option; all others are free text
+CHOICE_QUESTION_TYPES = ('multiple_choice', 'rating', 'yes_no', 'dropdown')
+AI_TEXT_SAMPLE_SIZE = 20  # text answers per question included in the analysis prompt
+
+def _record_llm_call(function, model, started, failed):
+    seconds = time.perf_counter() - started
+    timing.record('llm', seconds)
+    metrics.llm_duration.observe(seconds, model, function)
+    if failed:
+        metrics.llm_errors.inc(model, function)
+
+def _chat_completion(client, function, **kwargs):
+    """
+    client.chat_completion, reported as 'llm' in Server-Timing and as
+    latency/token/error metrics labelled with the model and calling function
+    """
+    model = kwargs.get('model') or 'default'
+    started = time.perf_counter()
+    try:
+        response = client.chat_completion(**kwargs)
+    except Exception:
+        _record_llm_call(function, model, started, failed=True)
+        raise
+    _record_llm_call(function, model, started, failed=False)
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        metrics.llm_tokens.inc(model, function, 'prompt', amount=getattr(usage, 'prompt_tokens', 0) or 0)
+        metrics.llm_tokens.inc(model, function, 'completion', amount=getattr(usage, 'completion_tokens', 0) or 0)
+    return response
 
 def chat_with_llama(messages: list, api_key: str = None):
     """
@@ -32,7 +64,9 @@ def chat_with_llama(messages: list, api_key: str = None):
         # Combine system message with conversation
         full_messages = [system_message] + messages
         
-        response = client.chat_completion(
+        response = _chat_completion(
+            client,
+            'chat_with_llama',
             messages=full_messages,
             model="meta-llama/Llama-3.2-3B-Instruct",
             max_tokens=500,
@@ -44,6 +78,40 @@ def chat_with_llama(messages: list, api_key: str = None):
     except Exception as e:
         return f"I'm having trouble connecting right now. Error: {str(e)}"
 
+def parse_generated_survey(response_text: str):
+    """
+    Parse the survey JSON out of a model reply: a ```json fence, else the
+    outermost braces; // comments are dropped and trailing commas are
+    removed if the first parse fails.
+    """
+    json_str = ""
+    json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
+    if json_match:
+        json_str = json_match.group(1)
+    else:
+        # Fallback: Find the first { and the last }
+        start_idx = response_text.find('{')
+        end_idx = response_text.rfind('}')
+        if start_idx != -1 and end_idx != -1:
+            json_str = response_text[start_idx:end_idx+1]
+        else:
+            json_str = response_text
+    
+    # Cleanup: Remove comments // ...
+    json_str = re.sub(r'//.*$', '', json_str, flags=re.MULTILINE)
+    
+    try:
+        result = json.loads(json_str)
+    except json.JSONDecodeError:
+        # Last resort: try to remove trailing commas (naive regex)
+        json_str = re.sub(r',\s*([}\]])', r'\1', json_str)
+        result = json.loads(json_str)
+    
+    if 'title' not in result or 'questions' not in result:
+        raise ValueError("Invalid response structure")
+    
+    return result
+
 def generate_survey_from_conversation(conversation_history: list, api_key: str = None):
     """
     Generate survey questions from conversation history using AI
@@ -111,7 +179,9 @@ JSON:"""
             {"role": "user", "content": generation_prompt}
         ]
         
-        response = client.chat_completion(
+        response = _chat_completion(
+            client,
+            'generate_survey_from_conversation',
             messages=messages,
             model="meta-llama/Llama-3.2-3B-Instruct",
             max_tokens=2500,
@@ -119,35 +189,7 @@ JSON:"""
         )
         
         response_text = response.choices[0].message.content
-        
-        # Try to parse JSON from the response
-        json_str = ""
-        json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-        else:
-            # Fallback: Find the first { and the last }
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}')
-            if start_idx != -1 and end_idx != -1:
-                json_str = response_text[start_idx:end_idx+1]
-            else:
-                json_str = response_text
-        
-        # Cleanup: Remove comments // ...
-        json_str = re.sub(r'//.*$', '', json_str, flags=re.MULTILINE)
-        
-        try:
-            result = json.loads(json_str)
-        except json.JSONDecodeError:
-            # Last resort: try to remove trailing commas (naive regex)
-            json_str = re.sub(r',\s*([}\]])', r'\1', json_str)
-            result = json.loads(json_str)
-        
-        if 'title' not in result or 'questions' not in result:
-            raise ValueError("Invalid response structure")
-        
-        return result
+        return parse_generated_survey(response_text)
         
     except Exception as e:
         print(f"AI Generation Error: {str(e)}")
@@ -202,7 +244,9 @@ For each pair of duplicate questions, respond in this exact JSON format:
 Only include pairs that are truly asking the same thing. If no duplicates, return {{"duplicates": []}}.
 Response (JSON only):"""
 
-        response = client.chat_completion(
+        response = _chat_completion(
+            client,
+            'detect_duplicate_questions',
             messages=[{"role": "user", "content": prompt}],
             model="meta-llama/Llama-3.2-3B-Instruct",
             max_tokens=1000,
@@ -279,7 +323,9 @@ Example: {{ "options": ["Satisfied", "Neutral", "Dissatisfied"] }}
 
 JSON Only:"""
 
-        response = client.chat_completion(
+        response = _chat_completion(
+            client,
+            'generate_options_for_question',
             messages=[{"role": "user", "content": prompt}],
             model="meta-llama/Llama-3.2-3B-Instruct",
             max_tokens=200,
@@ -327,7 +373,13 @@ def generate_image_from_text(prompt: str, api_key: str = None):
     
     try:
         # Generate image
-        image = client.text_to_image(prompt)
+        started = time.perf_counter()
+        try:
+            image = client.text_to_image(prompt)
+        except Exception:
+            _record_llm_call('generate_image_from_text', 'default', started, failed=True)
+            raise
+        _record_llm_call('generate_image_from_text', 'default', started, failed=False)
         
         # Convert to Base64
         buffered = BytesIO()
@@ -342,29 +394,29 @@ def generate_image_from_text(prompt: str, api_key: str = None):
         print(f"Error generating image: {e}")
         return { "image": None, "error": str(e) }
 
-def analyze_survey_results(survey_title: str, questions: list, responses: list, api_key: str = None):
+def parse_analysis_json(response_text: str):
+    """JSON object from a model reply: a ```json fence if present, else the outermost braces"""
+    json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
+    if json_match:
+        json_str = json_match.group(1)
+    else:
+        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+        json_str = json_match.group(0) if json_match else response_text
+        
+    return json.loads(json_str)
+
+def aggregate_survey_results(survey_title: str, questions: list, responses: list):
     """
-    Analyze survey results using AI to generate comprehensive insights and reports.
-    
-    Args:
-        survey_title: Title of the survey
-        questions: List of question dicts
-        responses: List of response dicts
-        api_key: Hugging Face API key
-    
+    Per-question answer counts (choice-style questions) or samples (text),
+    plus the plain-text summary that is sent to the model.
+
     Returns:
-        dict containing stats, aggregated_data, and ai_insights
+        (question_stats, text_summary_for_ai)
     """
-    if not api_key:
-        api_key = os.getenv('HUGGINGFACE_API_KEY')
-    
-    # 1. Aggregate Data
     total_responses = len(responses)
     question_stats = []
-    
-    # Text summary for AI
-    text_summary_for_ai = f"Survey Title: {survey_title}\nTotal Responses: {total_responses}\n\n"
-    
+    text_answers = {}
+
     for idx, q in enumerate(questions):
         q_id = str(q.get('id', '')) # Assuming questions have IDs or we match by text if needed
         q_text = q.get('text', '')
@@ -403,7 +455,7 @@ def analyze_survey_results(survey_title: str, questions: list, responses: list,
             'total_answers': len(answers)
         }
         
-        if q_type in ['multiple_choice', 'rating', 'yes_no', 'dropdown']:
+        if q_type in CHOICE_QUESTION_TYPES:
             # Count frequencies
             counts = {}
             for opt in q_options:
@@ -422,17 +474,57 @@ def analyze_survey_results(survey_title: str, questions: list, responses: list,
                 })
             
             stat['stats'] = stats_list
-            text_summary_for_ai += f"Question: {q_text}\nResults: {json.dumps(stats_list)}\n\n"
             
         else:
             # Text analysis
             stat['sampleResponses'] = answers[:5] # Send top 5 to frontend
-            # Send all to AI (truncated if too long)
-            joined_answers = "; ".join([str(a) for a in answers[:20]]) # Limit to 20 text responses for prompt size
-            text_summary_for_ai += f"Question: {q_text}\nText Responses: {joined_answers}\n\n"
+            text_answers[idx] = answers
             
         question_stats.append(stat)
 
+    return question_stats, summarize_for_ai(survey_title, total_responses, question_stats, text_answers)
+
+def summarize_for_ai(survey_title: str, total_responses: int, question_stats: list, text_answers: dict):
+    """
+    Plain-text results summary for the analysis prompt. text_answers maps
+    the index of each text question to its answers; only the first
+    AI_TEXT_SAMPLE_SIZE are included, to bound the prompt size.
+    """
+    summary = f"Survey Title: {survey_title}\nTotal Responses: {total_responses}\n\n"
+    for idx, stat in enumerate(question_stats):
+        if 'stats' in stat:
+            summary += f"Question: {stat['question']}\nResults: {json.dumps(stat['stats'])}\n\n"
+        else:
+            joined_answers = "; ".join([str(a) for a in text_answers.get(idx, [])[:AI_TEXT_SAMPLE_SIZE]])
+            summary += f"Question: {stat['question']}\nText Responses: {joined_answers}\n\n"
+    return summary
+
+def analyze_survey_results(survey_title: str, questions: list, responses: list, api_key: str = None,
+                           aggregated: tuple = None):
+    """
+    Analyze survey results using AI to generate comprehensive insights and reports.
+    
+    Args:
+        survey_title: Title of the survey
+        questions: List of question dicts
+        responses: List of response dicts (ignored when aggregated is given)
+        api_key: Hugging Face API key
+        aggregated: (total_responses, question_stats, text_summary) computed
+            elsewhere, e.g. by surveys.results in MongoDB
+    
+    Returns:
+        dict containing stats, aggregated_data, and ai_insights
+    """
+    if not api_key:
+        api_key = os.getenv('HUGGINGFACE_API_KEY')
+    
+    # 1. Aggregate Data
+    if aggregated is not None:
+        total_responses, question_stats, text_summary_for_ai = aggregated
+    else:
+        total_responses = len(responses)
+        question_stats, text_summary_for_ai = aggregate_survey_results(survey_title, questions, responses)
+
     # 2. AI Analysis
     ai_insights = None
     
@@ -463,7 +555,9 @@ OUTPUT FORMAT (JSON ONLY):
 JSON RESPONSE:"""
 
         try:
-            response = client.chat_completion(
+            response = _chat_completion(
+                client,
+                'analyze_survey_results',
                 messages=[
                     {"role": "system", "content": "You are a senior data analyst. Output valid JSON only."},
                     {"role": "user", "content": prompt}
@@ -474,16 +568,7 @@ JSON RESPONSE:"""
             )
             
             response_text = response.choices[0].message.content.strip()
-            
-            # Robust JSON extraction
-            json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-            else:
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                json_str = json_match.group(0) if json_match else response_text
-                
-            ai_insights = json.loads(json_str)
+            ai_insights = parse_analysis_json(response_text)
             
         except Exception as e:
             print(f"AI Analysis Error: {e}")
@@ -0,0 +1,171 @@
+"""
+Dashboard summary for one survey owner, in one aggregation round trip.
+
+The pipeline starts from the owner's surveys ((user_id, -updated_at)
+index), joins each survey's responses with $lookup on the
+(survey, completed_at) index, and splits the result with $facet into
+totals, the most active and most recently edited surveys and the latest
+responses ($lookup with
+localField and a sub-pipeline needs MongoDB 5.0). Summaries are
+cached per owner for DASHBOARD_CACHE_TTL seconds. Survey writes drop the
+owner's entry (invalidate(); with a per-process cache only in the process
+that wrote); a new response shows up once the entry expires.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import serializers
+
+from gleam_backend import metrics
+from .models import Survey, SurveyResponse
+
+CACHE_KEY = 'dashboard-summary:{}'
+
+
+def _cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE', 'default')]
+
+
+def invalidate(user_id):
+    """Drop the cached summary of one owner after a change to their surveys"""
+    if user_id:
+        _cache().delete(CACHE_KEY.format(user_id))
+
+
+def build_pipeline(user_id, now, top=5, recent=10):
+    last_7 = now - datetime.timedelta(days=7)
+    last_30 = now - datetime.timedelta(days=30)
+    responses = SurveyResponse._get_collection().name
+    return [
+        {'$match': {'user_id': user_id}},
+        {'$lookup': {
+            'from': responses,
+            'localField': '_id',
+            'foreignField': 'survey',
+            'pipeline': [{'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'last_7': {'$sum': {'$cond': [{'$gte': ['$completed_at', last_7]}, 1, 0]}},
+                'last_30': {'$sum': {'$cond': [{'$gte': ['$completed_at', last_30]}, 1, 0]}},
+                'last_response_at': {'$max': '$completed_at'},
+            }}],
+            'as': 'stats',
+        }},
+        {'$lookup': {
+            'from': responses,
+            'localField': '_id',
+            'foreignField': 'survey',
+            'pipeline': [
+                {'$sort': {'completed_at': -1}},
+                {'$limit': recent},
+                {'$project': {'respondent_email': 1, 'completed_at': 1}},
+            ],
+            'as': 'recent',
+        }},
+        {'$project': {
+            'title': 1,
+            'updated_at': 1,
+            'recent': 1,
+            'question_count': {'$size': {'$ifNull': ['$questions', []]}},
+            'total': {'$ifNull': [{'$arrayElemAt': ['$stats.total', 0]}, 0]},
+            'last_7': {'$ifNull': [{'$arrayElemAt': ['$stats.last_7', 0]}, 0]},
+            'last_30': {'$ifNull': [{'$arrayElemAt': ['$stats.last_30', 0]}, 0]},
+            'last_response_at': {'$arrayElemAt': ['$stats.last_response_at', 0]},
+        }},
+        {'$facet': {
+            'totals': [{'$group': {
+                '_id': None,
+                'surveys': {'$sum': 1},
+                'responses': {'$sum': '$total'},
+                'responses_last_7_days': {'$sum': '$last_7'},
+                'responses_last_30_days': {'$sum': '$last_30'},
+            }}],
+            'top_surveys': [
+                {'$sort': {'last_7': -1, 'last_30': -1, 'total': -1, 'updated_at': -1}},
+                {'$limit': top},
+                {'$project': {'recent': 0}},
+            ],
+            'recent_surveys': [
+                {'$sort': {'updated_at': -1}},
+                {'$limit': top},
+                {'$project': {'recent': 0}},
+            ],
+            'recent_responses': [
+                {'$unwind': '$recent'},
+                {'$sort': {'recent.completed_at': -1}},
+                {'$limit': recent},
+                {'$project': {
+                    '_id': '$recent._id',
+                    'survey': '$_id',
+                    'survey_title': '$title',
+                    'respondent_email': '$recent.respondent_email',
+                    'completed_at': '$recent.completed_at',
+                }},
+            ],
+        }},
+    ]
+
+
+def _shape(result):
+    """Aggregation output -> JSON-ready summary (ids as strings, ISO datetimes)"""
+    when = serializers.DateTimeField()
+
+    def iso(value):
+        return when.to_representation(value) if value else None
+
+    def survey(row):
+        return {
+            'id': str(row['_id']),
+            'title': row.get('title'),
+            'question_count': row['question_count'],
+            'response_count': row['total'],
+            'responses_last_7_days': row['last_7'],
+            'responses_last_30_days': row['last_30'],
+            'last_response_at': iso(row.get('last_response_at')),
+            'updated_at': iso(row.get('updated_at')),
+        }
+
+    totals = result['totals'][0] if result['totals'] else {}
+    return {
+        'survey_count': totals.get('surveys', 0),
+        'total_responses': totals.get('responses', 0),
+        'responses_last_7_days': totals.get('responses_last_7_days', 0),
+        'responses_last_30_days': totals.get('responses_last_30_days', 0),
+        'top_surveys': [survey(row) for row in result['top_surveys']],
+        'recent_surveys': [survey(row) for row in result['recent_surveys']],
+        'recent_responses': [{
+            'id': str(row['_id']),
+            'survey': str(row['survey']),
+            'survey_title': row.get('survey_title'),
+            'respondent_email': row.get('respondent_email'),
+            'completed_at': iso(row.get('completed_at')),
+        } for row in result['recent_responses']],
+    }
+
+
+def compute_summary(user_id, now=None):
+    now = now or datetime.datetime.utcnow()
+    pipeline = build_pipeline(user_id, now,
+                              top=getattr(settings, 'DASHBOARD_TOP_SURVEYS', 5),
+                              recent=getattr(settings, 'DASHBOARD_RECENT_RESPONSES', 10))
+    result = next(Survey._get_collection().aggregate(pipeline), None)
+    summary = _shape(result or {'totals': [], 'top_surveys': [], 'recent_surveys': [], 'recent_responses': []})
+    summary['generated_at'] = serializers.DateTimeField().to_representation(now)
+    return summary
+
+
+def get_summary(user_id):
+    """Cached summary of one owner's surveys"""
+    ttl = getattr(settings, 'DASHBOARD_CACHE_TTL', 30)
+    key = CACHE_KEY.format(user_id)
+    if ttl:
+        summary = _cache().get(key)
+        if summary is not None:
+            metrics.cache_hit('dashboard_summary')
+            return summary
+        metrics.cache_miss('dashboard_summary')
+    summary = compute_summary(user_id)
+    if ttl:
+        _cache().set(key, summary, ttl)
+    return summary
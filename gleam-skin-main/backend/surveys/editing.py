@@ -0,0 +1,262 @@
+"""
+Atomic survey edits for the editor.
+
+A PUT rewrites the whole document (every question and the design dict)
+whatever changed. These helpers send only the edit to MongoDB, in a single
+update each:
+
+    patch_survey      field-level diff against the stored survey -> $set/$unset;
+                      questions are matched by id (diff_questions)
+    insert_question   $push with $each/$position
+    update_question   positional $set/$unset of the given keys of one question
+    move_question     pipeline update that cuts the question out and splices it in
+    delete_question   $pull by question id
+
+Questions are addressed by their "id", never by index, so two tabs editing
+the same survey cannot land on the wrong question. All writes go through
+Survey.atomic_update, which keeps updated_at and the snapshots in step.
+"""
+import secrets
+import time
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from mongoengine.errors import DoesNotExist, NotUniqueError
+
+from .models import Survey
+
+# Positions past the end append; capping them keeps $position/$slice within int32
+MAX_POSITION = 100000
+
+
+def _object_id(survey_id):
+    try:
+        return ObjectId(str(survey_id))
+    except InvalidId:
+        raise DoesNotExist
+
+
+def _valid_key(key):
+    return isinstance(key, str) and key and not key.startswith('$') and '.' not in key
+
+
+def diff_fields(stored, changes):
+    """
+    ($set, $unset) turning `stored` into `stored` + `changes`. None removes a
+    field. Dicts are diffed one level down, so changing one design colour
+    writes design.<key> only.
+    """
+    to_set, to_unset = {}, {}
+    for name, value in changes.items():
+        current = stored.get(name)
+        if value is None:
+            if name in stored:
+                to_unset[name] = ''
+        elif current == value:
+            continue
+        elif isinstance(value, dict) and isinstance(current, dict) and all(_valid_key(k) for k in value):
+            for key, item in value.items():
+                if current.get(key) != item or key not in current:
+                    to_set[f'{name}.{key}'] = item
+            for key in current:
+                if key not in value:
+                    to_unset[f'{name}.{key}'] = ''
+        else:
+            to_set[name] = value
+    return to_set, to_unset
+
+
+def _question_ids(questions):
+    """Ids of a question list in order, or None unless each question has a unique string id"""
+    if not isinstance(questions, list):
+        return None
+    ids = [question.get('id') if isinstance(question, dict) else None for question in questions]
+    if not all(isinstance(qid, str) and qid for qid in ids) or len(set(ids)) != len(ids):
+        return None
+    return ids
+
+
+def diff_questions(stored, questions):
+    """
+    One update turning the stored question list into `questions`, matching
+    questions by id. Returns (update, array_filters, changed paths), or None
+    when the edit mixes kinds of change (or reorders) and the whole list has
+    to be set:
+
+        edited questions only    $set/$unset of the changed keys via $[qN] filters
+        inserted questions only  $push of one contiguous run at its $position
+        removed questions only   $pull by id
+    """
+    old_ids, new_ids = _question_ids(stored), _question_ids(questions)
+    if old_ids is None or new_ids is None:
+        return None
+    old_by_id = dict(zip(old_ids, stored))
+
+    if new_ids == old_ids:
+        to_set, to_unset, array_filters, changed = {}, {}, [], []
+        for question in questions:
+            current = old_by_id[question['id']]
+            if question == current:
+                continue
+            if not all(_valid_key(key) for key in question):
+                return None
+            name = f'q{len(array_filters)}'
+            array_filters.append({f'{name}.id': question['id']})
+            for key, value in question.items():
+                if key not in current or current[key] != value:
+                    to_set[f'questions.$[{name}].{key}'] = value
+                    changed.append(f"questions.{question['id']}.{key}")
+            for key in current:
+                if key not in question:
+                    to_unset[f'questions.$[{name}].{key}'] = ''
+                    changed.append(f"questions.{question['id']}.{key}")
+        return _update_document(to_set, to_unset), array_filters, changed
+
+    if any(question != old_by_id[question['id']] for question in questions if question['id'] in old_by_id):
+        return None
+    new_set = set(new_ids)
+    if all(qid in old_by_id for qid in new_ids):
+        if [qid for qid in old_ids if qid in new_set] != new_ids:
+            return None
+        removed = [qid for qid in old_ids if qid not in new_set]
+        return {'$pull': {'questions': {'id': {'$in': removed}}}}, None, ['questions']
+    if [qid for qid in new_ids if qid in old_by_id] == old_ids:
+        added = [index for index, qid in enumerate(new_ids) if qid not in old_by_id]
+        if added[-1] - added[0] + 1 != len(added):
+            return None
+        push = {'$each': questions[added[0]:added[-1] + 1], '$position': added[0]}
+        return {'$push': {'questions': push}}, None, ['questions']
+    return None
+
+
+def _update_document(to_set, to_unset):
+    update = {}
+    if to_set:
+        update['$set'] = to_set
+    if to_unset:
+        update['$unset'] = to_unset
+    return update
+
+
+def patch_survey(survey_id, changes):
+    """
+    Write the fields of `changes` (validated serializer data) that differ from
+    the stored survey. Returns (updated_at, changed field paths); updated_at
+    is None when nothing had to be written. Raises DoesNotExist.
+    """
+    oid = _object_id(survey_id)
+    projection = {name: 1 for name in changes} or {'_id': 1}
+    stored = Survey._get_collection().find_one({'_id': oid}, projection)
+    if stored is None:
+        raise DoesNotExist
+    question_update = None
+    if changes.get('questions') is not None and changes['questions'] != stored.get('questions'):
+        question_update = diff_questions(stored.get('questions'), changes['questions'])
+        if question_update is not None:
+            changes = {name: value for name, value in changes.items() if name != 'questions'}
+    to_set, to_unset = diff_fields(stored, changes)
+    update = _update_document(to_set, to_unset)
+    changed = [*to_set, *to_unset]
+    array_filters = None
+    if question_update is not None:
+        question_ops, array_filters, question_paths = question_update
+        for operator, fields in question_ops.items():
+            update[operator] = {**update.get(operator, {}), **fields}
+        changed += question_paths
+    if not update:
+        return None, []
+    updated_at = Survey.atomic_update(oid, update, array_filters=array_filters or None)
+    if updated_at is None:
+        raise DoesNotExist
+    return updated_at, sorted(changed)
+
+
+def new_question_id():
+    # Same shape as the ids the frontend generates (Date.now()-based)
+    return f'{int(time.time() * 1000)}-{secrets.token_hex(3)}'
+
+
+def insert_question(survey_id, question, position=None):
+    """
+    Insert `question` at `position` (append when None). Returns
+    (question, updated_at). Raises DoesNotExist, or NotUniqueError when the
+    survey already has a question with that id.
+    """
+    oid = _object_id(survey_id)
+    question = dict(question)
+    if not question.get('id'):
+        question['id'] = new_question_id()
+    push = {'$each': [question]}
+    if position is not None:
+        push['$position'] = min(position, MAX_POSITION)
+    updated_at = Survey.atomic_update(oid, {'$push': {'questions': push}},
+                                      extra_filter={'questions.id': {'$ne': question['id']}})
+    if updated_at is None:
+        if Survey.objects(id=oid).count():
+            raise NotUniqueError(f"Question {question['id']} already exists")
+        raise DoesNotExist
+    return question, updated_at
+
+
+def update_question(survey_id, question_id, changes):
+    """
+    Set the given keys of one question (None removes a key); the id itself
+    cannot change. Returns updated_at. Raises DoesNotExist when the survey
+    or question is missing, ValueError for keys that are not plain names.
+    """
+    bad = [key for key in changes if not _valid_key(key) or key == 'id']
+    if bad:
+        raise ValueError(f"Cannot set question keys: {', '.join(map(str, bad))}")
+    oid = _object_id(survey_id)
+    if not changes:
+        if not Survey.objects(id=oid, questions__id=question_id).count():
+            raise DoesNotExist
+        return None
+    to_set = {f'questions.$.{key}': value for key, value in changes.items() if value is not None}
+    to_unset = {f'questions.$.{key}': '' for key, value in changes.items() if value is None}
+    updated_at = Survey.atomic_update(oid, _update_document(to_set, to_unset),
+                                      extra_filter={'questions.id': question_id})
+    if updated_at is None:
+        raise DoesNotExist
+    return updated_at
+
+
+def move_question(survey_id, question_id, position):
+    """
+    Move a question so it ends up at `position` (clamped to the end), in one
+    atomic pipeline update. Returns updated_at. Raises DoesNotExist.
+    """
+    oid = _object_id(survey_id)
+    position = min(position, MAX_POSITION)
+    question_ids = {'$map': {'input': '$questions', 'in': '$$this.id'}}
+    pipeline = [{'$set': {'questions': {'$let': {
+        'vars': {'index': {'$indexOfArray': [question_ids, {'$literal': question_id}]}},
+        'in': {'$let': {
+            'vars': {
+                'moved': {'$arrayElemAt': ['$questions', '$$index']},
+                'rest': {'$concatArrays': [
+                    {'$slice': ['$questions', '$$index']},
+                    {'$slice': ['$questions', {'$add': ['$$index', 1]}, {'$max': [{'$size': '$questions'}, 1]}]},
+                ]},
+            },
+            'in': {'$concatArrays': [
+                {'$slice': ['$$rest', position]},
+                ['$$moved'],
+                {'$slice': ['$$rest', position, {'$max': [{'$size': '$$rest'}, 1]}]},
+            ]},
+        }},
+    }}}}]
+    updated_at = Survey.atomic_update(oid, pipeline, extra_filter={'questions.id': question_id})
+    if updated_at is None:
+        raise DoesNotExist
+    return updated_at
+
+
+def delete_question(survey_id, question_id):
+    """Remove a question by id. Returns updated_at. Raises DoesNotExist."""
+    oid = _object_id(survey_id)
+    updated_at = Survey.atomic_update(oid, {'$pull': {'questions': {'id': question_id}}},
+                                      extra_filter={'questions.id': question_id})
+    if updated_at is None:
+        raise DoesNotExist
+    return updated_at
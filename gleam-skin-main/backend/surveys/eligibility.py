@@ -0,0 +1,204 @@
+"""
+Respondent eligibility pre-check.
+
+Answers "has this email already qualified / failed / responded for this
+survey?" with indexed (survey, respondent_email) lookups. Surveys that are
+checked often ("hot") also get an in-memory Bloom filter of every email seen
+for them, so the common case of a first-time respondent is answered without
+a database read.
+
+The filter is kept current three ways: writes made by this process are added
+immediately (remember()), rows written by other processes are picked up by
+an incremental _id-range refresh every SURVEY_ELIGIBILITY_BLOOM_REFRESH
+seconds, and the filter is rebuilt once it holds more emails than it was
+sized for. Between refreshes a filter can miss another node's very recent
+writes; this is a UX pre-check, submissions are still validated on write.
+"""
+import datetime
+import hashlib
+import math
+import threading
+
+from bson import ObjectId
+from django.conf import settings
+
+from . import snapshots
+
+
+def normalize_email(email):
+    """The one spelling of an email that is stored, filtered and queried"""
+    return email.strip().lower()
+
+
+class BloomFilter:
+    """Plain bit-array Bloom filter using double hashing over one blake2b digest"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(capacity, 1000)
+        self.size = int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    @property
+    def full(self):
+        return self.count > self.capacity
+
+
+class SurveyEmailIndex:
+    """Bloom filter of emails that have a response or qualification row for one survey"""
+
+    def __init__(self, survey_id):
+        self.survey_id = survey_id
+        self.bloom = None
+        self.refreshed_at = None
+        self.hits = 0
+        self.building = False
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+    def _emails_since(self, since=None):
+        from .models import SurveyResponse, RespondentQualification
+
+        query = {'survey': ObjectId(self.survey_id)}
+        if since is not None:
+            # _id embeds the insert time; the margin covers clock skew between nodes
+            margin = getattr(settings, 'SURVEY_ELIGIBILITY_BLOOM_MARGIN', 30)
+            query['_id'] = {'$gte': ObjectId.from_datetime(since - datetime.timedelta(seconds=margin))}
+        for model in (SurveyResponse, RespondentQualification):
+            # Covered by the (survey, respondent_email) indexes for full builds
+            for row in model._get_collection().find(query, {'_id': 0, 'respondent_email': 1}):
+                email = row.get('respondent_email')
+                if email:
+                    yield normalize_email(email)
+
+    def build(self):
+        from .models import SurveyResponse, RespondentQualification
+
+        started = datetime.datetime.now(datetime.timezone.utc)
+        survey = ObjectId(self.survey_id)
+        expected = (SurveyResponse._get_collection().count_documents({'survey': survey})
+                    + RespondentQualification._get_collection().count_documents({'survey': survey}))
+        bloom = BloomFilter(expected * 2)
+        for email in self._emails_since():
+            bloom.add(email)
+        with self.lock:
+            self.bloom = bloom
+            self.refreshed_at = started
+            self.building = False
+
+    def refresh(self):
+        started = datetime.datetime.now(datetime.timezone.utc)
+        for email in self._emails_since(self.refreshed_at):
+            self.bloom.add(email)
+        self.refreshed_at = started
+        if self.bloom.full:
+            self.start_build()
+
+    def start_build(self):
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+        threading.Thread(target=self._safe_build, name=f'bloom-{self.survey_id}', daemon=True).start()
+
+    def _safe_build(self):
+        try:
+            self.build()
+        except Exception:
+            with self.lock:
+                self.building = False
+
+    def might_contain(self, email):
+        """False = definitely never seen; True = maybe seen (or no filter yet)"""
+        self.hits += 1
+        if self.bloom is None:
+            if self.hits >= getattr(settings, 'SURVEY_ELIGIBILITY_BLOOM_MIN_HITS', 20):
+                self.start_build()
+            return True
+
+        interval = getattr(settings, 'SURVEY_ELIGIBILITY_BLOOM_REFRESH', 5)
+        age = (datetime.datetime.now(datetime.timezone.utc) - self.refreshed_at).total_seconds()
+        if age > interval and self.refresh_lock.acquire(blocking=False):
+            try:
+                self.refresh()
+            finally:
+                self.refresh_lock.release()
+        return normalize_email(email) in self.bloom
+
+    def remember(self, email):
+        if self.bloom is not None:
+            self.bloom.add(normalize_email(email))
+
+
+_indexes = snapshots.LRUCache(getattr(settings, 'SURVEY_ELIGIBILITY_HOT_SURVEYS', 256))
+_indexes_lock = threading.Lock()
+
+
+def _index_for(survey_id):
+    index = _indexes.get(survey_id)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(survey_id)
+            if index is None:
+                index = SurveyEmailIndex(survey_id)
+                _indexes.set(survey_id, index)
+    return index
+
+
+def remember(survey_id, email):
+    """Record a response/qualification write made by this process"""
+    index = _indexes.get(str(survey_id))
+    if index is not None:
+        index.remember(email)
+
+
+def check(survey_id, email, validator):
+    """
+    Eligibility of one email for one survey. validator is the survey's
+    compiled ResponseValidator (domain rules and qualification flag).
+    """
+    from .models import SurveyResponse, RespondentQualification
+
+    result = {
+        'survey': survey_id,
+        'respondent_email': email,
+        'domain_allowed': validator.domain_allowed(email),
+        'requires_qualification': validator.require_qualification,
+        'qualification': None,
+        'score': None,
+        'already_responded': False,
+    }
+
+    if _index_for(survey_id).might_contain(email):
+        survey = ObjectId(survey_id)
+        # Stored emails are normalised on write (older rows by the
+        # normalize_respondent_emails command)
+        email = normalize_email(email)
+        attempt = (RespondentQualification.objects(survey=survey, respondent_email=email)
+                   .order_by('-created_at').only('passed', 'score').as_pymongo().first())
+        if attempt is not None:
+            result['qualification'] = 'passed' if attempt.get('passed') else 'failed'
+            result['score'] = attempt.get('score')
+        result['already_responded'] = SurveyResponse.objects(survey=survey, respondent_email=email).only('id').as_pymongo().first() is not None
+        result['source'] = 'database'
+    else:
+        result['source'] = 'bloom'
+
+    qualified = not validator.require_qualification or result['qualification'] == 'passed'
+    result['eligible'] = result['domain_allowed'] and qualified and not result['already_responded']
+    return result
@@ -0,0 +1,104 @@
+"""
+Batch ingestion of survey responses.
+
+Used by the bulk endpoint (kiosk sync): items are validated together,
+survey references are resolved with one query per batch, and documents are
+written with unordered insert_many in fixed-size chunks so a bad item never
+blocks the rest of the batch.
+"""
+import datetime
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo.errors import BulkWriteError
+
+from . import eligibility
+from .models import SurveyResponse
+from .response_rules import get_validators
+from .serializers import BulkSurveyResponseItemSerializer
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield start, items[start:start + size]
+
+
+def validate_items(items):
+    """
+    Validate raw items. Returns (valid, results) where valid is a list of
+    (index, validated_data) and results holds an error entry per bad item.
+    Each referenced survey is loaded at most once, with a single query for
+    all of them.
+    """
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        serializer = BulkSurveyResponseItemSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+
+    validators = get_validators(data['survey_id'] for _, data in valid)
+    checked = []
+    for index, data in valid:
+        validator = validators.get(data['survey_id'])
+        if validator is None:
+            errors = {'survey_id': ['Survey not found']}
+        else:
+            errors = validator.check(data['respondent_email'], data['responses'])
+        if errors:
+            results[index] = {'index': index, 'status': 'error', 'errors': errors}
+        else:
+            checked.append((index, data))
+    return checked, results
+
+
+def build_document(data):
+    """Raw Mongo document for a validated item"""
+    doc = SurveyResponse(
+        survey=ObjectId(data['survey_id']),
+        respondent_email=data['respondent_email'],
+        responses=data['responses'],
+        completed_at=data.get('completed_at') or datetime.datetime.utcnow(),
+    ).to_mongo().to_dict()
+    doc['_id'] = ObjectId()
+    return doc
+
+
+def insert_documents(indexed_docs, results, chunk_size=None):
+    """
+    Write (index, document) pairs with unordered insert_many, recording a
+    per-item result. Returns the number of documents inserted.
+    """
+    chunk_size = chunk_size or getattr(settings, 'SURVEY_BULK_CHUNK_SIZE', 1000)
+    collection = SurveyResponse._get_collection()
+    inserted = 0
+    for _, chunk in chunked(indexed_docs, chunk_size):
+        failed = {}
+        try:
+            collection.insert_many([doc for _, doc in chunk], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                failed[error['index']] = error.get('errmsg', 'Write failed')
+        for position, (index, doc) in enumerate(chunk):
+            if position in failed:
+                results[index] = {'index': index, 'status': 'error', 'errors': {'non_field_errors': [failed[position]]}}
+            else:
+                results[index] = {'index': index, 'status': 'created', 'id': str(doc['_id'])}
+                eligibility.remember(doc['survey'], doc['respondent_email'])
+                inserted += 1
+    return inserted
+
+
+def ingest(items, chunk_size=None):
+    """Validate and store a batch of raw response items; returns per-item results"""
+    valid, results = validate_items(items)
+    docs = [(index, build_document(data)) for index, data in valid]
+    inserted = insert_documents(docs, results, chunk_size)
+    return {
+        'received': len(items),
+        'created': inserted,
+        'failed': len(items) - inserted,
+        'results': results,
+    }
@@ -0,0 +1,291 @@
+"""
+Live response feed per survey, for the SSE endpoint.
+
+Every process keeps at most one watcher thread per survey, however many
+browser tabs are connected: the watcher tails inserts into survey_response
+with a change stream (needs a replica set; a single-node one is enough)
+and hands each new response, rendered to an SSE frame once, to every
+subscriber of that survey. When change streams are unavailable
+(standalone mongod, or SURVEY_LIVE_CHANGE_STREAMS=False) the watcher polls
+by _id on the (survey, _id) index instead, re-reading the window in which
+inserts may still commit out of order (see watermark.py) and skipping what
+it already published.
+
+subscribe() returns once the watcher's change stream is open (or its
+polling start position is read), so a backlog read afterwards (catch_up)
+overlaps the feed instead of leaving a gap; the stream view drops the
+duplicates by watermark. catch_up also re-reads the window behind the
+client's watermark, so clients drop responses they already have by id.
+
+A watcher stops SURVEY_LIVE_IDLE_SECONDS after its last subscriber left.
+A subscriber that falls more than SURVEY_LIVE_QUEUE_SIZE events behind is
+marked overflowed; the stream tells the client to reload and closes. Each
+subscriber holds a server thread, so subscribe() refuses more than
+SURVEY_LIVE_MAX_STREAMS per process (TooManyStreams).
+"""
+import collections
+import logging
+import threading
+import time
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo.errors import OperationFailure, PyMongoError
+
+from gleam_backend import metrics
+from gleam_backend.renderers import FastJSONRenderer
+from . import watermark
+from .models import SurveyResponse
+from .serializers import SurveyResponseSerializer
+
+logger = logging.getLogger(__name__)
+
+# $changeStream is only supported on replica sets / sharded clusters
+CHANGE_STREAM_UNSUPPORTED = {40573, 20}  # 20: IllegalOperation on some versions
+
+_feeds = {}
+_lock = threading.Lock()
+
+
+class TooManyStreams(Exception):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def sse_frame(data, event='message', event_id=None):
+    parts = []
+    if event_id:
+        parts.append(f'id: {event_id}\n')
+    parts.append(f'event: {event}\n')
+    body = data.decode('utf-8') if isinstance(data, bytes) else data
+    parts.extend(f'data: {line}\n' for line in body.splitlines() or [''])
+    parts.append('\n')
+    return ''.join(parts).encode('utf-8')
+
+
+def response_frame(row):
+    """(watermark, SSE frame) of one as_pymongo()/change-stream response row"""
+    item = SurveyResponseSerializer.represent_rows([row], format_datetimes=True)[0]
+    wm = watermark.of_row(row)
+    item['watermark'] = wm
+    return wm, sse_frame(FastJSONRenderer().render(item), event='response', event_id=wm)
+
+
+class Subscriber:
+    """One connected client: a bounded buffer of (watermark, frame) pairs"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.overflowed = False
+        self.closed = False
+        self._frames = collections.deque()
+        self._cond = threading.Condition()
+
+    def push(self, event):
+        with self._cond:
+            if len(self._frames) >= self.limit:
+                self.overflowed = True
+            else:
+                self._frames.append(event)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+    def wait(self, timeout):
+        """Events buffered so far, waiting up to `timeout` seconds for one"""
+        with self._cond:
+            if not self._frames and not self.overflowed and not self.closed:
+                self._cond.wait(timeout)
+            frames = list(self._frames)
+            self._frames.clear()
+            return frames
+
+
+class SurveyFeed:
+    """The shared watcher of one survey"""
+
+    def __init__(self, survey_id):
+        self.survey_id = survey_id
+        self.subscribers = set()
+        self.mode = None  # 'change_stream' or 'polling' once running
+        self.published = 0
+        self.finished = False
+        self._idle_since = None
+        self._resume_token = None
+        self._stop = threading.Event()
+        self.ready = threading.Event()  # set once new inserts are being watched
+        self._thread = threading.Thread(target=self._run, name=f'survey-live-{survey_id}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def publish(self, rows):
+        # Rendered once, shared by every subscriber
+        events = [response_frame(row) for row in rows]
+        with _lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            for event in events:
+                subscriber.push(event)
+        self.published += len(events)
+
+    def _should_stop(self):
+        """Stop once nobody has listened for SURVEY_LIVE_IDLE_SECONDS"""
+        if self._stop.is_set():
+            return True
+        with _lock:
+            if self.subscribers:
+                self._idle_since = None
+                return False
+            now = time.monotonic()
+            if self._idle_since is None:
+                self._idle_since = now
+            if now - self._idle_since < _setting('SURVEY_LIVE_IDLE_SECONDS', 30):
+                return False
+            # Under the registry lock, so no subscriber can join a finished feed
+            self.finished = True
+            if _feeds.get(str(self.survey_id)) is self:
+                del _feeds[str(self.survey_id)]
+            return True
+
+    def _run(self):
+        use_change_stream = _setting('SURVEY_LIVE_CHANGE_STREAMS', True)
+        backoff = 1
+        while not self._should_stop():
+            try:
+                if use_change_stream:
+                    self._watch()
+                else:
+                    self._poll()
+                backoff = 1
+            except OperationFailure as e:
+                if use_change_stream and e.code in CHANGE_STREAM_UNSUPPORTED:
+                    logger.info('Change streams unavailable (%s); polling survey %s', e, self.survey_id)
+                    use_change_stream = False
+                    continue
+                # e.g. the resume token fell off the oplog: start a fresh stream
+                self._resume_token = None
+                logger.warning('Live feed for survey %s failed: %s', self.survey_id, e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+            except PyMongoError as e:
+                logger.warning('Live feed for survey %s failed: %s', self.survey_id, e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+        with _lock:
+            self.finished = True
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def _watch(self):
+        pipeline = [{'$match': {'operationType': 'insert', 'fullDocument.survey': self.survey_id}}]
+        collection = SurveyResponse._get_collection()
+        with collection.watch(pipeline, resume_after=self._resume_token, max_await_time_ms=1000) as stream:
+            self.mode = 'change_stream'
+            self.ready.set()
+            while stream.alive and not self._should_stop():
+                change = stream.try_next()
+                self._resume_token = stream.resume_token
+                if change is not None:
+                    self.publish([change['fullDocument']])
+
+    def _poll(self):
+        self.mode = 'polling'
+        collection = SurveyResponse._get_collection()
+        interval = _setting('SURVEY_LIVE_POLL_SECONDS', 2)
+        newest = collection.find_one({'survey': self.survey_id}, {'_id': 1}, sort=[('_id', -1)])
+        position = (watermark.EPOCH, newest['_id'] if newest else None)
+        # Ids in the window behind position that exist already or were published
+        known = {row['_id'] for row in collection.find({'survey': self.survey_id, **watermark.overlap(position)}, {'_id': 1})}
+        self.ready.set()
+        while not self._should_stop():
+            window = watermark.overlap(position)
+            query = {'survey': self.survey_id, '_id': {**window['_id'], '$nin': list(known)}}
+            rows = list(collection.find(query).sort(watermark.ORDER).limit(500))
+            if rows:
+                self.publish(rows)
+                known.update(row['_id'] for row in rows)
+                if position[1] is None or rows[-1]['_id'] > position[1]:
+                    position = (watermark.EPOCH, rows[-1]['_id'])
+                floor = watermark.overlap(position)['_id']['$gt']
+                known = {oid for oid in known if oid > floor}
+            else:
+                self._stop.wait(interval)
+
+
+def subscribe(survey_id):
+    """
+    Join (starting if needed) the feed of a survey; returns (feed, subscriber).
+    Raises TooManyStreams at SURVEY_LIVE_MAX_STREAMS. Waits up to SURVEY_LIVE_START_TIMEOUT seconds for the watcher to start
+    watching, so responses inserted after this returns reach the subscriber.
+    """
+    oid = ObjectId(str(survey_id))
+    subscriber = Subscriber(_setting('SURVEY_LIVE_QUEUE_SIZE', 1000))
+    max_streams = _setting('SURVEY_LIVE_MAX_STREAMS', 0)
+    with _lock:
+        if max_streams and sum(len(feed.subscribers) for feed in _feeds.values()) >= max_streams:
+            raise TooManyStreams(f'{max_streams} live streams are open in this process')
+        feed = _feeds.get(str(oid))
+        start = feed is None or feed.finished
+        if start:
+            feed = _feeds[str(oid)] = SurveyFeed(oid)
+        feed.subscribers.add(subscriber)
+    if start:
+        feed.start()
+    if not feed.ready.wait(_setting('SURVEY_LIVE_START_TIMEOUT', 5)):
+        logger.warning('Live feed for survey %s is not watching yet; responses may be missed', oid)
+    return feed, subscriber
+
+
+def unsubscribe(feed, subscriber):
+    with _lock:
+        feed.subscribers.discard(subscriber)
+
+
+def catch_up(survey_id, since, limit):
+    """
+    Responses after a watermark (a reconnecting client's Last-Event-ID),
+    oldest first, from the settle window behind it on (watermark.overlap).
+    Returns (rows, truncated): truncated when more than `limit` responses
+    are newer than the watermark.
+    """
+    position = watermark.parse(since)
+    survey = ObjectId(str(survey_id))
+    collection = SurveyResponse._get_collection()
+    newer = watermark.after(position, settled=False)
+    # Late commits behind the watermark; mostly repeats, which clients drop by id
+    behind = {'_id': {**watermark.overlap(position)['_id'], '$lte': newer['_id']['$gt']}}
+    late = list(collection.find({'survey': survey, **behind}).sort(watermark.ORDER).limit(limit))
+    rows = list(collection.find({'survey': survey, **newer}).sort(watermark.ORDER).limit(limit + 1))
+    return late + rows[:limit], len(rows) > limit
+
+
+def stats():
+    with _lock:
+        feeds = list(_feeds.values())
+    return {
+        'feeds': len(feeds),
+        'subscribers': sum(len(feed.subscribers) for feed in feeds),
+        'polling': sum(1 for feed in feeds if feed.mode == 'polling'),
+    }
+
+
+@metrics.register_collector
+def _live_metrics():
+    current = stats()
+    return [
+        ('survey_live_feeds', 'gauge', 'Survey watchers running in this process.', [({}, current['feeds'])]),
+        ('survey_live_subscribers', 'gauge', 'Connected live-results clients.', [({}, current['subscribers'])]),
+        ('survey_live_polling_feeds', 'gauge', 'Watchers polling instead of using a change stream.',
+         [({}, current['polling'])]),
+    ]
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from surveys.write_behind import get_spool
+
+class Command(BaseCommand):
+    help = 'Writes all spooled (write-behind) survey responses to MongoDB'
+
+    def handle(self, *args, **kwargs):
+        spool = get_spool()
+        self.stdout.write(f"Flushing spool in {spool.directory}...")
+        written = spool.flush()
+        metrics = spool.metrics()
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {written} responses ({metrics['duplicate_total']} already stored, {metrics['failed_total']} rejected)."
+        ))
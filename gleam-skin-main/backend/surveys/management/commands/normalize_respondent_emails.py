@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from surveys.eligibility import normalize_email
+from surveys.models import SurveyResponse, RespondentQualification
+
+
+class Command(BaseCommand):
+    help = 'Rewrites stored respondent emails in their normalised form (run once after upgrading)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in (SurveyResponse, RespondentQualification):
+            collection = model._get_collection()
+            checked = updated = 0
+            ops = []
+            cursor = collection.find({'respondent_email': {'$type': 'string'}}, {'respondent_email': 1}).batch_size(batch_size)
+            for row in cursor:
+                checked += 1
+                email = normalize_email(row['respondent_email'])
+                if email != row['respondent_email']:
+                    ops.append(UpdateOne({'_id': row['_id']}, {'$set': {'respondent_email': email}}))
+                if len(ops) >= batch_size:
+                    updated += collection.bulk_write(ops, ordered=False).modified_count
+                    ops = []
+            if ops:
+                updated += collection.bulk_write(ops, ordered=False).modified_count
+            self.stdout.write(self.style.SUCCESS(f"{collection.name}: normalised {updated} of {checked} emails."))
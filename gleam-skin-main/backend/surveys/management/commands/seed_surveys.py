@@ -0,0 +1,154 @@
+import datetime
+import multiprocessing
+import time
+import uuid
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import BulkWriteError
+
+from authentication import passwords
+from authentication.models import User
+from surveys import snapshots, synthetic
+from surveys.models import Survey, SurveyResponse
+
+SEED_PREFIX = 'seed_'
+
+
+def _insert(collection, documents):
+    """Unordered insert_many; returns how many documents were stored"""
+    try:
+        return len(collection.insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        return e.details.get('nInserted', 0)
+
+
+def _seed_responses(jobs, seed, batch_size, now):
+    """
+    Insert the responses for [(survey_id, questions, launched_at, count)].
+    Runs in the main process or in a forked worker; returns the number stored.
+    """
+    rng = synthetic.default_rng(seed)
+    collection = SurveyResponse._get_collection()
+    inserted = 0
+    batch = []
+    for survey_id, questions, launched_at, count in jobs:
+        sampler = synthetic.AnswerSampler(questions)
+        for _ in range(count):
+            batch.append({
+                '_id': ObjectId(),
+                'survey': survey_id,
+                'respondent_email': synthetic.make_email(rng),
+                'responses': sampler.sample(rng),
+                'completed_at': synthetic.make_completed_at(rng, launched_at, now),
+            })
+            if len(batch) >= batch_size:
+                inserted += _insert(collection, batch)
+                batch = []
+    if batch:
+        inserted += _insert(collection, batch)
+    return inserted
+
+
+def _seed_responses_job(args):
+    return _seed_responses(*args)
+
+
+class Command(BaseCommand):
+    help = 'Generates users, surveys and survey responses for scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--surveys', type=int, default=50, help='total surveys, spread over the users')
+        parser.add_argument('--responses', type=int, default=100000, help='total responses, skewed across surveys')
+        parser.add_argument('--questions', type=int, default=0, help='questions per survey (default: 5-20 at random)')
+        parser.add_argument('--days', type=int, default=90, help='surveys launch within this many days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--processes', type=int, default=1, help='worker processes for the response inserts')
+        parser.add_argument('--seed', type=int, default=None, help='random seed, for reproducible data')
+        parser.add_argument('--password', default='password123', help='password of every seeded user')
+        parser.add_argument('--clear', action='store_true', help='delete previously seeded users, surveys and responses first')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['surveys'] < 1:
+            raise CommandError('--users and --surveys must be at least 1')
+        if options['clear']:
+            self.clear()
+
+        rng = synthetic.default_rng(options['seed'])
+        now = datetime.datetime.utcnow().replace(microsecond=0)
+        started = time.monotonic()
+
+        user_ids = self.seed_users(options['users'], options['password'])
+        jobs = self.seed_surveys(rng, user_ids, options, now)
+        self.stdout.write(f"Created {len(user_ids)} users and {len(jobs)} surveys; inserting {options['responses']} responses...")
+
+        inserted = self.seed_responses(jobs, options, now)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {inserted} responses in {elapsed:.1f}s ({inserted / elapsed:.0f}/s)." if elapsed else 'Done.'
+        ))
+
+    def clear(self):
+        users = User._get_collection()
+        user_ids = [str(row['_id']) for row in users.find({'username': {'$regex': f'^{SEED_PREFIX}'}}, {'_id': 1})]
+        survey_ids = [row['_id'] for row in Survey._get_collection().find({'user_id': {'$in': user_ids}}, {'_id': 1})]
+        responses = SurveyResponse._get_collection().delete_many({'survey': {'$in': survey_ids}}).deleted_count
+        Survey._get_collection().delete_many({'_id': {'$in': survey_ids}})
+        users.delete_many({'username': {'$regex': f'^{SEED_PREFIX}'}})
+        for survey_id in survey_ids:
+            snapshots.invalidate(survey_id)
+        self.stdout.write(f'Removed {len(user_ids)} seeded users, {len(survey_ids)} surveys and {responses} responses.')
+
+    def seed_users(self, count, password):
+        # One hash for everybody: bcrypt per user would dominate the run
+        password_hash = passwords.hash_password(password)
+        tag = uuid.uuid4().hex[:6]
+        now = datetime.datetime.utcnow()
+        documents = [{
+            '_id': ObjectId(),
+            'username': f'{SEED_PREFIX}{tag}_{index}',
+            'email': f'{SEED_PREFIX}{tag}_{index}@example.com',
+            'password_hash': password_hash,
+            'is_active': True,
+            'is_staff': False,
+            'is_superuser': False,
+            'date_joined': now,
+        } for index in range(count)]
+        _insert(User._get_collection(), documents)
+        return [str(document['_id']) for document in documents]
+
+    def seed_surveys(self, rng, user_ids, options, now):
+        """Insert the surveys and return one response job per survey"""
+        count = options['surveys']
+        # A few surveys collect most of the responses
+        weights = synthetic.zipf_weights(count, 1.1)
+        shares = [weights[0]] + [b - a for a, b in zip(weights, weights[1:])]
+        rng.shuffle(shares)
+        total_share = sum(shares)
+
+        documents = []
+        jobs = []
+        for index in range(count):
+            body = synthetic.make_survey(rng, options['questions'] or None, user_id=rng.choice(user_ids))
+            launched_at = now - datetime.timedelta(days=rng.uniform(0, options['days']))
+            survey = Survey(id=ObjectId(), created_at=launched_at, updated_at=launched_at, **body)
+            survey.content_hash = survey.compute_content_hash()
+            documents.append(survey.to_mongo().to_dict())
+            jobs.append((survey.id, body['questions'], launched_at, round(options['responses'] * shares[index] / total_share)))
+        _insert(Survey._get_collection(), documents)
+        return jobs
+
+    def seed_responses(self, jobs, options, now):
+        processes = max(1, options['processes'])
+        base_seed = options['seed'] if options['seed'] is not None else int(time.time())
+        if processes == 1:
+            return _seed_responses(jobs, base_seed, options['batch_size'], now)
+
+        # Deal the surveys out round-robin, largest first, so workers get similar amounts
+        ordered = sorted(jobs, key=lambda job: job[3], reverse=True)
+        shards = [ordered[i::processes] for i in range(processes)]
+        work = [(shard, base_seed + i, options['batch_size'], now) for i, shard in enumerate(shards) if shard]
+        # Forked workers drop the parent's MongoClient and connect on their own (gleam_backend.mongo)
+        with multiprocessing.get_context('fork').Pool(len(work)) as pool:
+            return sum(pool.map(_seed_responses_job, work))
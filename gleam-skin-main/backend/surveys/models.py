@@ -1,5 +1,24 @@
 from mongoengine import Document, StringField, ListField, BooleanField, IntField, DateTimeField, DictField, ReferenceField, EmailField
+from bson import ObjectId
 import datetime
+import hashlib
+import json
+from . import snapshots
+
+# Fields that make up the survey body; hashed into content_hash on every save
+SURVEY_CONTENT_FIELDS = (
+    'title', 'description', 'template', 'questions', 'require_qualification',
+    'qualification_pass_score', 'allowed_domains', 'design',
+)
+
+def referenced_id(document, field):
+    """Id behind a ReferenceField without dereferencing it"""
+    ref = document._data.get(field)
+    return getattr(ref, 'id', ref)
+
+def _invalidate_dashboard(user_id):
+    from . import dashboard  # imports this module
+    dashboard.invalidate(user_id)
 
 class Survey(Document):
     user_id = StringField(required=True)  # Store MongoDB User ID (ObjectId as string)
@@ -13,10 +32,68 @@ class Survey(Document):
     design = DictField() # Stores visual customization (colors, fonts, logo)
     created_at = DateTimeField(default=datetime.datetime.utcnow)
     updated_at = DateTimeField(default=datetime.datetime.utcnow)
+    content_hash = StringField(max_length=64)  # sha1 of SURVEY_CONTENT_FIELDS, used for ETags
+
+    meta = {
+        # Owner listing: one user's surveys, most recently edited first
+        'indexes': [('user_id', '-updated_at')]
+    }
+
+    def compute_content_hash(self):
+        """Stable hash of the survey body, independent of timestamps"""
+        body = {field: self[field] for field in SURVEY_CONTENT_FIELDS}
+        encoded = json.dumps(body, sort_keys=True, default=str, separators=(',', ':'))
+        return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
 
     def save(self, *args, **kwargs):
         self.updated_at = datetime.datetime.utcnow()
-        return super(Survey, self).save(*args, **kwargs)
+        self.content_hash = self.compute_content_hash()
+        result = super(Survey, self).save(*args, **kwargs)
+        snapshots.invalidate(self.id)
+        _invalidate_dashboard(self.user_id)
+        return result
+
+    @classmethod
+    def atomic_update(cls, survey_id, update, extra_filter=None, array_filters=None):
+        """
+        Apply a raw update (update document or pipeline list) to one survey
+        without loading it, doing what save() does around the write: bump
+        updated_at and invalidate snapshots. content_hash is dropped rather
+        than recomputed, which would need the whole body; updated_at still
+        moves the ETag and the next save() restores the hash.
+        Returns the new updated_at, or None when no survey matched.
+        """
+        now = datetime.datetime.utcnow()
+        if isinstance(update, list):
+            update = update + [{'$set': {'updated_at': now}}, {'$unset': 'content_hash'}]
+        else:
+            update = dict(update)
+            update['$set'] = {**update.get('$set', {}), 'updated_at': now}
+            update['$unset'] = {**update.get('$unset', {}), 'content_hash': ''}
+        query = {'_id': ObjectId(str(survey_id)), **(extra_filter or {})}
+        # find_one_and_update: the owner comes back with the write, for the dashboard cache
+        stored = cls._get_collection().find_one_and_update(query, update, projection={'user_id': 1},
+                                                           array_filters=array_filters)
+        if stored is None:
+            return None
+        snapshots.invalidate(survey_id)
+        _invalidate_dashboard(stored.get('user_id'))
+        return now
+
+    def delete(self, *args, **kwargs):
+        survey_id = self.id
+        super(Survey, self).delete(*args, **kwargs)
+        snapshots.invalidate(survey_id)
+        _invalidate_dashboard(self.user_id)
+
+    @classmethod
+    def touch(cls, survey_id):
+        """
+        Bump updated_at after a change to something the survey embeds (its
+        qualification test), so versions derived from it move too.
+        """
+        if survey_id:
+            cls._get_collection().update_one({'_id': ObjectId(str(survey_id))}, {'$set': {'updated_at': datetime.datetime.utcnow()}})
 
     def __str__(self):
         return self.title
@@ -27,6 +104,20 @@ class QualificationTest(Document):
     questions = ListField(DictField())
     created_at = DateTimeField(default=datetime.datetime.utcnow)
 
+    def save(self, *args, **kwargs):
+        result = super(QualificationTest, self).save(*args, **kwargs)
+        # The respondent snapshot embeds the test
+        survey_id = referenced_id(self, 'survey')
+        Survey.touch(survey_id)
+        snapshots.invalidate(survey_id)
+        return result
+
+    def delete(self, *args, **kwargs):
+        survey_id = referenced_id(self, 'survey')
+        super(QualificationTest, self).delete(*args, **kwargs)
+        Survey.touch(survey_id)
+        snapshots.invalidate(survey_id)
+
     def __str__(self):
         return f"Test for {self.survey.title}"
 
@@ -36,6 +127,10 @@ class SurveyResponse(Document):
     responses = DictField(default=dict)
     completed_at = DateTimeField(default=datetime.datetime.utcnow)
 
+    meta = {
+        'indexes': [('survey', 'completed_at'), ('survey', 'id'), ('survey', 'respondent_email')]
+    }
+
     def __str__(self):
         return f"Response to {self.survey.title} by {self.respondent_email}"
 
@@ -45,6 +140,11 @@ class RespondentQualification(Document):
     qualification_name = StringField(max_length=255)
     score = IntField(required=True)
     passed = BooleanField(required=True)
+    answers = ListField()  # Chosen option index per question; kept so attempts can be re-scored
+
+    meta = {
+        'indexes': [('survey', 'respondent_email', '-created_at')]
+    }
     created_at = DateTimeField(default=datetime.datetime.utcnow)
 
     def __str__(self):
@@ -0,0 +1,139 @@
+"""
+Server-side scoring of qualification tests.
+
+A test's answer key is loaded once into an AnswerKey (a tuple holding the
+correct option indices of every question) and cached per survey version,
+the same token that Survey.save and QualificationTest writes replace. A
+submission is then scored in O(questions) without touching the test
+document again.
+"""
+import math
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo import UpdateOne
+
+from gleam_backend import metrics
+
+from . import snapshots
+
+DEFAULT_PASS_SCORE = 80  # Matches the frontend default
+
+
+class AnswerKey:
+    __slots__ = ('test_id', 'correct', 'pass_score', 'survey_title')
+
+    def __init__(self, test_id, questions, pass_score, survey_title):
+        self.test_id = test_id
+        self.correct = tuple(self._correct_indices(q) for q in questions or [])
+        self.pass_score = DEFAULT_PASS_SCORE if pass_score is None else pass_score
+        self.survey_title = survey_title
+
+    @staticmethod
+    def _correct_indices(question):
+        value = question.get('correctAnswer')
+        values = value if isinstance(value, list) else [value]
+        return tuple(int(v) for v in values if v is not None)
+
+    def score(self, answers):
+        """Percentage of correct answers, rounded half up like Math.round"""
+        if not self.correct:
+            return 100
+        hits = 0
+        for index, correct in enumerate(self.correct):
+            if index < len(answers) and answers[index] in correct:
+                hits += 1
+        return math.floor(hits * 100 / len(self.correct) + 0.5)
+
+    def grade(self, answers):
+        score = self.score(answers)
+        return score, score >= self.pass_score
+
+
+def normalize_answers(raw, question_count):
+    """
+    Accept a list of chosen option indices or the frontend's {index: option}
+    object and return a list of question_count entries (None = unanswered).
+    Answers to questions past the end of the test are ignored. Raises
+    ValueError for anything that is not an option index.
+    """
+    if isinstance(raw, list):
+        answers = [_as_index(v) for v in raw[:question_count]]
+        return answers + [None] * (question_count - len(answers))
+    if isinstance(raw, dict):
+        answers = [None] * question_count
+        for key, value in raw.items():
+            key = str(key)
+            if key.isdigit() and int(key) < question_count:
+                answers[int(key)] = _as_index(value)
+        return answers
+    raise ValueError('answers must be a list or an object keyed by question index')
+
+
+def _as_index(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f'{value!r} is not an option index')
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{value!r} is not an option index')
+
+
+_keys = snapshots.LRUCache(getattr(settings, 'SURVEY_VALIDATOR_CACHE_SIZE', 1024))
+
+
+def get_answer_key(survey_id):
+    """Cached AnswerKey for a survey's test, or None if it has no test"""
+    from .models import Survey, QualificationTest
+
+    version = snapshots.current_version(survey_id)
+    entry = _keys.get(survey_id)
+    if entry is not None and entry[0] == version:
+        metrics.cache_hit('answer_key')
+        return entry[1]
+    metrics.cache_miss('answer_key')
+
+    survey = Survey.objects(id=survey_id).only('title', 'qualification_pass_score').as_pymongo().first()
+    if survey is None:
+        return None
+    test = QualificationTest.objects(survey=survey['_id']).only('questions').as_pymongo().first()
+    key = None
+    if test is not None:
+        key = AnswerKey(test['_id'], test.get('questions'), survey.get('qualification_pass_score'), survey.get('title'))
+    _keys.set(survey_id, (version, key))
+    return key
+
+
+def rescore_attempts(survey_id, batch_size=1000):
+    """
+    Re-grade every stored attempt of a survey against its current answer key.
+    Only attempts whose score or outcome changed are written, with batched
+    unordered bulk_write. Returns (checked, updated).
+    """
+    from .models import RespondentQualification
+
+    key = get_answer_key(survey_id)
+    if key is None:
+        return 0, 0
+
+    collection = RespondentQualification._get_collection()
+    cursor = collection.find(
+        {'survey': ObjectId(survey_id), 'answers': {'$exists': True}},
+        {'answers': 1, 'score': 1, 'passed': 1},
+    ).batch_size(batch_size)
+
+    checked = updated = 0
+    ops = []
+    for row in cursor:
+        checked += 1
+        score, passed = key.grade(row.get('answers') or [])
+        if score != row.get('score') or passed != row.get('passed'):
+            ops.append(UpdateOne({'_id': row['_id']}, {'$set': {'score': score, 'passed': passed}}))
+        if len(ops) >= batch_size:
+            updated += collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += collection.bulk_write(ops, ordered=False).modified_count
+    return checked, updated
@@ -0,0 +1,180 @@
+"""
+Server-side validation of survey responses.
+
+Each survey version is compiled once into a ResponseValidator: a lookup
+table from answer key to a small rule tuple, with option sets and allowed
+email domains frozen. Checking a submission is then O(answers) with no
+database access. Compiled validators are cached per process and keyed by the
+survey's version token (see snapshots.current_version), which Survey.save
+replaces, so an edited survey is recompiled on its next submission.
+
+Answer keys follow the frontend: the question's `id` when it has one,
+otherwise `q-<index>-<timestamp>`; legacy responses keyed by question text
+are accepted too.
+"""
+from bson import ObjectId
+from django.conf import settings
+
+from gleam_backend import metrics
+
+from . import snapshots
+
+CHOICE_TYPES = ('multiple_choice', 'checkboxes', 'dropdown')
+YES_NO = frozenset(('yes', 'no'))
+DEFAULT_RATING_RANGE = (1, 5)
+
+
+def rating_range(question):
+    """(min, max) of a rating question; bounds that are missing or not whole numbers use the default"""
+    try:
+        return int(question.get('min', DEFAULT_RATING_RANGE[0])), int(question.get('max', DEFAULT_RATING_RANGE[1]))
+    except (TypeError, ValueError):
+        return DEFAULT_RATING_RANGE
+
+
+class QuestionRule:
+    __slots__ = ('index', 'text', 'type', 'required', 'options', 'low', 'high')
+
+    def __init__(self, index, question):
+        self.index = index
+        self.text = question.get('text', '')
+        self.type = question.get('type', 'text')
+        self.required = bool(question.get('required'))
+        self.options = frozenset(str(o) for o in question.get('options') or ()) or None
+        self.low, self.high = rating_range(question) if self.type == 'rating' else DEFAULT_RATING_RANGE
+
+    def check(self, value):
+        """Return an error message, or None if the answer is acceptable"""
+        if self.type == 'rating':
+            try:
+                rating = int(str(value))
+            except ValueError:
+                return 'Rating must be a whole number'
+            if not self.low <= rating <= self.high:
+                return f'Rating must be between {self.low} and {self.high}'
+        elif self.type == 'yes_no':
+            if str(value).lower() not in YES_NO:
+                return 'Answer must be Yes or No'
+        elif self.type in CHOICE_TYPES and self.options is not None:
+            values = value if isinstance(value, list) else [value]
+            for v in values:
+                if str(v) not in self.options:
+                    return f'"{v}" is not one of the options'
+        elif isinstance(value, (dict, list)):
+            return 'Answer must be a single value'
+        elif len(str(value)) > settings.SURVEY_MAX_ANSWER_LENGTH:
+            return f'Answer must be at most {settings.SURVEY_MAX_ANSWER_LENGTH} characters'
+        return None
+
+
+class ResponseValidator:
+    """Compiled rules for one survey version"""
+
+    def __init__(self, survey_id, questions, allowed_domains, require_qualification=False):
+        self.survey_id = survey_id
+        self.require_qualification = bool(require_qualification)
+        self.by_id = {}
+        self.by_index = {}
+        self.by_text = {}
+        required = []
+        for index, question in enumerate(questions or []):
+            if question.get('type') == 'section_header':
+                continue
+            rule = QuestionRule(index, question)
+            if question.get('id'):
+                self.by_id[str(question['id'])] = rule
+            self.by_index[index] = rule
+            if rule.text:
+                self.by_text.setdefault(rule.text, rule)
+            if rule.required:
+                required.append(rule)
+        self.required = tuple(required)
+
+        domains = {d.strip().lstrip('@').lower() for d in allowed_domains or () if d and d.strip()}
+        self.any_domain = not domains or '*' in domains
+        self.domains = frozenset(domains)
+
+    def rule_for(self, key):
+        rule = self.by_id.get(key)
+        if rule is None and key.startswith('q-'):
+            index = key[2:].split('-', 1)[0]
+            if index.isdigit():
+                rule = self.by_index.get(int(index))
+        if rule is None:
+            rule = self.by_text.get(key)
+        return rule
+
+    def domain_allowed(self, email):
+        if self.any_domain:
+            return True
+        domain = email.rsplit('@', 1)[-1].lower()
+        # Check the domain and each parent domain against the suffix set
+        labels = domain.split('.')
+        return any('.'.join(labels[i:]) in self.domains for i in range(len(labels)))
+
+    def check(self, respondent_email, responses):
+        """Return a dict of errors (empty when the submission is valid)"""
+        errors = {}
+        if not self.domain_allowed(respondent_email):
+            errors['respondent_email'] = ['This survey is restricted to: ' + ', '.join(sorted(self.domains))]
+
+        answered = set()
+        answer_errors = {}
+        for key, value in responses.items():
+            rule = self.rule_for(str(key))
+            if rule is None:
+                answer_errors[key] = 'Unknown question'
+                continue
+            if value is None or value == '' or value == []:
+                continue
+            message = rule.check(value)
+            if message:
+                answer_errors[key] = message
+            else:
+                answered.add(rule.index)
+
+        for rule in self.required:
+            if rule.index not in answered:
+                answer_errors.setdefault(f'q-{rule.index}', f'"{rule.text}" is required')
+
+        if answer_errors:
+            errors['responses'] = answer_errors
+        return errors
+
+
+_compiled = snapshots.LRUCache(getattr(settings, 'SURVEY_VALIDATOR_CACHE_SIZE', 1024))
+
+
+def get_validators(survey_ids):
+    """
+    Return {survey_id: ResponseValidator} for the surveys that exist.
+    Surveys without a current compiled validator are loaded with one query.
+    """
+    found = {}
+    missing = {}
+    versions = snapshots.current_versions([sid for sid in set(survey_ids) if ObjectId.is_valid(sid)])
+    for survey_id, version in versions.items():
+        entry = _compiled.get(survey_id)
+        if entry is not None and entry[0] == version:
+            metrics.cache_hit('response_validator')
+            found[survey_id] = entry[1]
+        else:
+            metrics.cache_miss('response_validator')
+            missing[survey_id] = version
+
+    if missing:
+        from .models import Survey
+        rows = Survey.objects(id__in=[ObjectId(sid) for sid in missing]).only('questions', 'allowed_domains', 'require_qualification').as_pymongo()
+        for row in rows:
+            survey_id = str(row['_id'])
+            validator = ResponseValidator(
+                survey_id, row.get('questions'), row.get('allowed_domains'), row.get('require_qualification'),
+            )
+            _compiled.set(survey_id, (missing[survey_id], validator))
+            found[survey_id] = validator
+    return found
+
+
+def get_validator(survey_id):
+    """Compiled validator for one survey, or None if it does not exist"""
+    return get_validators([survey_id]).get(survey_id)
@@ -0,0 +1,232 @@
+"""
+Survey results computed in MongoDB.
+
+One aggregation over a survey's responses (matched on the
+(survey, completed_at) index) returns, through $facet:
+
+    summary   total responses and the last completion time
+    page      the newest responses, raw
+    answers   counts per (question key, answer) for choice questions;
+              count and first answers per key for text questions
+
+Answers are matched to questions the way ai_helper.aggregate_survey_results
+does it: by question text, by id, or by the legacy "q-<index>-<ts>" key
+(normalised to "q-<index>-" in the pipeline), and falsy answers are skipped.
+Unlike the Python loop, a response that stores one question under two of
+these keys is counted under each. $firstN needs MongoDB 5.2.
+
+load() and load_since() return JSON-ready bodies (datetimes formatted
+like DateTimeField), whichever renderer encodes them.
+
+With a `since` watermark (see watermark.py) only newer responses are
+matched, so a polling results page pays per new response: the stats are
+then deltas to add to what the client already has. Both leave out responses
+that may still be committing (see watermark.py), so a late insert is
+counted by the next delta instead of being skipped.
+"""
+import json
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from mongoengine.connection import get_db
+from mongoengine.errors import DoesNotExist
+from rest_framework import serializers
+
+from . import watermark
+from .ai_helper import AI_TEXT_SAMPLE_SIZE, CHOICE_QUESTION_TYPES
+from .models import Survey, SurveyResponse
+from .serializers import PublicSurveySerializer, SurveyResponseSerializer
+
+LEGACY_KEY_PATTERN = '^q-[0-9]+-'
+SAMPLE_RESPONSES = 5  # text answers per question shown on the results page
+_FALSY = [None, '', 0, False, [], {}]
+
+
+def responses_collection(alias=None):
+    """survey_response collection, optionally through another connection alias"""
+    if alias is None:
+        return SurveyResponse._get_collection()
+    return get_db(alias)[SurveyResponse._get_collection_name()]
+
+
+def _is_choice(question):
+    return question.get('type', 'text') in CHOICE_QUESTION_TYPES
+
+
+def question_keys(questions):
+    """Response key -> indexes of the questions stored under it"""
+    keys = {}
+    for idx, q in enumerate(questions):
+        for key in (q.get('text', ''), str(q.get('id', '')), f'q-{idx}-'):
+            if key and idx not in keys.setdefault(key, []):
+                keys[key].append(idx)
+    return keys
+
+
+def answers_stages(questions):
+    """Pipeline stages turning response documents into per-key answer groups"""
+    keys = question_keys(questions)
+    choice_keys = [key for key, indexes in keys.items() if any(_is_choice(questions[i]) for i in indexes)]
+    return [
+        {'$project': {'pair': {'$objectToArray': {'$ifNull': ['$responses', {}]}}}},
+        {'$unwind': '$pair'},
+        {'$project': {
+            'k': {'$let': {
+                'vars': {'legacy': {'$regexFind': {'input': '$pair.k', 'regex': LEGACY_KEY_PATTERN}}},
+                'in': {'$ifNull': ['$$legacy.match', '$pair.k']},
+            }},
+            'v': '$pair.v',
+        }},
+        {'$match': {'k': {'$in': list(keys)}, '$expr': {'$not': [{'$in': ['$v', _FALSY]}]}}},
+        {'$group': {
+            # Choice answers are counted per value, text answers only per key
+            '_id': {'k': '$k', 'v': {'$cond': [{'$in': ['$k', choice_keys]}, '$v', '$$REMOVE']}},
+            'n': {'$sum': 1},
+            'samples': {'$firstN': {'input': '$v', 'n': AI_TEXT_SAMPLE_SIZE}},
+        }},
+    ]
+
+
+def _hashable(value):
+    return json.dumps(value, sort_keys=True, default=str) if isinstance(value, (list, dict)) else value
+
+
+def question_stats(questions, groups):
+    """
+    Per-question stats in the shape of aggregate_survey_results, from the
+    answer groups. Returns (question_stats, text_answers) where text_answers
+    maps each text question's index to its first answers.
+    """
+    keys = question_keys(questions)
+    totals = [0] * len(questions)
+    counts = [{} for _ in questions]
+    samples = [[] for _ in questions]
+    for group in sorted(groups, key=lambda g: -g['n']):
+        key = group['_id']
+        for idx in keys.get(key['k'], ()):
+            totals[idx] += group['n']
+            if _is_choice(questions[idx]) and 'v' in key:
+                row = counts[idx].setdefault(_hashable(key['v']), [key['v'], 0])
+                row[1] += group['n']
+            else:
+                samples[idx].extend(group['samples'])
+
+    stats, text_answers = [], {}
+    for idx, q in enumerate(questions):
+        stat = {'question': q.get('text', ''), 'type': q.get('type', 'text'), 'total_answers': totals[idx]}
+        if _is_choice(q):
+            # Every option is listed (0 when unanswered), then answers outside the options
+            rows = {}
+            for option in q.get('options', []):
+                rows.setdefault(_hashable(option), [option, 0])
+            for hashed, (value, count) in counts[idx].items():
+                rows.setdefault(hashed, [value, 0])[1] += count
+            stat['stats'] = [{
+                'option': value,
+                'count': count,
+                'percentage': round(count / totals[idx] * 100) if totals[idx] else 0,
+            } for value, count in rows.values()]
+        else:
+            stat['sampleResponses'] = samples[idx][:SAMPLE_RESPONSES]
+            text_answers[idx] = samples[idx][:AI_TEXT_SAMPLE_SIZE]
+        stats.append(stat)
+    return stats, text_answers
+
+
+def aggregate(survey_id, questions, page_size=0, collection=None, since=None, settled=False):
+    """
+    Run the results aggregation for one survey, or for its responses newer
+    than the `since` watermark. settled (implied by since) leaves out
+    responses that may still be committing, for a base later deltas
+    continue from. Returns a dict with total, last_response_at,
+    question_stats, text_answers, the watermark of the newest response
+    (None when nothing matched) and (page_size > 0) the newest raw rows.
+    """
+    newest_first = {'$sort': {'_id': -1}}
+    facets = {
+        'summary': [{'$group': {'_id': None, 'total': {'$sum': 1}, 'last_response_at': {'$max': '$completed_at'}}}],
+        'latest': [newest_first, {'$limit': 1}, {'$project': {'_id': 1}}],
+        'answers': answers_stages(questions),
+    }
+    if page_size:
+        facets['page'] = [newest_first, {'$limit': page_size}]
+    match = {'survey': ObjectId(str(survey_id))}
+    if since is not None:
+        match.update(watermark.after(since))
+    elif settled:
+        match.update(watermark.until_settled())
+    pipeline = [{'$match': match}, {'$facet': facets}]
+    result = next((collection or responses_collection()).aggregate(pipeline), {})
+
+    summary = result['summary'][0] if result.get('summary') else {}
+    latest = result.get('latest') or []
+    stats, text_answers = question_stats(questions, result.get('answers', []))
+    return {
+        'total': summary.get('total', 0),
+        'last_response_at': summary.get('last_response_at'),
+        'question_stats': stats,
+        'text_answers': text_answers,
+        'watermark': watermark.of_row(latest[0]) if latest else None,
+        'page': result.get('page', []),
+    }
+
+
+def _iso(value):
+    return serializers.DateTimeField().to_representation(value) if value else None
+
+
+def load(survey_id, page_size):
+    """
+    Everything the results page shows, from one survey read and one
+    aggregation. Raises DoesNotExist.
+    """
+    try:
+        oid = ObjectId(str(survey_id))
+    except InvalidId:
+        raise DoesNotExist
+    rows = PublicSurveySerializer.represent_rows(PublicSurveySerializer.raw_queryset(Survey.objects(id=oid)),
+                                                 format_datetimes=True)
+    if not rows:
+        raise DoesNotExist
+    survey = rows[0]
+
+    results = aggregate(oid, survey.get('questions') or [], page_size, settled=True)
+    survey['response_count'] = results['total']
+    responses = SurveyResponseSerializer.represent_rows(results['page'], format_datetimes=True)
+    return {
+        'survey': survey,
+        'response_count': results['total'],
+        'last_response_at': _iso(results['last_response_at']),
+        'question_stats': results['question_stats'],
+        'responses': responses,
+        'has_more_responses': results['total'] > len(responses),
+        'watermark': results['watermark'],
+    }
+
+
+def load_since(survey_id, since, page_size):
+    """
+    What changed since the `since` watermark of a load() or a previous
+    load_since(): counts of the new responses (question_stats are deltas:
+    add the counts, append the samples), the newest of them raw, and the
+    next watermark. Raises DoesNotExist, or ValueError for a bad watermark.
+    """
+    position = watermark.parse(since)
+    try:
+        oid = ObjectId(str(survey_id))
+    except InvalidId:
+        raise DoesNotExist
+    row = Survey._get_collection().find_one({'_id': oid}, {'questions': 1})
+    if row is None:
+        raise DoesNotExist
+
+    results = aggregate(oid, row.get('questions') or [], page_size, since=position)
+    responses = SurveyResponseSerializer.represent_rows(results['page'], format_datetimes=True)
+    return {
+        'new_responses': results['total'],
+        'last_response_at': _iso(results['last_response_at']),
+        'question_stats': results['question_stats'],
+        'responses': responses,
+        'has_more_responses': results['total'] > len(responses),
+        'watermark': results['watermark'] or since,
+    }
@@ -1,16 +1,102 @@
+from bson import ObjectId
 from rest_framework import serializers
 from .models import Survey, QualificationTest, SurveyResponse, RespondentQualification
+from . import eligibility
+from .response_rules import get_validator
+
+class RespondentEmailField(serializers.EmailField):
+    """Respondent email, stored in the normalised form the eligibility check queries"""
+
+    def to_internal_value(self, data):
+        return eligibility.normalize_email(super().to_internal_value(data))
 
 class MongoEngineSerializer(serializers.Serializer):
-    """Base serializer for MongoEngine documents"""
+    """
+    Base serializer for MongoEngine documents.
+
+    Subclasses that set `document` also support a raw read path: rows
+    fetched with as_pymongo() are turned into the same representation
+    directly (see represent_rows), skipping per-field DRF work. ObjectIds
+    and datetimes are left for the fast JSON renderer to encode.
+    """
     id = serializers.CharField(read_only=True)
+    document = None
+    raw_references = ()  # reference fields rendered as the referenced id string
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
         data['id'] = str(instance.id)
         return data
 
+    @classmethod
+    def raw_fields(cls):
+        """[(name, default)] of readable stored fields, computed once per class"""
+        fields = cls.__dict__.get('_raw_fields')
+        if fields is None:
+            fields = []
+            for name, field in cls._declared_fields.items():
+                if name == 'id' or field.write_only or isinstance(field, serializers.SerializerMethodField):
+                    continue
+                model_field = cls.document._fields.get(name)
+                if model_field is not None:
+                    fields.append((name, model_field.default))
+            cls._raw_fields = fields
+        return fields
+
+    @classmethod
+    def raw_queryset(cls, queryset):
+        """Project the queryset to the fields the representation needs, as plain dicts"""
+        names = [name for name, _ in cls.raw_fields()] + list(cls.raw_references)
+        return queryset.only(*names).as_pymongo()
+
+    @classmethod
+    def represent_rows(cls, rows, format_datetimes=False, precomputed=None):
+        """
+        Representation of as_pymongo() rows, equal to serializing the documents.
+        Datetimes are left for the fast renderer unless format_datetimes is
+        set: bodies that any renderer may encode need DateTimeField strings.
+        precomputed: computed fields already known for a single row, used
+        instead of add_raw_extras.
+        """
+        fields = cls.raw_fields()
+        references = cls.raw_references
+        data = []
+        for row in rows:
+            item = {'id': str(row['_id'])}
+            for name, default in fields:
+                value = row.get(name)
+                if value is None and default is not None:
+                    value = default() if callable(default) else default
+                item[name] = value
+            for name in references:
+                value = row.get(name)
+                item[name] = str(value) if value is not None else None
+            data.append(item)
+        if format_datetimes:
+            cls.format_datetimes(data)
+        if precomputed:
+            for item in data:
+                item.update(precomputed)
+        else:
+            cls.add_raw_extras(data)
+        return data
+
+    @classmethod
+    def format_datetimes(cls, data):
+        """Format the datetime fields of represented rows in place, as DateTimeField does"""
+        fields = [(name, field) for name, field in cls._declared_fields.items()
+                  if isinstance(field, serializers.DateTimeField) and not field.write_only]
+        for item in data:
+            for name, field in fields:
+                if item.get(name) is not None:
+                    item[name] = field.to_representation(item[name])
+
+    @classmethod
+    def add_raw_extras(cls, data):
+        """Fill in SerializerMethodFields for represent_rows (batched where possible)"""
+
 class SurveySerializer(MongoEngineSerializer):
+    document = Survey
     user_id = serializers.CharField(read_only=True)
     title = serializers.CharField(max_length=255)
     description = serializers.CharField(required=False, allow_blank=True)
@@ -25,9 +111,23 @@ class SurveySerializer(MongoEngineSerializer):
     response_count = serializers.SerializerMethodField()
 
     def get_response_count(self, obj):
+        precomputed = self.context.get('precomputed') or {}
+        if 'response_count' in precomputed:
+            return precomputed['response_count']
         # Count responses for this survey
         return SurveyResponse.objects(survey=obj).count()
 
+    @classmethod
+    def add_raw_extras(cls, data):
+        # One grouped count for the whole page instead of a count per survey
+        ids = [ObjectId(item['id']) for item in data]
+        counts = {}
+        if ids:
+            pipeline = [{'$match': {'survey': {'$in': ids}}}, {'$group': {'_id': '$survey', 'n': {'$sum': 1}}}]
+            counts = {str(row['_id']): row['n'] for row in SurveyResponse._get_collection().aggregate(pipeline)}
+        for item in data:
+            item['response_count'] = counts.get(item['id'], 0)
+
     def create(self, validated_data):
         return Survey(**validated_data).save()
 
@@ -37,7 +137,17 @@ class SurveySerializer(MongoEngineSerializer):
         instance.save()
         return instance
 
+class PublicSurveySerializer(SurveySerializer):
+    """Read-only survey view for respondents (no per-request count query)"""
+    response_count = None
+
+    @classmethod
+    def add_raw_extras(cls, data):
+        pass
+
 class QualificationTestSerializer(MongoEngineSerializer):
+    document = QualificationTest
+    raw_references = ('survey',)
     survey_id = serializers.CharField(write_only=True, required=False)
     survey = serializers.SerializerMethodField(read_only=True)
     topic = serializers.CharField(max_length=255)
@@ -72,34 +182,78 @@ class QualificationTestSerializer(MongoEngineSerializer):
         return instance
 
 class SurveyResponseSerializer(MongoEngineSerializer):
+    document = SurveyResponse
+    raw_references = ('survey',)
     survey_id = serializers.CharField(write_only=True)
-    respondent_email = serializers.EmailField()
+    respondent_email = RespondentEmailField()
     responses = serializers.DictField()
     completed_at = serializers.DateTimeField(read_only=True)
 
+    def validate(self, attrs):
+        validator = get_validator(attrs['survey_id'])
+        if validator is None:
+            raise serializers.ValidationError({'survey_id': 'Survey not found'})
+        errors = validator.check(attrs['respondent_email'], attrs['responses'])
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
     def create(self, validated_data):
         survey_id = validated_data.pop('survey_id')
-        survey = Survey.objects.get(id=survey_id)
-        return SurveyResponse(survey=survey, **validated_data).save()
+        # validate() already confirmed the survey exists; reference it by id only
+        survey = Survey(id=ObjectId(survey_id))
+        response = SurveyResponse(survey=survey, **validated_data).save()
+        eligibility.remember(survey_id, response.respondent_email)
+        return response
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
         data['survey'] = str(instance.survey.id) if instance.survey else None
         return data
 
+class BulkSurveyResponseItemSerializer(serializers.Serializer):
+    """One item of a bulk response upload; completed_at may come from the client (offline capture time)"""
+    survey_id = serializers.CharField()
+    respondent_email = RespondentEmailField()
+    responses = serializers.DictField()
+    completed_at = serializers.DateTimeField(required=False)
+
+class QuestionInsertSerializer(serializers.Serializer):
+    """One question added by the editor; appended when position is omitted"""
+    question = serializers.DictField()
+    position = serializers.IntegerField(min_value=0, required=False)
+
+    def validate_question(self, value):
+        question_id = value.get('id')
+        if question_id is not None and (not isinstance(question_id, str) or '/' in question_id):
+            raise serializers.ValidationError('Question id must be a string without "/"')
+        return value
+
+class QuestionMoveSerializer(serializers.Serializer):
+    position = serializers.IntegerField(min_value=0)
+
+class QualificationAttemptSerializer(serializers.Serializer):
+    """A respondent's answers to a qualification test, scored on the server"""
+    survey_id = serializers.CharField()
+    respondent_email = RespondentEmailField()
+    answers = serializers.JSONField()
+
+    def validate_answers(self, value):
+        # Indices are checked against the test's answer key (normalize_answers) once it is loaded
+        if not isinstance(value, (list, dict)):
+            raise serializers.ValidationError('answers must be a list or an object keyed by question index')
+        return value
+
 class RespondentQualificationSerializer(MongoEngineSerializer):
-    survey_id = serializers.CharField(write_only=True)
-    respondent_email = serializers.EmailField()
-    qualification_name = serializers.CharField(max_length=255)
-    score = serializers.IntegerField()
-    passed = serializers.BooleanField()
+    document = RespondentQualification
+    raw_references = ('survey',)
+    # Written only by record_attempt (server-side scoring), never from client input
+    respondent_email = serializers.EmailField(read_only=True)
+    qualification_name = serializers.CharField(read_only=True)
+    score = serializers.IntegerField(read_only=True)
+    passed = serializers.BooleanField(read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
 
-    def create(self, validated_data):
-        survey_id = validated_data.pop('survey_id')
-        survey = Survey.objects.get(id=survey_id)
-        return RespondentQualification(survey=survey, **validated_data).save()
-
     def to_representation(self, instance):
         data = super().to_representation(instance)
         data['survey'] = str(instance.survey.id) if instance.survey else None
@@ -0,0 +1,182 @@
+"""
+Pre-serialized survey snapshots for the respondent-facing read path.
+
+A snapshot is the JSON body served to respondents (survey + qualification
+test), rendered once and reused until the survey or its test changes.
+Snapshots live in two tiers:
+
+  1. a bounded in-process LRU (no I/O at all on a hit)
+  2. the shared Django cache configured as SURVEY_SNAPSHOT_CACHE
+
+Each survey has a version token in the shared cache. Writes to Survey or
+QualificationTest replace the token, which makes every older snapshot in
+every process stale without having to find and delete them.
+
+A token in a process-local cache (LocMem, the default, or Dummy) would
+only move in the process that handled the write, so with such a backend the
+version is read from the survey itself instead: its updated_at and
+content_hash, in one projected query (QualificationTest writes bump the
+survey's updated_at for this). That costs a small read per lookup; point
+SURVEY_CACHE_BACKEND at a shared cache to serve hits without any I/O.
+"""
+import calendar
+import threading
+import uuid
+from collections import OrderedDict
+
+from bson import ObjectId
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.renderers import JSONRenderer
+
+from gleam_backend import metrics
+
+VERSION_KEY = 'survey-snapshot-version:{}'
+SNAPSHOT_KEY = 'survey-snapshot:{}:{}'
+
+
+class LRUCache:
+    """Thread-safe bounded LRU, used here for survey_id -> (version, payload)"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local = LRUCache(getattr(settings, 'SURVEY_SNAPSHOT_LRU_SIZE', 1024))
+
+
+def _shared_cache():
+    return caches[getattr(settings, 'SURVEY_SNAPSHOT_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'SURVEY_SNAPSHOT_TIMEOUT', 3600)
+
+
+def tokens_are_shared(cache=None):
+    """Whether version tokens in the snapshot cache are seen by every process"""
+    return not isinstance(cache or _shared_cache(), (LocMemCache, DummyCache))
+
+
+def stored_versions(survey_ids):
+    """
+    {survey_id: version} derived from the stored surveys, in one projected
+    query. Missing surveys (and invalid ids) map to ''.
+    """
+    from .models import Survey
+
+    versions = {str(survey_id): '' for survey_id in survey_ids}
+    ids = [ObjectId(survey_id) for survey_id in versions if ObjectId.is_valid(survey_id)]
+    if ids:
+        rows = Survey._get_collection().find({'_id': {'$in': ids}}, {'updated_at': 1, 'content_hash': 1})
+        for row in rows:
+            updated_at = row.get('updated_at')
+            ms = calendar.timegm(updated_at.utctimetuple()) * 1000 + updated_at.microsecond // 1000 if updated_at else 0
+            versions[str(row['_id'])] = f"{ms}-{row.get('content_hash') or ''}"
+    return versions
+
+
+def current_versions(survey_ids):
+    """{survey_id: snapshot version}, creating tokens that do not exist yet"""
+    cache = _shared_cache()
+    if not tokens_are_shared(cache):
+        return stored_versions(survey_ids)
+    survey_ids = [str(survey_id) for survey_id in survey_ids]
+    found = cache.get_many([VERSION_KEY.format(survey_id) for survey_id in survey_ids])
+    versions = {}
+    for survey_id in survey_ids:
+        key = VERSION_KEY.format(survey_id)
+        version = found.get(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            # add() so concurrent first readers agree on a single token
+            if not cache.add(key, version, None):
+                version = cache.get(key) or version
+        versions[survey_id] = version
+    return versions
+
+
+def current_version(survey_id):
+    """Return the survey's snapshot version, creating one if none exists yet"""
+    return current_versions([survey_id])[str(survey_id)]
+
+
+def invalidate(survey_id):
+    """Mark every cached snapshot of this survey as stale"""
+    if not survey_id:
+        return
+    survey_id = str(survey_id)
+    cache = _shared_cache()
+    if tokens_are_shared(cache):
+        cache.set(VERSION_KEY.format(survey_id), uuid.uuid4().hex, None)
+    _local.discard(survey_id)
+
+
+def build_snapshot(survey_id):
+    """Read the survey and its test from Mongo and render them to JSON bytes"""
+    from .models import Survey, QualificationTest
+    from .serializers import PublicSurveySerializer, QualificationTestSerializer
+
+    survey = Survey.objects.get(id=survey_id)
+    test = QualificationTest.objects(survey=survey).first() if survey.require_qualification else None
+    data = {
+        'survey': PublicSurveySerializer(survey).data,
+        'qualification_test': QualificationTestSerializer(test).data if test else None,
+    }
+    return JSONRenderer().render(data)
+
+
+def get_snapshot(survey_id):
+    """
+    Return (version, payload) for a survey, reading Mongo only when neither
+    tier has a snapshot for the current version.
+    Raises Survey.DoesNotExist / ValidationError like Survey.objects.get.
+    """
+    survey_id = str(survey_id)
+    version = current_version(survey_id)
+
+    entry = _local.get(survey_id)
+    if entry is not None and entry[0] == version:
+        metrics.cache_hit('survey_snapshot_local')
+        return entry
+    metrics.cache_miss('survey_snapshot_local')
+
+    cache = _shared_cache()
+    snapshot_key = SNAPSHOT_KEY.format(survey_id, version)
+    payload = cache.get(snapshot_key)
+    if payload is not None:
+        metrics.cache_hit('survey_snapshot_shared')
+    else:
+        metrics.cache_miss('survey_snapshot_shared')
+        payload = build_snapshot(survey_id)
+        cache.set(snapshot_key, payload, _timeout())
+
+    entry = (version, payload)
+    _local.set(survey_id, entry)
+    return entry
@@ -0,0 +1,190 @@
+"""
+Synthetic surveys and answers shaped like the ones the editor produces.
+
+Used by the load-test harness (loadtest.py) and the seeding command, so it
+has no Django or Mongo imports. Every generator takes a random.Random so
+runs are reproducible from a seed.
+
+Question ids follow the editor's `<ms timestamp>-<index>` form, and answers
+pass ResponseValidator: ratings are 1-5, yes/no answers are "Yes"/"No", and
+choices come from the question's options. Answer distributions are skewed
+(a few options take most of the votes), as real surveys are.
+"""
+import bisect
+import datetime
+import itertools
+import math
+import random
+import time
+
+QUESTION_MIX = (
+    ('multiple_choice', 30),
+    ('rating', 30),
+    ('yes_no', 15),
+    ('text', 15),
+    ('section_header', 10),
+)
+
+TOPICS = (
+    'Customer Satisfaction', 'Employee Engagement', 'Course Feedback', 'Event Experience',
+    'Product Research', 'Website Usability', 'Onboarding', 'Market Research',
+)
+SUBJECTS = (
+    'our service', 'the checkout process', 'the mobile app', 'the support team', 'the course material',
+    'the event venue', 'the onboarding flow', 'our pricing', 'the documentation', 'the delivery time',
+)
+CHOICE_SETS = (
+    ('Very satisfied', 'Satisfied', 'Neutral', 'Dissatisfied', 'Very dissatisfied'),
+    ('Daily', 'Weekly', 'Monthly', 'Rarely', 'Never'),
+    ('18-25', '26-35', '36-45', '46-60', '60+'),
+    ('Email', 'Social media', 'Search engine', 'Friend or colleague', 'Advertisement', 'Other'),
+    ('Price', 'Quality', 'Speed', 'Support', 'Features'),
+)
+SECTIONS = ('About you', 'Your experience', 'Final thoughts', 'Usage', 'Background')
+COMMENTS = (
+    'Great experience overall.', 'Could be faster.', 'The staff were very helpful.',
+    'Pricing is a bit high for what you get.', 'I would recommend this to a friend.',
+    'Had some trouble finding what I needed.', 'Nothing to add.', 'Please add more options.',
+)
+EMAIL_DOMAINS = ('gmail.com', 'outlook.com', 'yahoo.com', 'example.edu', 'example.org', 'company.com')
+
+
+def _weighted_choice(rng, items):
+    total = sum(weight for _, weight in items)
+    pick = rng.uniform(0, total)
+    for value, weight in items:
+        pick -= weight
+        if pick <= 0:
+            return value
+    return items[-1][0]
+
+
+def zipf_weights(count, skew=1.3):
+    """Cumulative Zipf-like weights over range(count): index 0 is the most likely"""
+    return list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, count + 1)))
+
+
+def skewed_index(rng, count, skew=1.3):
+    cumulative = zipf_weights(count, skew)
+    return bisect.bisect_left(cumulative, rng.random() * cumulative[-1])
+
+
+def make_question(rng, index, question_type, stamp):
+    subject = rng.choice(SUBJECTS)
+    question = {'id': f'{stamp}-{index}', 'type': question_type, 'required': False}
+    if question_type == 'section_header':
+        question['text'] = rng.choice(SECTIONS)
+    elif question_type == 'multiple_choice':
+        question['text'] = f'Which option best describes {subject}?'
+        question['options'] = list(rng.choice(CHOICE_SETS))
+        question['required'] = rng.random() < 0.6
+    elif question_type == 'rating':
+        question['text'] = f'How would you rate {subject}?'
+        question['required'] = rng.random() < 0.6
+    elif question_type == 'yes_no':
+        question['text'] = f'Would you recommend {subject}?'
+        question['required'] = rng.random() < 0.4
+    else:
+        question['text'] = f'Any comments about {subject}?'
+    return question
+
+
+def make_questions(rng, count):
+    stamp = int(time.time() * 1000)
+    questions = []
+    for index in range(count):
+        question_type = _weighted_choice(rng, QUESTION_MIX)
+        if question_type == 'section_header' and (index == count - 1 or (questions and questions[-1]['type'] == 'section_header')):
+            question_type = 'rating'
+        questions.append(make_question(rng, index, question_type, stamp))
+    return questions
+
+
+def make_survey(rng, question_count=None, user_id=None):
+    """Survey body as the editor would POST it"""
+    question_count = question_count or rng.randint(5, 20)
+    survey = {
+        'title': f'{rng.choice(TOPICS)} Survey #{rng.randint(1, 99999)}',
+        'description': 'Help us improve by answering a few questions.',
+        'questions': make_questions(rng, question_count),
+        'allowed_domains': [],
+        'design': {},
+    }
+    if user_id is not None:
+        survey['user_id'] = user_id
+    return survey
+
+
+RATING_ORDER = (4, 5, 3, 2, 1)  # mostly 4s and 5s, with a tail of unhappy respondents
+
+
+class AnswerSampler:
+    """
+    Precomputed answer distributions for one survey's questions, so that
+    generating millions of responses costs one random draw per answer.
+    """
+
+    def __init__(self, questions, skew=1.3, skip_optional=0.2):
+        self.skip_optional = skip_optional
+        self.plan = []
+        for question in questions:
+            question_type = question.get('type')
+            if question_type == 'section_header':
+                continue
+            if question_type == 'multiple_choice' and question.get('options'):
+                values = list(question['options'])
+            elif question_type == 'rating':
+                values = list(RATING_ORDER)
+            elif question_type == 'yes_no':
+                values = ['Yes', 'No']
+            else:
+                # Free text: pick uniformly from canned comments
+                values = list(COMMENTS)
+                self.plan.append((question['id'], bool(question.get('required')), values, list(range(1, len(values) + 1))))
+                continue
+            self.plan.append((question['id'], bool(question.get('required')), values, zipf_weights(len(values), skew)))
+
+    def sample(self, rng):
+        """{question_id: answer} for one respondent; optional questions are sometimes skipped"""
+        answers = {}
+        random_ = rng.random
+        for question_id, required, values, cumulative in self.plan:
+            if not required and random_() < self.skip_optional:
+                continue
+            answers[question_id] = values[bisect.bisect_left(cumulative, random_() * cumulative[-1])]
+        return answers
+
+
+def make_answers(rng, questions, skew=1.3, skip_optional=0.2):
+    return AnswerSampler(questions, skew, skip_optional).sample(rng)
+
+
+# Share of responses per hour of day (UTC); respondents answer mostly in office hours and evenings
+HOURLY_WEIGHTS = (1, 1, 1, 1, 1, 2, 3, 5, 8, 10, 10, 9, 8, 9, 10, 10, 9, 8, 8, 9, 8, 6, 4, 2)
+_HOURLY_CUMULATIVE = list(itertools.accumulate(HOURLY_WEIGHTS))
+
+
+def make_completed_at(rng, launched_at, now, half_life_days=3.0):
+    """
+    Completion time for a survey launched at launched_at: most responses come
+    in the first days after launch and then tail off, within daily peaks.
+    """
+    window = (now - launched_at).total_seconds() / 86400
+    if window <= 0:
+        return now
+    day = min(rng.expovariate(math.log(2) / half_life_days), window)
+    moment = launched_at + datetime.timedelta(days=math.floor(day))
+    hour = bisect.bisect_left(_HOURLY_CUMULATIVE, rng.random() * _HOURLY_CUMULATIVE[-1])
+    moment = moment.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60), microsecond=0)
+    if moment < launched_at:
+        moment = launched_at + datetime.timedelta(seconds=rng.randrange(3600))
+    return min(moment, now)
+
+
+def make_email(rng, number=None):
+    number = rng.randint(1, 10 ** 9) if number is None else number
+    return f'respondent{number}@{rng.choice(EMAIL_DOMAINS)}'
+
+
+def default_rng(seed=None):
+    return random.Random(seed)
@@ -0,0 +1,274 @@
+"""
+Unit tests for the survey rules, and query budgets for the list endpoints
+(see gleam_backend/query_audit.py).
+
+The list views are called with enough rows that a per-row query (N+1)
+would blow the query budget. Those tests write to the MongoDB configured by
+MONGO_URI, so they only run against a database whose name ends in _test:
+
+    GLEAM_SKIP_DOTENV=1 MONGO_DB_NAME=gleam_surveys_test python manage.py test surveys
+
+(GLEAM_SKIP_DOTENV keeps .env from overriding the database named here.)
+"""
+import datetime
+import os
+from types import SimpleNamespace
+from unittest import SkipTest, TestCase, skipUnless
+
+import mongoengine
+from bson import ObjectId
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from gleam_backend.query_audit import (
+    QueryBudgetExceeded, audit_listener, capture, command_filter, query_budget, shape_of,
+)
+from gleam_backend.renderers import fast_json_enabled
+from . import watermark
+from .editing import diff_questions
+from .eligibility import BloomFilter
+from .models import Survey, SurveyResponse
+from .qualification import AnswerKey, normalize_answers
+from .response_rules import ResponseValidator
+from .views import SurveyViewSet, SurveyResponseViewSet
+
+SURVEYS = 8
+RESPONSES_PER_SURVEY = 6
+
+
+class ResponseValidatorTests(SimpleTestCase):
+
+    questions = [
+        {'id': 'name', 'text': 'Name', 'type': 'text', 'required': True},
+        {'id': 'score', 'text': 'Score', 'type': 'rating', 'min': 1, 'max': 10},
+        {'id': 'colour', 'text': 'Colour', 'type': 'multiple_choice', 'options': ['Red', 'Blue']},
+        {'type': 'section_header', 'text': 'More'},
+        {'id': 'again', 'text': 'Again?', 'type': 'yes_no'},
+    ]
+
+    def validator(self, questions=None, domains=()):
+        return ResponseValidator('s1', self.questions if questions is None else questions, domains)
+
+    def test_valid_submission(self):
+        errors = self.validator().check('a@example.com', {'name': 'Ann', 'score': '7', 'colour': 'Red', 'again': 'yes'})
+        self.assertEqual(errors, {})
+
+    def test_answer_errors(self):
+        errors = self.validator().check('a@example.com', {'name': 'Ann', 'score': 11, 'colour': 'Green', 'nope': 'x'})
+        self.assertEqual(set(errors['responses']), {'score', 'colour', 'nope'})
+
+    def test_required_and_legacy_keys(self):
+        self.assertIn('q-0', self.validator().check('a@example.com', {'score': 3})['responses'])
+        # Keyed by question text, or by q-<index>-<timestamp>
+        self.assertEqual(self.validator().check('a@example.com', {'Name': 'Ann', 'q-1-1700000000': 4}), {})
+
+    def test_allowed_domains(self):
+        validator = self.validator(domains=['@Example.com'])
+        self.assertEqual(validator.check('a@mail.example.com', {'name': 'Ann'}), {})
+        self.assertIn('respondent_email', validator.check('a@example.org', {'name': 'Ann'}))
+
+    def test_bad_bounds(self):
+        # Only rating questions read min/max; bad bounds fall back to 1-5
+        validator = self.validator([
+            {'id': 'r', 'type': 'rating', 'min': None, 'max': ''},
+            {'id': 't', 'type': 'text', 'min': 'abc'},
+        ])
+        self.assertEqual(validator.check('a@example.com', {'r': 5, 't': 'ok'}), {})
+        self.assertIn('r', validator.check('a@example.com', {'r': 6})['responses'])
+
+
+class DiffQuestionsTests(TestCase):
+
+    stored = [{'id': 'a', 'text': 'A'}, {'id': 'b', 'text': 'B', 'help': 'x'}, {'id': 'c', 'text': 'C'}]
+
+    def test_edits(self):
+        questions = [{'id': 'a', 'text': 'A'}, {'id': 'b', 'text': 'B2'}, {'id': 'c', 'text': 'C', 'required': True}]
+        update, array_filters, changed = diff_questions(self.stored, questions)
+        self.assertEqual(update, {
+            '$set': {'questions.$[q0].text': 'B2', 'questions.$[q1].required': True},
+            '$unset': {'questions.$[q0].help': ''},
+        })
+        self.assertEqual(array_filters, [{'q0.id': 'b'}, {'q1.id': 'c'}])
+        self.assertEqual(sorted(changed), ['questions.b.help', 'questions.b.text', 'questions.c.required'])
+
+    def test_inserts_and_removals(self):
+        new = [{'id': 'n1'}, {'id': 'n2'}]
+        update, _, _ = diff_questions(self.stored, self.stored[:1] + new + self.stored[1:])
+        self.assertEqual(update, {'$push': {'questions': {'$each': new, '$position': 1}}})
+        update, _, _ = diff_questions(self.stored, [self.stored[1]])
+        self.assertEqual(update, {'$pull': {'questions': {'id': {'$in': ['a', 'c']}}}})
+
+    def test_whole_list(self):
+        edited = {'id': 'a', 'text': 'A2'}
+        for questions in (
+            [self.stored[1], self.stored[0], self.stored[2]],  # reordered
+            [edited, self.stored[1]],  # edit and removal
+            [{'id': 'n1'}] + self.stored + [{'id': 'n2'}],  # two separate inserts
+            [{'text': 'no id'}],
+        ):
+            self.assertIsNone(diff_questions(self.stored, questions))
+
+
+@override_settings(SURVEY_WATERMARK_SETTLE_SECONDS=5)
+class WatermarkTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        oid = ObjectId.from_datetime(datetime.datetime(2024, 5, 1, 12, 0, 0))
+        self.assertEqual(watermark.parse(watermark.encode(oid)), (datetime.datetime(2024, 5, 1, 12, 0, 0), oid))
+        self.assertEqual(watermark.parse('2024-05-01T12:00:00Z'), (datetime.datetime(2024, 5, 1, 12, 0, 0), None))
+        with self.assertRaises(ValueError):
+            watermark.parse('yesterday')
+
+    def test_windows(self):
+        oid = ObjectId()
+        after = watermark.after(watermark.parse(watermark.encode(oid)))['_id']
+        self.assertEqual(after['$gt'], oid)
+        # Responses from the last few seconds are left for the next delta
+        self.assertLessEqual(after['$lt'].generation_time, oid.generation_time - datetime.timedelta(seconds=4))
+        overlap = watermark.overlap((watermark.EPOCH, oid))['_id']['$gt']
+        self.assertEqual(oid.generation_time - overlap.generation_time, datetime.timedelta(seconds=5))
+        self.assertEqual(watermark.overlap((watermark.EPOCH, None))['_id']['$gt'], ObjectId('0' * 24))
+
+
+class AnswerKeyTests(TestCase):
+
+    def test_normalize_answers(self):
+        self.assertEqual(normalize_answers([1, '2'], 3), [1, 2, None])
+        self.assertEqual(normalize_answers([0, 1, 2, 3], 2), [0, 1])
+        self.assertEqual(normalize_answers({'0': 1, '2': '', '9': 0}, 3), [1, None, None])
+        for raw in ('1,2', [True], [1.5], {'0': 'x'}):
+            with self.assertRaises(ValueError):
+                normalize_answers(raw, 3)
+
+    def test_grade(self):
+        key = AnswerKey('t1', [{'correctAnswer': 0}, {'correctAnswer': [1, 2]}, {'correctAnswer': 3}], None, 'Survey')
+        self.assertEqual(key.grade([0, 2, 3]), (100, True))
+        # 2 of 3 rounds half up to 67, below the default pass score
+        self.assertEqual(key.grade([0, 1, None]), (67, False))
+        self.assertEqual(key.grade([]), (0, False))
+        self.assertEqual(AnswerKey('t2', [], 50, 'Survey').score([]), 100)
+
+
+class BloomFilterTests(TestCase):
+
+    def test_membership(self):
+        bloom = BloomFilter(1000)
+        emails = [f'user{i}@example.com' for i in range(1000)]
+        for email in emails:
+            bloom.add(email)
+        self.assertTrue(all(email in bloom for email in emails))
+        false_positives = sum(f'other{i}@example.com' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)  # sized for 1%
+        self.assertFalse(bloom.full)
+        bloom.add('one.more@example.com')
+        self.assertTrue(bloom.full)
+
+
+@override_settings(MONGO_SLOW_COMMAND_MS=0)
+class QueryAuditTests(SimpleTestCase):
+
+    def issue(self, command_name, command, request_id):
+        """Feed one command through the listener, as pymongo would"""
+        event = SimpleNamespace(command_name=command_name, command=command, database_name='db',
+                                connection_id=('localhost', 27017), request_id=request_id, duration_micros=1500)
+        audit_listener.started(event)
+        audit_listener.succeeded(event)
+
+    def test_shape_of(self):
+        self.assertEqual(shape_of({'survey': 1, 'completed_at': {'$gt': 2}}), {'survey': '?', 'completed_at': {'$gt': '?'}})
+        self.assertEqual(shape_of({'_id': {'$in': [1, 2, 3]}}), {'_id': {'$in': ['?']}})
+        self.assertEqual(shape_of([{'a': 1}, {'a': 2}, {'b': 3}]), [{'a': '?'}, {'b': '?'}])
+
+    def test_command_filter(self):
+        self.assertEqual(command_filter('find', {'find': 'c', 'filter': {'a': 1}}), {'a': 1})
+        self.assertEqual(command_filter('count', {'count': 'c', 'query': {'a': 1}}), {'a': 1})
+        self.assertEqual(command_filter('aggregate', {'aggregate': 'c', 'pipeline': [{'$match': {}}]}), [{'$match': {}}])
+        self.assertEqual(command_filter('delete', {'delete': 'c', 'deletes': [{'q': {'a': 1}}]}), [{'a': 1}])
+        self.assertIsNone(command_filter('insert', {'insert': 'c', 'documents': []}))
+
+    def test_capture(self):
+        with capture() as outer:
+            self.issue('find', {'find': 'survey', 'filter': {'_id': 1}}, 1)
+            with capture() as inner:
+                self.issue('find', {'find': 'survey', 'filter': {'_id': 2}}, 2)
+                self.issue('getMore', {'getMore': 1, 'collection': 'survey'}, 3)  # ignored
+        self.issue('find', {'find': 'survey', 'filter': {'_id': 3}}, 4)
+        self.assertEqual((len(outer), len(inner)), (2, 1))
+        self.assertEqual(outer.repeats(2), [(2, 'find survey {"_id": "?"}')])
+        self.assertEqual(inner.records[0].seconds, 0.0015)
+
+    def test_query_budget(self):
+        with query_budget(2, max_repeats=1):
+            self.issue('find', {'find': 'survey', 'filter': {'_id': 1}}, 1)
+            self.issue('count', {'count': 'survey_response', 'query': {'survey': 1}}, 2)
+        with self.assertRaisesRegex(QueryBudgetExceeded, '3 MongoDB commands issued, budget is 2'):
+            with query_budget(2):
+                for request_id in range(3):
+                    self.issue('find', {'find': 'survey', 'filter': {'_id': request_id}}, request_id)
+        with self.assertRaisesRegex(QueryBudgetExceeded, r'2x find survey .*\(max 1 repeats\)'):
+            with query_budget(5, max_repeats=1):
+                for request_id in range(2):
+                    self.issue('find', {'find': 'survey', 'filter': {'_id': request_id}}, request_id)
+
+
+@skipUnless(os.getenv('MONGO_URI'), 'needs a MongoDB (MONGO_URI)')
+@skipUnless(fast_json_enabled(), 'the batched list path needs orjson')
+class ListQueryBudgetTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        db_name = mongoengine.get_db().name
+        if not db_name.endswith('_test'):
+            raise SkipTest(f'writes test data; MONGO_DB_NAME must end in _test (got {db_name!r})')
+        super().setUpClass()
+        cls.factory = APIRequestFactory()
+        cls.user_id = str(ObjectId())
+        cls.surveys = [
+            Survey(user_id=cls.user_id, title=f'Query budget {i}', questions=[{'id': 'q1', 'text': 'Why?'}]).save()
+            for i in range(SURVEYS)
+        ]
+        now = datetime.datetime.utcnow()
+        SurveyResponse._get_collection().insert_many([
+            {
+                'survey': survey.id,
+                'respondent_email': f'r{n}@example.com',
+                'responses': {'q1': f'answer {n}'},
+                'completed_at': now - datetime.timedelta(minutes=n),
+            }
+            for survey in cls.surveys for n in range(RESPONSES_PER_SURVEY)
+        ])
+
+    @classmethod
+    def tearDownClass(cls):
+        ids = [survey.id for survey in cls.surveys]
+        SurveyResponse._get_collection().delete_many({'survey': {'$in': ids}})
+        Survey._get_collection().delete_many({'_id': {'$in': ids}})
+        super().tearDownClass()
+
+    def list(self, viewset, path, **params):
+        request = self.factory.get(path, params, HTTP_ACCEPT='application/json')
+        request.session = {'user_id': self.user_id}
+        response = viewset.as_view({'get': 'list'})(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_survey_list(self):
+        # The surveys, then one grouped response count for the whole page
+        with query_budget(2, max_repeats=1):
+            data = self.list(SurveyViewSet, '/api/surveys/')
+        self.assertEqual(len(data), SURVEYS)
+        self.assertEqual({item['response_count'] for item in data}, {RESPONSES_PER_SURVEY})
+
+    def test_response_list(self):
+        survey = str(self.surveys[0].id)
+        # The survey lookup, then its responses
+        with query_budget(2, max_repeats=1):
+            data = self.list(SurveyResponseViewSet, '/api/survey-responses/', survey=survey)
+        self.assertEqual(len(data), RESPONSES_PER_SURVEY)
+
+    @override_settings(SURVEY_WATERMARK_SETTLE_SECONDS=0)  # the rows were inserted just now
+    def test_response_delta(self):
+        survey = str(self.surveys[0].id)
+        with query_budget(1):
+            data = self.list(SurveyResponseViewSet, '/api/survey-responses/', survey=survey, since='1970-01-01T00:00:00Z')
+        self.assertEqual(len(data['responses']), RESPONSES_PER_SURVEY)
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     SurveyViewSet, QualificationTestViewSet, SurveyResponseViewSet, 
     RespondentQualificationViewSet, chat_with_ai, generate_survey_from_chat, detect_redundancy,
-    generate_options, generate_image_view, analyze_survey_view
+    generate_options, generate_image_view, analyze_survey_view, dashboard_summary, survey_live_stream
 )
 
 router = DefaultRouter()
@@ -13,7 +13,9 @@ router.register(r'survey-responses', SurveyResponseViewSet, basename='surveyresp
 router.register(r'respondent-qualifications', RespondentQualificationViewSet, basename='respondentqualification')
 
 urlpatterns = [
+    path('surveys/<str:survey_id>/live/', survey_live_stream, name='survey-live'),
     path('', include(router.urls)),
+    path('dashboard/summary/', dashboard_summary, name='dashboard-summary'),
     path('ai/chat/', chat_with_ai, name='chat-with-ai'),
     path('ai/generate-from-chat/', generate_survey_from_chat, name='generate-from-chat'),
     path('ai/detect-redundancy/', detect_redundancy, name='detect-redundancy'),
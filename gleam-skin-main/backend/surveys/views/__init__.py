@@ -1,7 +1,10 @@
 from .survey_views import SurveyViewSet, QualificationTestViewSet, SurveyResponseViewSet, RespondentQualificationViewSet
 from .ai_views import chat_with_ai, generate_survey_from_chat, detect_redundancy, generate_options, generate_image_view, analyze_survey_view
+from .dashboard_views import dashboard_summary
+from .live_views import survey_live_stream
 
 __all__ = [
     'SurveyViewSet', 'QualificationTestViewSet', 'SurveyResponseViewSet', 'RespondentQualificationViewSet',
-    'chat_with_ai', 'generate_survey_from_chat', 'detect_redundancy', 'generate_options', 'generate_image_view', 'analyze_survey_view'
+    'chat_with_ai', 'generate_survey_from_chat', 'detect_redundancy', 'generate_options', 'generate_image_view', 'analyze_survey_view',
+    'dashboard_summary', 'survey_live_stream'
 ]
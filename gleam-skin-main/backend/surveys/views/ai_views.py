@@ -136,8 +136,10 @@ def analyze_survey_view(request):
     Expects: { "surveyId": "..." }
     Returns: JSON analysis results
     """
-    from ..ai_helper import analyze_survey_results
-    from ..models import Survey, SurveyResponse
+    from ..ai_helper import analyze_survey_results, summarize_for_ai
+    from ..models import Survey
+    from ..results import aggregate, responses_collection
+    from gleam_backend.mongo import ANALYTICS_ALIAS
     
     survey_id = request.data.get('surveyId')
     api_key = request.data.get('api_key') # Optional override
@@ -157,27 +159,18 @@ def analyze_survey_view(request):
             # or usually mongoengine handles it. 
             return Response({'detail': 'Survey not found'}, status=status.HTTP_404_NOT_FOUND)
             
-        # Fetch Responses
-        responses = SurveyResponse.objects.filter(survey=survey)
-        
-        # Convert to list of dicts/objects that helper expects
-        # The helper expects lists of dict-like objects or we can pass doc objects if helper handles them.
-        # Check helper: 
-        # q.get('text') -> implies dict interface.
-        # r.get('responses') -> implies dict interface.
-        # MongoEngine objects allow .to_mongo() but simpler to just build dicts.
-        
         survey_title = survey.title
         questions_data = survey.questions # ListField(DictField()) -> already list of dicts
-        
-        responses_data = []
-        for r in responses:
-            responses_data.append({
-                'responses': r.responses, # DictField -> dict
-                'completed_at': r.completed_at
-            })
-            
-        result = analyze_survey_results(survey_title, questions_data, responses_data, api_key)
+
+        # Aggregated in MongoDB on the analytics alias (prefers a secondary); no response is loaded here
+        aggregated = aggregate(survey.id, questions_data, collection=responses_collection(ANALYTICS_ALIAS))
+        text_summary = summarize_for_ai(survey_title, aggregated['total'], aggregated['question_stats'],
+                                        aggregated['text_answers'])
+
+        result = analyze_survey_results(
+            survey_title, questions_data, None, api_key,
+            aggregated=(aggregated['total'], aggregated['question_stats'], text_summary),
+        )
         return Response(result)
         
     except Exception as e:
@@ -0,0 +1,22 @@
+from rest_framework import status, permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from .survey_views import survey_owner_id
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def dashboard_summary(request):
+    """
+    Survey count, response totals (all time, last 7 and 30 days), the most
+    active surveys and the latest responses of the caller, from one
+    aggregation. Briefly cached per user.
+    """
+    from ..dashboard import get_summary
+
+    try:
+        return Response(get_summary(survey_owner_id(request)))
+    except Exception as e:
+        return Response({'detail': f'Error building dashboard: {str(e)}', 'error': True},
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,81 @@
+import json
+import time
+
+from bson import ObjectId
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from ..models import Survey
+
+
+@require_GET
+def survey_live_stream(request, survey_id):
+    """
+    Server-Sent Events of new responses to a survey. Each `response` event
+    carries the response (as in /api/survey-responses/) and its watermark,
+    which is also the event id: a reconnecting EventSource sends it back as
+    Last-Event-ID (or pass ?since=<watermark>) and first receives what it
+    missed. When it missed more than SURVEY_LIVE_CATCH_UP_ROWS, or falls too
+    far behind, a `reset` event asks it to reload. All clients of a survey
+    share one watcher (see surveys/live.py); past SURVEY_LIVE_MAX_STREAMS
+    open streams the request gets a 503 and the client polls instead.
+    """
+    from .. import live
+
+    if not ObjectId.is_valid(survey_id) or not Survey.objects(id=survey_id).count():
+        return JsonResponse({'error': 'Survey not found'}, status=404)
+
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    limit = getattr(settings, 'SURVEY_LIVE_CATCH_UP_ROWS', 1000)
+    # subscribe() returns once the feed is watching, so the backlog read next
+    # overlaps it instead of leaving a gap; the overlap is dropped by watermark
+    try:
+        feed, subscriber = live.subscribe(survey_id)
+    except live.TooManyStreams as e:
+        response = JsonResponse({'detail': str(e), 'error': True}, status=503)
+        response['Retry-After'] = str(getattr(settings, 'SURVEY_LIVE_MAX_SECONDS', 300))
+        return response
+    try:
+        backlog, truncated = live.catch_up(survey_id, since, limit) if since else ([], False)
+    except ValueError as e:
+        live.unsubscribe(feed, subscriber)
+        return JsonResponse({'detail': str(e)}, status=400)
+
+    keepalive = getattr(settings, 'SURVEY_LIVE_KEEPALIVE_SECONDS', 15)
+    max_seconds = getattr(settings, 'SURVEY_LIVE_MAX_SECONDS', 300)
+
+    def stream():
+        try:
+            yield b'retry: 3000\n\n'
+            yield live.sse_frame(json.dumps({'survey': survey_id}), event='ready')
+            if truncated:
+                # More was missed than one catch-up sends: reload instead
+                yield live.sse_frame('{}', event='reset')
+                return
+            sent = set()
+            for row in backlog:
+                wm, frame = live.response_frame(row)
+                sent.add(wm)
+                yield frame
+            # Connections are recycled; EventSource reconnects with Last-Event-ID
+            deadline = time.monotonic() + max_seconds
+            while time.monotonic() < deadline:
+                events = subscriber.wait(keepalive)
+                for wm, frame in events:
+                    if wm not in sent:
+                        yield frame
+                if subscriber.overflowed:
+                    yield live.sse_frame('{}', event='reset')
+                    return
+                if subscriber.closed:
+                    return
+                if not events:
+                    yield b': keepalive\n\n'
+        finally:
+            live.unsubscribe(feed, subscriber)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: do not buffer the stream
+    return response
@@ -1,17 +1,59 @@
-from rest_framework import viewsets, status, permissions
+from rest_framework import viewsets, status, permissions, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from ..models import Survey, QualificationTest, SurveyResponse, RespondentQualification
-from ..serializers import SurveySerializer, QualificationTestSerializer, SurveyResponseSerializer, RespondentQualificationSerializer
-from mongoengine.errors import DoesNotExist
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from .. import editing, eligibility, snapshots
+from ..models import Survey, QualificationTest, SurveyResponse, RespondentQualification, referenced_id
+from ..serializers import (
+    SurveySerializer, QualificationTestSerializer, SurveyResponseSerializer, RespondentQualificationSerializer,
+    QualificationAttemptSerializer, QuestionInsertSerializer, QuestionMoveSerializer
+)
+from mongoengine.errors import DoesNotExist, NotUniqueError, ValidationError
+from authentication.user_cache import current_user_id, is_admin
+from gleam_backend.renderers import FastJSONRenderer, fast_json_enabled
+from gleam_backend.timing import timed
+from bson import ObjectId
+import calendar
+import hashlib
+
+def survey_owner_id(request):
+    """user_id that the request's surveys belong to"""
+    # Get user_id from session (MongoDB auth)
+    user_id = current_user_id(request)
+    if not user_id:
+        # Fallback to Django user if available
+        user_id = request.user.id if hasattr(request.user, 'id') else None
+    # Keep user_id as string (MongoDB ObjectId) - don't convert to int
+    return str(user_id) if user_id else "0"  # "0": anonymous user
 
 class MongoEngineViewSet(viewsets.ViewSet):
     """Base ViewSet for MongoEngine documents"""
     
     def list(self, request):
         queryset = self.get_queryset()
+        if self.use_raw_representation(request):
+            with timed('serialize'):
+                data = self.serializer_class.represent_rows(self.serializer_class.raw_queryset(queryset))
+            return Response(data)
         serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        with timed('serialize'):
+            data = serializer.data
+        return Response(data)
+
+    def use_raw_representation(self, request):
+        """
+        Build list/retrieve bodies from as_pymongo() rows instead of documents
+        and serializer fields. Only when the orjson renderer will encode them:
+        rows keep ObjectIds and datetimes that other renderers would format
+        differently.
+        """
+        return (
+            getattr(self.serializer_class, 'document', None) is not None
+            and isinstance(getattr(request, 'accepted_renderer', None), FastJSONRenderer)
+            and fast_json_enabled()
+        )
 
     def create(self, request):
         # print("=" * 50)
@@ -36,13 +78,53 @@ class MongoEngineViewSet(viewsets.ViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def retrieve(self, request, pk=None):
+        validators = self.get_cache_validators(pk)
+        precomputed = None
+        if validators:
+            etag, last_modified, precomputed = validators
+            last_modified_ts = calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+            if not_modified is not None:
+                return self.apply_cache_validators(not_modified, validators)
         try:
-            instance = self.get_queryset().get(id=pk)
-            serializer = self.serializer_class(instance)
-            return Response(serializer.data)
+            if self.use_raw_representation(request):
+                queryset = self.serializer_class.raw_queryset(self.get_queryset().filter(id=pk))
+                with timed('serialize'):
+                    rows = self.serializer_class.represent_rows(queryset, precomputed=precomputed)
+                if not rows:
+                    raise DoesNotExist
+                data = rows[0]
+            else:
+                instance = self.get_queryset().get(id=pk)
+                serializer = self.serializer_class(instance, context={'precomputed': precomputed or {}})
+                with timed('serialize'):
+                    data = serializer.data
+            response = Response(data)
+            if validators:
+                self.apply_cache_validators(response, validators)
+            return response
         except DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+    def get_cache_validators(self, pk):
+        """
+        Return (etag, last_modified, precomputed) for conditional GETs, or
+        None when the resource does not support them. Must be cheap: it runs
+        before the full document is loaded. precomputed holds computed
+        representation fields read along the way (or None), so the body does
+        not read them again.
+        """
+        return None
+
+    def apply_cache_validators(self, response, validators):
+        etag, last_modified, _ = validators
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(calendar.timegm(last_modified.utctimetuple()))
+        # Let browsers keep the body but revalidate on every visit
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
     def update(self, request, pk=None):
         try:
             instance = self.get_queryset().get(id=pk)
@@ -71,20 +153,218 @@ class SurveyViewSet(MongoEngineViewSet):
     permission_classes = [permissions.AllowAny]  # Allow any for now
 
     def get_queryset(self):
-        return Survey.objects.all()
+        queryset = Survey.objects.all()
+        if self.action == 'list':
+            # Served by the (user_id, -updated_at) index
+            owner = self.listing_owner_id()
+            if owner is not None:
+                queryset = queryset.filter(user_id=owner)
+            queryset = queryset.order_by('-updated_at')
+        return queryset
+
+    def list(self, request):
+        """
+        The caller's surveys, most recently edited first. Admins may list
+        another user's with ?user_id=<id>, or everybody's with ?user_id=all.
+        """
+        if request.query_params.get('user_id') and not is_admin(request):
+            return Response({
+                'detail': "Only admins can list other users' surveys",
+                'error': True
+            }, status=status.HTTP_403_FORBIDDEN)
+        return super().list(request)
+
+    def owner_id(self):
+        return survey_owner_id(self.request)
+
+    def listing_owner_id(self):
+        """user_id the listing is limited to; None lists every survey"""
+        requested = self.request.query_params.get('user_id')
+        if requested:  # list() already checked the caller is an admin
+            return None if requested == 'all' else requested
+        return self.owner_id()
+
+    def get_cache_validators(self, pk):
+        """
+        One round trip: the survey's version fields, with its response count
+        and newest completion time joined in. response_count is part of the
+        representation, so a new response moves both validators; the count
+        is handed to the body as well. Last-Modified is the newer of
+        updated_at and the last completed_at; a response uploaded with an
+        older completed_at only moves the ETag, which clients send first.
+        ($lookup with localField and a sub-pipeline needs MongoDB 5.0, as
+        the dashboard does.)
+        """
+        if not ObjectId.is_valid(pk):
+            return None
+        pipeline = [
+            {'$match': {'_id': ObjectId(pk)}},
+            {'$project': {'updated_at': 1, 'content_hash': 1}},
+            {'$lookup': {
+                'from': SurveyResponse._get_collection_name(),
+                'localField': '_id',
+                'foreignField': 'survey',
+                # Only survey and completed_at are needed: served from the (survey, completed_at) index
+                'pipeline': [{'$group': {'_id': None, 'n': {'$sum': 1}, 'last': {'$max': '$completed_at'}}}],
+                'as': 'responses',
+            }},
+        ]
+        row = next(Survey._get_collection().aggregate(pipeline), None)
+        if not row or not row.get('updated_at'):
+            return None
+        updated_at = row['updated_at']
+        stats = row['responses'][0] if row['responses'] else {}
+        response_count = stats.get('n', 0)
+        last_response_at = stats.get('last')
+        last_modified = max(updated_at, last_response_at) if last_response_at else updated_at
+        # updated_at moves on every write, including atomic edits that drop content_hash
+        version = f"{pk}:{updated_at.isoformat()}:{row.get('content_hash', '')}:{response_count}"
+        etag = quote_etag(hashlib.sha1(version.encode('utf-8')).hexdigest())
+        return etag, last_modified, {'response_count': response_count}
 
     def perform_create(self, serializer):
-        # Get user_id from session (MongoDB auth)
-        user_id = self.request.session.get('user_id')
-        if not user_id:
-            # Fallback to Django user if available
-            user_id = self.request.user.id if hasattr(self.request.user, 'id') else None
-        
-        if user_id:
-            # Keep user_id as string (MongoDB ObjectId) - don't convert to int
-            serializer.save(user_id=str(user_id))
-        else:
-            serializer.save(user_id="0")  # Anonymous user
+        serializer.save(user_id=self.owner_id())
+
+    def partial_update(self, request, pk=None):
+        """
+        PATCH: write only the fields that differ from the stored survey, as one
+        update; edited, added or removed questions are written by id rather
+        than as the whole list. Returns the changed field paths instead of the
+        whole survey.
+        """
+        serializer = self.serializer_class(data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            updated_at, changed = editing.patch_survey(pk, serializer.validated_data)
+        except DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return self.edit_response(pk, updated_at, changed=changed)
+
+    def edit_response(self, pk, updated_at, status_code=status.HTTP_200_OK, **extra):
+        return Response({
+            'id': pk,
+            'updated_at': serializers.DateTimeField().to_representation(updated_at) if updated_at else None,
+            **extra,
+        }, status=status_code)
+
+    @action(detail=True, methods=['post'], url_path='questions')
+    def add_question(self, request, pk=None):
+        """
+        Insert one question without rewriting the others.
+        Expects: { "question": {...}, "position": 2 }  (no position: append)
+        The question keeps its "id" or is given one; it is returned.
+        """
+        serializer = QuestionInsertSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        try:
+            question, updated_at = editing.insert_question(pk, data['question'], data.get('position'))
+        except DoesNotExist:
+            return Response({'error': 'Survey not found'}, status=status.HTTP_404_NOT_FOUND)
+        except NotUniqueError as e:
+            return Response({'detail': str(e), 'error': True}, status=status.HTTP_409_CONFLICT)
+        return self.edit_response(pk, updated_at, status.HTTP_201_CREATED, question=question)
+
+    @action(detail=True, methods=['patch', 'delete'], url_path=r'questions/(?P<question_id>[^/]+)')
+    def question(self, request, pk=None, question_id=None):
+        """
+        PATCH: set the given keys of one question ({"text": ..., "options": [...]};
+        null removes a key). DELETE: remove the question.
+        """
+        try:
+            if request.method == 'DELETE':
+                editing.delete_question(pk, question_id)
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            if not isinstance(request.data, dict):
+                return Response({'detail': 'Expected an object of question keys'}, status=status.HTTP_400_BAD_REQUEST)
+            updated_at = editing.update_question(pk, question_id, dict(request.data))
+        except DoesNotExist:
+            return Response({'error': 'Question not found'}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self.edit_response(pk, updated_at, question=question_id)
+
+    @action(detail=True, methods=['post'], url_path=r'questions/(?P<question_id>[^/]+)/move')
+    def move_question(self, request, pk=None, question_id=None):
+        """
+        Move one question. Expects: { "position": 0 }; positions past the end
+        move it last.
+        """
+        serializer = QuestionMoveSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        position = serializer.validated_data['position']
+        try:
+            updated_at = editing.move_question(pk, question_id, position)
+        except DoesNotExist:
+            return Response({'error': 'Question not found'}, status=status.HTTP_404_NOT_FOUND)
+        return self.edit_response(pk, updated_at, question=question_id, position=position)
+
+    @action(detail=True, methods=['get'])
+    def public(self, request, pk=None):
+        """
+        Respondent view of a survey and its qualification test, served from
+        a pre-rendered snapshot. Mongo is only read after the survey changes.
+        """
+        try:
+            version, payload = snapshots.get_snapshot(pk)
+        except (DoesNotExist, ValidationError):
+            return Response({'error': 'Survey not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = quote_etag(version)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(payload, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, no-cache'
+        return response
+
+    @action(detail=True, methods=['get'])
+    def results(self, request, pk=None):
+        """
+        Results page in one request: survey header, per-question stats, last
+        response time and the newest responses (?page_size=, default
+        SURVEY_RESULTS_PAGE_SIZE). One survey read and one aggregation.
+        With ?since=<watermark> (returned by every call) only what arrived
+        after it: stats deltas, the new responses and the next watermark.
+        """
+        from django.conf import settings
+        from .. import results
+
+        default_size = getattr(settings, 'SURVEY_RESULTS_PAGE_SIZE', 50)
+        try:
+            page_size = int(request.query_params.get('page_size', default_size))
+        except ValueError:
+            return Response({'detail': 'page_size must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        page_size = max(0, min(page_size, getattr(settings, 'SURVEY_RESULTS_MAX_PAGE_SIZE', 500)))
+
+        since = request.query_params.get('since')
+        try:
+            data = results.load_since(pk, since, page_size) if since else results.load(pk, page_size)
+        except DoesNotExist:
+            return Response({'error': 'Survey not found'}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def eligibility(self, request, pk=None):
+        """
+        Whether an email may take this survey: domain rules, qualification
+        outcome and whether it already responded.
+        Expects: ?email=...
+        """
+        from ..response_rules import get_validator
+
+        email = request.query_params.get('email', '').strip()
+        if not email or '@' not in email:
+            return Response({'detail': 'A valid email is required'}, status=status.HTTP_400_BAD_REQUEST)
+        validator = get_validator(pk)
+        if validator is None:
+            return Response({'error': 'Survey not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(eligibility.check(pk, email, validator))
 
     @action(detail=True, methods=['post'])
     def send_invite(self, request, pk=None):
@@ -146,6 +426,45 @@ class SurveyViewSet(MongoEngineViewSet):
                 'traceback': "".join(error_details[-3:]) # Return last few lines to frontend
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def record_attempt(request):
+    """Score a qualification attempt against the test's answer key and store it"""
+    from ..qualification import get_answer_key, normalize_answers
+
+    serializer = QualificationAttemptSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+
+    try:
+        key = get_answer_key(data['survey_id'])
+    except ValidationError:
+        key = None
+    if key is None:
+        return Response({'error': 'Qualification test not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        answers = normalize_answers(data['answers'], len(key.correct))
+    except ValueError as e:
+        return Response({'answers': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+    score, passed = key.grade(answers)
+    attempt = RespondentQualification(
+        survey=Survey(id=ObjectId(data['survey_id'])),
+        respondent_email=data['respondent_email'],
+        qualification_name=f"Qualified: {key.survey_title or 'Survey'}",
+        score=score,
+        passed=passed,
+        answers=answers,
+    ).save()
+    eligibility.remember(data['survey_id'], data['respondent_email'])
+
+    return Response({
+        'id': str(attempt.id),
+        'score': score,
+        'passed': passed,
+        'pass_score': key.pass_score,
+    }, status=status.HTTP_201_CREATED)
+
 class QualificationTestViewSet(MongoEngineViewSet):
     """Qualification Test CRUD operations"""
     serializer_class = QualificationTestSerializer
@@ -162,11 +481,134 @@ class QualificationTestViewSet(MongoEngineViewSet):
                 return QualificationTest.objects.none()
         return queryset
 
+    @action(detail=False, methods=['post'])
+    def score(self, request):
+        """
+        Score a qualification attempt and record the result.
+        Expects: { "survey_id": "...", "respondent_email": "...", "answers": {"0": 2, ...} | [2, ...] }
+        Returns: { "score": 75, "passed": false, "pass_score": 80, "id": "..." }
+        """
+        return record_attempt(request)
+
+    @action(detail=True, methods=['post'])
+    def rescore(self, request, pk=None):
+        """Re-grade all stored attempts after this test's answer key changed"""
+        from ..qualification import rescore_attempts
+
+        try:
+            test = self.get_queryset().only('survey').get(id=pk)
+        except (DoesNotExist, ValidationError):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        survey_id = referenced_id(test, 'survey')
+        if survey_id is None:
+            return Response({'error': 'Test is not linked to a survey'}, status=status.HTTP_400_BAD_REQUEST)
+
+        checked, updated = rescore_attempts(str(survey_id))
+        return Response({'checked': checked, 'updated': updated})
+
 class SurveyResponseViewSet(MongoEngineViewSet):
     """Survey Response CRUD operations"""
     serializer_class = SurveyResponseSerializer
     permission_classes = [permissions.AllowAny]
 
+    def create(self, request):
+        from .. import write_behind
+        if not write_behind.is_enabled():
+            return super().create(request)
+
+        # Write-behind mode: validate (against the compiled survey rules), spool durably,
+        # acknowledge; the flusher inserts later
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        survey_id = serializer.validated_data['survey_id']
+
+        from ..ingestion import build_document
+        document = build_document(serializer.validated_data)
+        try:
+            write_behind.get_spool().append(document)
+        except OSError as e:
+            return Response({'detail': f'Error queuing response: {str(e)}', 'error': True}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response({
+            'id': str(document['_id']),
+            'survey': survey_id,
+            'respondent_email': document['respondent_email'],
+            'responses': document['responses'],
+            'completed_at': serializers.DateTimeField().to_representation(document['completed_at']),
+            'queued': True,
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path='ingest-stats')
+    def ingest_stats(self, request):
+        """Queue depth and flush counters of the write-behind spool (this process)"""
+        from .. import write_behind
+        if not write_behind.is_enabled():
+            return Response({'enabled': False})
+        return Response({'enabled': True, **write_behind.get_spool().metrics()})
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Store many responses (one or more surveys) in one request.
+        Expects: { "responses": [{"survey_id", "respondent_email", "responses", "completed_at"?}, ...] }
+        Returns per-item results in input order.
+        """
+        from django.conf import settings
+        from ..ingestion import ingest
+
+        items = request.data.get('responses') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'A non-empty "responses" list is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_items = getattr(settings, 'SURVEY_BULK_MAX_ITEMS', 10000)
+        if len(items) > max_items:
+            return Response({'detail': f'At most {max_items} responses per batch'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = ingest(items)
+        except Exception as e:
+            return Response({'detail': f'Error storing responses: {str(e)}', 'error': True}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        code = status.HTTP_201_CREATED if result['failed'] == 0 else status.HTTP_207_MULTI_STATUS
+        return Response(result, status=code)
+
+    def list(self, request):
+        if request.query_params.get('since'):
+            return self.list_since(request)
+        return super().list(request)
+
+    def list_since(self, request):
+        """
+        ?survey=<id>&since=<watermark>: responses stored after the watermark,
+        oldest first, up to a few seconds ago (see watermark.py), at most
+        ?limit= (SURVEY_DELTA_MAX_ROWS) per call. Returns { "responses",
+        "watermark", "has_more" }; poll again with the returned watermark.
+        """
+        from django.conf import settings
+        from .. import watermark
+
+        survey_id = request.query_params.get('survey')
+        if not survey_id or not ObjectId.is_valid(survey_id):
+            return Response({'detail': 'since needs a valid survey id'}, status=status.HTTP_400_BAD_REQUEST)
+        since = request.query_params['since']
+        max_rows = getattr(settings, 'SURVEY_DELTA_MAX_ROWS', 1000)
+        try:
+            position = watermark.parse(since)
+            limit = max(1, min(int(request.query_params.get('limit', max_rows)), max_rows))
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        query = {'survey': ObjectId(survey_id), **watermark.after(position)}
+        queryset = SurveyResponse.objects(__raw__=query).order_by('id').limit(limit + 1)
+        rows = list(self.serializer_class.raw_queryset(queryset))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_watermark = watermark.of_row(rows[-1]) if rows else since
+        with timed('serialize'):
+            data = self.serializer_class.represent_rows(rows, format_datetimes=not self.use_raw_representation(request))
+        return Response({'responses': data, 'watermark': next_watermark, 'has_more': has_more})
+
     def get_queryset(self):
         queryset = SurveyResponse.objects.all()
         survey_id = self.request.query_params.get('survey')
@@ -185,3 +627,16 @@ class RespondentQualificationViewSet(MongoEngineViewSet):
 
     def get_queryset(self):
         return RespondentQualification.objects.all()
+
+    def create(self, request):
+        """
+        Same as POST /api/qualification-tests/score/: the score and outcome
+        come from the answer key, never from the client.
+        """
+        return record_attempt(request)
+
+    def update(self, request, pk=None):
+        return Response({
+            'detail': 'Attempts are scored on the server and cannot be edited',
+            'error': True
+        }, status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -0,0 +1,93 @@
+"""
+Response watermarks for delta sync.
+
+A watermark marks the newest response a client has seen, as
+"<ms>:<response ObjectId>". Responses are ordered by _id, which the server
+generates when it accepts a response (directly or into the write-behind
+spool), not by completed_at: offline clients set that themselves, and a
+response uploaded later with an older time would sort before the
+watermark. Queries use the (survey, _id) index. The ms part is the id's
+timestamp; watermarks issued with a completed_at there still parse, only
+the id is used.
+
+Ids do not commit in order: a spooled response is inserted up to
+SURVEY_SPOOL_FLUSH_INTERVAL later, and app servers' clocks differ. For
+SURVEY_WATERMARK_SETTLE_SECONDS after its id was generated a response may
+still land behind a watermark, so:
+
+  * counted deltas (results stats, the response list) and full loads stop
+    at responses older than that (after(), until_settled()); a late insert
+    is then still after the watermark the client holds;
+  * feeds that publish at once (SSE catch-up, the polling watcher) re-read
+    that window behind the watermark (overlap()) and drop responses already
+    sent, by id.
+
+A plain ISO-8601 datetime is accepted too (everything stored after it).
+"""
+import datetime
+
+from bson import ObjectId
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+EPOCH = datetime.datetime(1970, 1, 1)
+ORDER = [('_id', 1)]
+
+
+def settle_seconds():
+    return getattr(settings, 'SURVEY_WATERMARK_SETTLE_SECONDS', 5)
+
+
+def encode(response_id):
+    ms = int((response_id.generation_time.replace(tzinfo=None) - EPOCH).total_seconds()) * 1000
+    return f'{ms}:{response_id}'
+
+
+def parse(value):
+    """(time, ObjectId or None) from a watermark; raises ValueError"""
+    ms, sep, response_id = value.partition(':')
+    if sep and ms.isdigit() and ObjectId.is_valid(response_id):
+        return EPOCH + datetime.timedelta(milliseconds=int(ms)), ObjectId(response_id)
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError('since must be a watermark ("<ms>:<id>") or an ISO-8601 datetime')
+    if timezone.is_aware(parsed):
+        parsed = timezone.make_naive(parsed, datetime.timezone.utc)
+    return max(parsed, EPOCH), None
+
+
+def _id_at(moment):
+    return ObjectId.from_datetime(max(moment, EPOCH))
+
+
+def _settled():
+    """Ids below this belong to responses whose insert has committed"""
+    return _id_at(datetime.datetime.utcnow() - datetime.timedelta(seconds=settle_seconds()))
+
+
+def after(watermark, settled=True):
+    """Filter for responses newer than the watermark; only settled ones unless settled=False"""
+    moment, response_id = watermark
+    bounds = {'$gt': response_id if response_id is not None else _id_at(moment)}
+    if settled:
+        bounds['$lt'] = _settled()
+    return {'_id': bounds}
+
+
+def until_settled():
+    """Filter for all settled responses (a full load the watermark of which deltas continue from)"""
+    return {'_id': {'$lt': _settled()}}
+
+
+def overlap(watermark):
+    """Filter for responses newer than the settle window behind the watermark; drop those already sent"""
+    moment, response_id = watermark
+    if response_id is not None:
+        moment = response_id.generation_time.replace(tzinfo=None)
+    return {'_id': {'$gt': _id_at(moment - datetime.timedelta(seconds=settle_seconds()))}}
+
+
+def of_row(row):
+    """Watermark of an as_pymongo() response row"""
+    return encode(row['_id'])
@@ -0,0 +1,301 @@
+"""
+Write-behind ingestion for survey responses.
+
+When SURVEY_RESPONSE_WRITE_BEHIND is on, POST /api/survey-responses/ only
+validates the submission and appends it to a local append-only spool file.
+A background thread flushes the spool to the survey_response collection in
+micro-batches (SURVEY_SPOOL_BATCH_SIZE records, or every
+SURVEY_SPOOL_FLUSH_INTERVAL seconds, whichever comes first).
+
+Spool layout (SURVEY_SPOOL_DIR):
+    active-<pid>.jsonl           records being appended by process <pid>
+    ready-<pid>-<ns>.jsonl       rotated, waiting to be flushed
+    flushing-<pid>-<name>        claimed by the flusher of process <pid>
+    dead-<ns>.jsonl              records Mongo rejected, kept for inspection
+
+Every record carries its final _id, so replaying a file after a crash is
+idempotent: duplicates are reported by Mongo and skipped.
+"""
+import glob
+import logging
+import os
+import threading
+import time
+
+from bson import json_util
+from django.conf import settings
+from pymongo.errors import BulkWriteError
+
+from gleam_backend import metrics
+
+from . import eligibility
+from .ingestion import chunked
+from .models import SurveyResponse
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner_pid(path, prefix):
+    try:
+        return int(os.path.basename(path)[len(prefix):].split('-', 1)[0].split('.', 1)[0])
+    except ValueError:
+        return None
+
+
+class ResponseSpool:
+    """Durable local buffer plus the background flusher that drains it"""
+
+    def __init__(self, directory, batch_size=500, flush_interval=1.0, fsync=True):
+        self.directory = str(directory)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._file = None
+        self._thread = None
+        self._pending = 0
+        self._in_flight = 0
+
+        self.accepted_total = 0
+        self.flushed_total = 0
+        self.duplicate_total = 0
+        self.failed_total = 0
+        self.flush_count = 0
+        self.last_flush_at = None
+        self.last_flush_seconds = None
+        self.last_error = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.recover()
+
+    @property
+    def active_path(self):
+        return os.path.join(self.directory, f'active-{self.pid}.jsonl')
+
+    def append(self, document):
+        """Durably buffer one raw survey_response document"""
+        line = json_util.dumps(document) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.active_path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._pending += 1
+            self.accepted_total += 1
+            full = self._pending >= self.batch_size
+        eligibility.remember(document['survey'], document['respondent_email'])
+        self.start()
+        if full:
+            self._wakeup.set()
+
+    def rotate(self):
+        """Seal the active file so the flusher can pick it up"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+            if self._pending:
+                os.replace(self.active_path, os.path.join(self.directory, f'ready-{self.pid}-{time.time_ns()}.jsonl'))
+            self._pending = 0
+
+    def recover(self):
+        """
+        Hand files left behind by dead processes back to the flusher. Runs
+        before this spool writes anything, so files carrying our own pid
+        belong to a dead predecessor (containers restart workers as the
+        same pid), not to us.
+        """
+        for prefix in ('active-', 'flushing-'):
+            for path in glob.glob(os.path.join(self.directory, f'{prefix}*')):
+                pid = _owner_pid(path, prefix)
+                if pid is None or (pid != self.pid and _pid_alive(pid)):
+                    continue
+                name = os.path.basename(path)[len(prefix):]
+                if prefix == 'flushing-':
+                    name = name.split('-', 1)[1]
+                    target = os.path.join(self.directory, name)
+                else:
+                    target = os.path.join(self.directory, f'ready-{pid}-{time.time_ns()}.jsonl')
+                try:
+                    os.replace(path, target)
+                except OSError:
+                    pass
+
+    def flush(self):
+        """Write every sealed spool file to Mongo; returns records written"""
+        self.rotate()
+        written = 0
+        with self._flush_lock:
+            # Claimed by this process but not released after a failure
+            for path in sorted(glob.glob(os.path.join(self.directory, f'flushing-{self.pid}-*'))):
+                written += self._flush_file(path)
+            for path in sorted(glob.glob(os.path.join(self.directory, 'ready-*.jsonl'))):
+                claimed = os.path.join(self.directory, f'flushing-{self.pid}-{os.path.basename(path)}')
+                try:
+                    os.rename(path, claimed)
+                except OSError:
+                    continue  # another process claimed it first
+                written += self._flush_file(claimed)
+        return written
+
+    def _release(self, path):
+        """Give a claimed file back as ready-*, for the next flush to retry"""
+        name = os.path.basename(path)[len(f'flushing-{self.pid}-'):]
+        try:
+            os.replace(path, os.path.join(self.directory, name))
+        except OSError:
+            pass  # still flushing-<pid>-*, which flush() also picks up
+
+    def _flush_file(self, path):
+        started = time.monotonic()
+        collection = SurveyResponse._get_collection()
+        rejected = []
+        written = 0
+        try:
+            documents = []
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        documents.append(json_util.loads(line))
+                    except ValueError:
+                        # A torn final line from a crash mid-append
+                        logger.warning('Skipping unreadable spool record in %s', path)
+            self._in_flight = len(documents)
+
+            for _, batch in chunked(documents, self.batch_size):
+                try:
+                    result = collection.insert_many(batch, ordered=False)
+                    written += len(result.inserted_ids)
+                except BulkWriteError as e:
+                    details = e.details
+                    written += details.get('nInserted', 0)
+                    for error in details.get('writeErrors', []):
+                        if error.get('code') == DUPLICATE_KEY:
+                            self.duplicate_total += 1
+                        else:
+                            rejected.append(batch[error['index']])
+                            self.last_error = error.get('errmsg')
+                self._in_flight -= len(batch)
+        except Exception:
+            # e.g. AutoReconnect or no primary: the whole file is retried later;
+            # batches that did get in come back as duplicates and are skipped
+            self._in_flight = 0
+            self.flushed_total += written
+            self._release(path)
+            raise
+
+        if rejected:
+            dead = os.path.join(self.directory, f'dead-{time.time_ns()}.jsonl')
+            with open(dead, 'w', encoding='utf-8') as f:
+                f.writelines(json_util.dumps(doc) + '\n' for doc in rejected)
+            self.failed_total += len(rejected)
+            logger.error('%d spooled responses rejected by Mongo, kept in %s', len(rejected), dead)
+
+        os.remove(path)
+        self.flushed_total += written
+        self.flush_count += 1
+        self.last_flush_at = time.time()
+        self.last_flush_seconds = time.monotonic() - started
+        return written
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='response-spool-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # Records stay on disk; the next tick retries them
+                self.last_error = str(e)
+                logger.exception('Response spool flush failed')
+
+    def spool_bytes(self):
+        total = 0
+        for path in glob.glob(os.path.join(self.directory, '*.jsonl')):
+            if not os.path.basename(path).startswith('dead-'):
+                try:
+                    total += os.path.getsize(path)
+                except OSError:
+                    pass
+        return total
+
+    def metrics(self):
+        return {
+            'queue_depth': self._pending + self._in_flight,
+            'spool_bytes': self.spool_bytes(),
+            'accepted_total': self.accepted_total,
+            'flushed_total': self.flushed_total,
+            'duplicate_total': self.duplicate_total,
+            'failed_total': self.failed_total,
+            'flush_count': self.flush_count,
+            'last_flush_at': self.last_flush_at,
+            'last_flush_seconds': self.last_flush_seconds,
+            'last_error': self.last_error,
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+        }
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, 'SURVEY_RESPONSE_WRITE_BEHIND', False)
+
+
+def get_spool():
+    """Process-wide spool, created on first use (and again after a fork)"""
+    global _spool
+    if _spool is None or _spool.pid != os.getpid():
+        with _spool_lock:
+            if _spool is None or _spool.pid != os.getpid():
+                _spool = ResponseSpool(
+                    settings.SURVEY_SPOOL_DIR,
+                    batch_size=settings.SURVEY_SPOOL_BATCH_SIZE,
+                    flush_interval=settings.SURVEY_SPOOL_FLUSH_INTERVAL,
+                    fsync=settings.SURVEY_SPOOL_FSYNC,
+                )
+    return _spool
+
+
+@metrics.register_collector
+def _spool_metrics():
+    if _spool is None or _spool.pid != os.getpid():
+        return []
+    stats = _spool.metrics()
+    return [
+        ('response_spool_queue_depth', 'gauge', 'Responses accepted but not yet in MongoDB.', [({}, stats['queue_depth'])]),
+        ('response_spool_bytes', 'gauge', 'Size of the spool files on disk.', [({}, stats['spool_bytes'])]),
+        ('response_spool_accepted_total', 'counter', 'Responses accepted into the spool.', [({}, stats['accepted_total'])]),
+        ('response_spool_flushed_total', 'counter', 'Responses written to MongoDB.', [({}, stats['flushed_total'])]),
+        ('response_spool_failed_total', 'counter', 'Responses moved to a dead-letter file.', [({}, stats['failed_total'])]),
+        ('response_spool_last_flush_seconds', 'gauge', 'Duration of the last flush.', [({}, stats['last_flush_seconds'] or 0)]),
+    ]
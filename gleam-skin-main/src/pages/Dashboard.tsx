@@ -3,7 +3,6 @@ import DashboardLayout from "@/components/DashboardLayout";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
 import { Link } from "react-router-dom";
-import { api } from "@/lib/api";
 import {
   PlusCircle,
   FileText,
@@ -37,26 +36,28 @@ const CountUpAnimation = ({ end, duration = 2000, suffix = "" }: { end: number,
 }
 
 const Dashboard = () => {
-  const [surveys, setSurveys] = useState([]);
+  const [summary, setSummary] = useState<any>(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    const fetchSurveys = async () => {
+    const fetchSummary = async () => {
       try {
-        const data = await api.getSurveys();
-        setSurveys(data);
+        // One aggregated call instead of listing every survey and summing on the client
+        const response = await fetch('http://localhost:8000/api/dashboard/summary/', { credentials: 'include' });
+        if (!response.ok) throw new Error('Failed to fetch dashboard data');
+        setSummary(await response.json());
       } catch (error) {
         console.error("Failed to fetch dashboard data");
       } finally {
         setLoading(false);
       }
     };
-    fetchSurveys();
+    fetchSummary();
   }, []);
 
   // Calculate Real Stats
-  const totalSurveys = surveys.length;
-  const totalResponses = surveys.reduce((acc: number, curr: any) => acc + (curr.response_count || 0), 0);
+  const totalSurveys = summary?.survey_count || 0;
+  const totalResponses = summary?.total_responses || 0;
   const avgResponseRate = totalSurveys > 0 ? Math.round(totalResponses / totalSurveys) : 0; // Simple avg for now
 
   // For "Active Surveys", we'll just count all for this MVP as status isn't fully implemented
@@ -97,7 +98,7 @@ const Dashboard = () => {
     }
   ];
 
-  const recentSurveys = surveys.slice(0, 3); // Top 3 most recent
+  const recentSurveys = (summary?.recent_surveys || []).slice(0, 3); // Top 3 most recent
 
   return (
     <DashboardLayout>
@@ -151,7 +152,7 @@ const Dashboard = () => {
             <CardDescription>Your recently created or modified surveys</CardDescription>
           </CardHeader>
           <CardContent>
-            {surveys.length === 0 ? (
+            {totalSurveys === 0 ? (
               <div className="flex flex-col items-center justify-center py-12 text-center">
                 <div className="w-20 h-20 rounded-full bg-gradient-primary/10 flex items-center justify-center mb-4">
                   <FileText className="w-10 h-10 text-primary" />
@@ -177,7 +178,7 @@ const Dashboard = () => {
                       </div>
                       <div>
                         <h4 className="font-semibold">{survey.title}</h4>
-                        <p className="text-xs text-muted-foreground">{survey.questions?.length || 0} Questions • Combined Template</p>
+                        <p className="text-xs text-muted-foreground">{survey.question_count || 0} Questions • Combined Template</p>
                       </div>
                     </div>
                     <div className="text-right">
@@ -258,7 +258,7 @@ export default function SurveyEditor() {
       if (surveyId) {
         // Update existing survey
         response = await fetch(`http://localhost:8000/api/surveys/${surveyId}/`, {
-          method: 'PUT',
+          method: 'PATCH',
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify(payload)
         });
@@ -205,9 +205,10 @@ const SurveyResponse = () => {
     if (id) {
       const fetchSurvey = async () => {
         try {
-          const response = await fetch(`http://localhost:8000/api/surveys/${id}/`);
+          const response = await fetch(`http://localhost:8000/api/surveys/${id}/public/`);
           if (response.ok) {
-            const data = await response.json();
+            const snapshot = await response.json();
+            const data = snapshot.survey;
 
             // Ensure every question has an ID to prevent state collision
             if (data.questions) {
@@ -238,13 +239,9 @@ const SurveyResponse = () => {
                 setShowingQualification(true);
               }
 
-              // Fetch Qualification Test
-              const testResponse = await fetch(`http://localhost:8000/api/qualification-tests/?survey=${id}`);
-              if (testResponse.ok) {
-                const testData = await testResponse.json();
-                if (testData.length > 0) {
-                  setQualificationQuestions(testData[0].questions);
-                }
+              // Qualification Test is bundled in the survey snapshot
+              if (snapshot.qualification_test) {
+                setQualificationQuestions(snapshot.qualification_test.questions);
               }
             }
           } else {
@@ -337,7 +334,7 @@ const SurveyResponse = () => {
   }, [survey]);
 
 
-  const handleEmailSubmit = (e: React.FormEvent) => {
+  const handleEmailSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!respondentEmail) return;
 
@@ -346,9 +343,33 @@ const SurveyResponse = () => {
     const isAllowed = allowedDomains.some(d => domain.endsWith(d) || d === '*');
 
     if (isAllowed) {
+      // Ask the server whether this email already qualified or responded
+      let alreadyQualified = false;
+      try {
+        const eligibilityRes = await fetch(`http://localhost:8000/api/surveys/${id}/eligibility/?email=${encodeURIComponent(respondentEmail)}`);
+        if (eligibilityRes.ok) {
+          const eligibility = await eligibilityRes.json();
+          if (eligibility.already_responded) {
+            toast({
+              title: "Already Submitted",
+              description: "A response from this email has already been recorded.",
+              variant: "destructive",
+            });
+            return;
+          }
+          alreadyQualified = eligibility.qualification === 'passed';
+        }
+      } catch (error) {
+        console.error("Eligibility check failed", error);
+      }
+
       setEmailValidated(true);
       if (requireQualification) {
-        setShowingQualification(true);
+        if (alreadyQualified) {
+          setQualificationPassed(true);
+        } else {
+          setShowingQualification(true);
+        }
       }
       toast({
         title: "Access Granted",
@@ -363,7 +384,7 @@ const SurveyResponse = () => {
     }
   };
 
-  const handleQualificationSubmit = (e: React.FormEvent) => {
+  const handleQualificationSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     if (Object.keys(qualificationAnswers).length < qualificationQuestions.length) {
       toast({
@@ -373,19 +394,38 @@ const SurveyResponse = () => {
       });
       return;
     }
-    let correctAnswers = 0;
-    qualificationQuestions.forEach((q, index) => {
-      if (qualificationAnswers[index] === q.correctAnswer) {
-        correctAnswers++;
-      }
-    });
-    const scorePercentage = Math.round((correctAnswers / qualificationQuestions.length) * 100);
-    if (scorePercentage >= passScore) {
+
+    // Scored on the server, which also records the attempt
+    let scorePercentage = 0;
+    let passed = false;
+    let requiredScore = passScore;
+    try {
+      const response = await fetch('http://localhost:8000/api/qualification-tests/score/', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          survey_id: id,
+          respondent_email: respondentEmail || "anonymous@example.com",
+          answers: qualificationAnswers
+        }),
+      });
+      if (!response.ok) throw new Error(`Scoring failed (${response.status})`);
+      const result = await response.json();
+      scorePercentage = result.score;
+      passed = result.passed;
+      requiredScore = result.pass_score;
+    } catch (error) {
+      console.error(error);
+      toast({ title: "Error", description: "Could not score the qualification test", variant: "destructive" });
+      return;
+    }
+
+    if (passed) {
       setQualificationPassed(true);
       setShowingQualification(false);
       toast({ title: "Passed!", description: `Score: ${scorePercentage}%. Proceeding to survey.` });
     } else {
-      toast({ title: "Failed", description: `Score: ${scorePercentage}%. Required: ${passScore}%`, variant: "destructive" });
+      toast({ title: "Failed", description: `Score: ${scorePercentage}%. Required: ${requiredScore}%`, variant: "destructive" });
     }
   };
 
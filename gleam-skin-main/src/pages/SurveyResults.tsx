@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { useParams, useNavigate } from "react-router-dom";
 import DashboardLayout from "@/components/DashboardLayout";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
@@ -42,6 +42,7 @@ import { ToggleGroup, ToggleGroupItem } from "@/components/ui/toggle-group";
 interface QuestionStat {
   question: string;
   type: string;
+  total_answers?: number;
   stats?: Array<{
     option: string;
     count: number;
@@ -64,6 +65,73 @@ interface AIInsights {
 
 const COLORS = ['#8b5cf6', '#10b981', '#f59e0b', '#ec4899', '#3b82f6', '#6366f1'];
 
+// Polling for new responses: watermark of "nothing seen yet", and interval
+const INITIAL_WATERMARK = '0:000000000000000000000000';
+const REFRESH_INTERVAL_MS = 15000;
+
+const describeLastResponse = (completedAt: string) => {
+  const date = new Date(completedAt);
+  const now = new Date();
+  const diffMs = now.getTime() - date.getTime();
+  const diffMins = Math.floor(diffMs / 60000);
+  const diffHours = Math.floor(diffMins / 60);
+  const diffDays = Math.floor(diffHours / 24);
+
+  if (diffDays > 0) return `${diffDays} day${diffDays > 1 ? 's' : ''} ago`;
+  if (diffHours > 0) return `${diffHours} hour${diffHours > 1 ? 's' : ''} ago`;
+  if (diffMins > 0) return `${diffMins} minute${diffMins > 1 ? 's' : ''} ago`;
+  return 'Just now';
+};
+
+const CHOICE_TYPES = ['multiple_choice', 'rating', 'yes_no', 'dropdown'];
+
+// Per-question delta for one live response, matched like the server does (text, id, legacy q-<index>- key)
+const responseDelta = (questions: any[], stats: QuestionStat[], answers: Record<string, any>): QuestionStat[] =>
+  questions.map((question: any, idx: number) => {
+    let value = answers[question.text] || answers[String(question.id ?? '')];
+    if (!value) {
+      const key = Object.keys(answers).find(k => k.startsWith(`q-${idx}-`));
+      if (key) value = answers[key];
+    }
+    const type = question.type || 'text';
+    const isChoice = stats[idx]?.stats !== undefined || CHOICE_TYPES.includes(type);
+    return {
+      question: question.text,
+      type,
+      total_answers: value ? 1 : 0,
+      ...(isChoice
+        ? { stats: value ? [{ option: value, count: 1, percentage: 0 }] : [] }
+        : { sampleResponses: value ? [value] : [] })
+    };
+  });
+
+// Add the per-question deltas of a ?since= refresh to the stats on screen
+const mergeQuestionStats = (current: QuestionStat[], delta: QuestionStat[]): QuestionStat[] => {
+  if (current.length !== delta.length) return current; // questions changed: needs a full reload
+  return current.map((q, idx) => {
+    const d = delta[idx];
+    const total = (q.total_answers || 0) + (d.total_answers || 0);
+    if (q.stats && d.stats) {
+      const rows = new Map(q.stats.map(s => [JSON.stringify(s.option), { ...s }]));
+      d.stats.forEach(s => {
+        const row = rows.get(JSON.stringify(s.option));
+        if (row) row.count += s.count;
+        else rows.set(JSON.stringify(s.option), { ...s });
+      });
+      const stats = Array.from(rows.values()).map(s => ({
+        ...s,
+        percentage: total > 0 ? Math.round((s.count / total) * 100) : 0
+      }));
+      return { ...q, total_answers: total, stats };
+    }
+    return {
+      ...q,
+      total_answers: total,
+      sampleResponses: [...(q.sampleResponses || []), ...(d.sampleResponses || [])].slice(0, 5)
+    };
+  });
+};
+
 const SurveyResults = () => {
   const { id } = useParams();
   const navigate = useNavigate();
@@ -82,11 +150,59 @@ const SurveyResults = () => {
   const [lastResponse, setLastResponse] = useState<string>('Never');
   const [chartTypes, setChartTypes] = useState<Record<number, 'bar' | 'pie' | 'line'>>({});
   const [allResponses, setAllResponses] = useState<any[]>([]);
+  const [hasMoreResponses, setHasMoreResponses] = useState(false);
+  const [watermark, setWatermark] = useState<string | null>(null);
+  const [streamEpoch, setStreamEpoch] = useState(0);
+  const [streamRefused, setStreamRefused] = useState(false);
+  // Ids of the responses on screen: a resumed stream replays a few seconds behind its watermark
+  const seenIds = useRef<Set<string>>(new Set());
 
   useEffect(() => {
     loadSurveyData();
   }, [id]);
 
+  // Live updates: one SSE stream per page (the server shares one watcher per survey)
+  useEffect(() => {
+    if (loading || !survey?.id || typeof EventSource === 'undefined' || streamRefused) return;
+    const since = encodeURIComponent(watermark || INITIAL_WATERMARK);
+    const source = new EventSource(`http://127.0.0.1:8000/api/surveys/${survey.id}/live/?since=${since}`);
+
+    source.addEventListener('response', (event: MessageEvent) => {
+      const response = JSON.parse(event.data);
+      if (seenIds.current.has(response.id)) return;
+      seenIds.current.add(response.id);
+      setQuestionStats(prev => mergeQuestionStats(prev, responseDelta(survey.questions || [], prev, response.responses || {})));
+      setAllResponses(prev => [response, ...prev]);
+      setStats(prev => {
+        const total = prev.totalResponses + 1;
+        return { ...prev, totalResponses: total, completionRate: '100%', views: total + Math.floor(total * 0.6) };
+      });
+      if (response.completed_at) setLastResponse(describeLastResponse(response.completed_at));
+      setWatermark(response.watermark);
+    });
+    // The server dropped us for falling behind: reload everything once
+    source.addEventListener('reset', () => {
+      source.close();
+      loadDatabaseData(survey.id).then(() => setStreamEpoch(n => n + 1));
+    });
+
+    // A refused stream (503: the server's stream limit) is not retried by EventSource
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) setStreamRefused(true);
+    };
+
+    return () => source.close();
+    // The stream resumes by itself (Last-Event-ID); only a new survey or reload reopens it
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [loading, survey?.id, streamEpoch, streamRefused]);
+
+  // Fallback for browsers without EventSource, or when the server refused the stream: poll for deltas
+  useEffect(() => {
+    if (loading || !survey?.id || (typeof EventSource !== 'undefined' && !streamRefused)) return;
+    const timer = setInterval(() => refreshSince(survey.id), REFRESH_INTERVAL_MS);
+    return () => clearInterval(timer);
+  }, [loading, survey?.id, watermark, streamRefused]);
+
   const loadSurveyData = async () => {
     try {
       setLoading(true);
@@ -122,56 +238,64 @@ const SurveyResults = () => {
 
   const loadDatabaseData = async (surveyId: string) => {
     try {
-      // 1. Fetch Survey Details from Django
-      const surveyRes = await fetch(`http://127.0.0.1:8000/api/surveys/${surveyId}/`);
+      // Survey header, per-question stats and the newest responses in one request
+      const resultsRes = await fetch(`http://127.0.0.1:8000/api/surveys/${surveyId}/results/`);
 
-      if (!surveyRes.ok) {
-        if (surveyRes.status === 404) throw new Error('Survey not found');
-        throw new Error('Failed to load survey');
+      if (!resultsRes.ok) {
+        if (resultsRes.status === 404) throw new Error('Survey not found');
+        throw new Error('Failed to load survey results');
       }
 
-      const surveyData = await surveyRes.json();
+      const data = await resultsRes.json();
+      const surveyData = data.survey;
       surveyData.id = surveyId;
       setSurvey(surveyData);
-
-      // 2. Fetch Responses from Django
-      const responsesRes = await fetch(`http://127.0.0.1:8000/api/survey-responses/?survey=${surveyId}`);
-
-      if (!responsesRes.ok) {
-        throw new Error('Failed to load responses');
-      }
-
-      const responses = await responsesRes.json();
-      setAllResponses(responses || []);
-
-      if (responses && responses.length > 0) {
+      setAllResponses(data.responses || []);
+      seenIds.current = new Set((data.responses || []).map((r: any) => r.id));
+      setHasMoreResponses(Boolean(data.has_more_responses));
+      setQuestionStats(data.question_stats || []);
+      setWatermark(data.watermark || null);
+
+      const total = data.response_count || 0;
+      if (total > 0) {
         setStats({
-          totalResponses: responses.length,
+          totalResponses: total,
           completionRate: '100%',
           avgTime: '3m 24s',
-          views: responses.length + Math.floor(responses.length * 0.6)
+          views: total + Math.floor(total * 0.6)
         });
 
-        const lastResp = responses[responses.length - 1];
-        if (lastResp.completed_at) {
-          const date = new Date(lastResp.completed_at);
-          const now = new Date();
-          const diffMs = now.getTime() - date.getTime();
-          const diffMins = Math.floor(diffMs / 60000);
-          const diffHours = Math.floor(diffMins / 60);
-          const diffDays = Math.floor(diffHours / 24);
-
-          if (diffDays > 0) {
-            setLastResponse(`${diffDays} day${diffDays > 1 ? 's' : ''} ago`);
-          } else if (diffHours > 0) {
-            setLastResponse(`${diffHours} hour${diffHours > 1 ? 's' : ''} ago`);
-          } else if (diffMins > 0) {
-            setLastResponse(`${diffMins} minute${diffMins > 1 ? 's' : ''} ago`);
-          } else {
-            setLastResponse('Just now');
-          }
+        if (data.last_response_at) {
+          setLastResponse(describeLastResponse(data.last_response_at));
+        }
+      }
+    } catch (error) {
+      console.error(error);
+    }
+  };
+
+  // Fetch only what arrived after the watermark and fold it into the page
+  const refreshSince = async (surveyId: string) => {
+    try {
+      const since = encodeURIComponent(watermark || INITIAL_WATERMARK);
+      const res = await fetch(`http://127.0.0.1:8000/api/surveys/${surveyId}/results/?since=${since}`);
+      if (!res.ok) return;
+
+      const data = await res.json();
+      if (data.new_responses > 0) {
+        (data.responses || []).forEach((r: any) => seenIds.current.add(r.id));
+        setQuestionStats(prev => mergeQuestionStats(prev, data.question_stats || []));
+        setAllResponses(prev => [...(data.responses || []), ...prev]);
+        if (data.has_more_responses) setHasMoreResponses(true);
+        setStats(prev => {
+          const total = prev.totalResponses + data.new_responses;
+          return { ...prev, totalResponses: total, completionRate: '100%', views: total + Math.floor(total * 0.6) };
+        });
+        if (data.last_response_at) {
+          setLastResponse(describeLastResponse(data.last_response_at));
         }
       }
+      setWatermark(data.watermark || null);
     } catch (error) {
       console.error(error);
     }
@@ -316,8 +440,19 @@ Report generated by Survonica Analytics
     });
   };
 
-  const exportToCSV = () => {
-    if (!allResponses || allResponses.length === 0) {
+  const exportToCSV = async () => {
+    let exportResponses = allResponses;
+    if (hasMoreResponses && survey?.id) {
+      // The results call only carries the first page; fetch the rest for the export
+      try {
+        const res = await fetch(`http://127.0.0.1:8000/api/survey-responses/?survey=${survey.id}`);
+        if (res.ok) exportResponses = await res.json();
+      } catch (error) {
+        console.error(error);
+      }
+    }
+
+    if (!exportResponses || exportResponses.length === 0) {
       toast({ title: "No data", description: "No responses to export", variant: "destructive" });
       return;
     }
@@ -326,7 +461,7 @@ Report generated by Survonica Analytics
     const headers = ['Timestamp', 'Respondent Email', ...((survey?.questions || []).map((q: any) => `"${q.text}"`))];
 
     // 2. Rows
-    const rows = allResponses.map(r => {
+    const rows = exportResponses.map(r => {
       const date = new Date(r.completed_at).toLocaleString();
       const email = r.respondent_email;
 